@@ -1,11 +1,13 @@
 
+from itertools import chain
+import gzip
 import logging
 import io
 import os
-import pickle
 import requests
-import zlib
+import tempfile
 
+import numpy as np
 import pandas as pd
 
 from . import utils
@@ -31,11 +33,18 @@ BARRES_SEQ_PATH = os.path.join(CACHE_DIR, BARRES_DATA_NAME)
 MAPPING_URL = (
     "https://github.com/white-lab/pyproteome-data/raw/master/brainrnaseq/"
 )
+"""
+Location of the NCBI <Species>.gene_info.gz files. May also be a local
+directory.
+"""
+MAPPING_COLS = ["GeneID", "Symbol", "Synonyms"]
+MAPPING_CHUNK_SIZE = 2 ** 16
 
-ENRICHMENT_CACHE = os.path.join(CACHE_DIR, "enrichment_cache.pickle")
-MAPPING_CACHE = os.path.join(CACHE_DIR, "mapping_cache.pickle")
+ENRICHMENT_CACHE_DIR = os.path.join(CACHE_DIR, "enrichment")
+MAPPING_CACHE_DIR = os.path.join(CACHE_DIR, "mapping")
 SPECIES_DATA = {}
-MAPPING_DATA = None
+MAPPING_DATA = {}
+MAPPING_INDEX = {}
 
 
 utils.makedirs(CACHE_DIR)
@@ -68,59 +77,254 @@ def get_barres_seq_data(force=False):
     }
 
 
-def fetch_mapping_data(species):
-    url = "{}{}.gene_info.gz".format(MAPPING_URL, "_".join(species.split(" ")))
-    LOGGER.info("Fetching mapping data from {}".format(url))
+def _species_name(species):
+    return "_".join(species.split(" "))
+
+
+def _open_url(url):
+    if "://" not in url:
+        return open(url, "rb")
 
     response = requests.get(url, stream=True)
     response.raise_for_status()
 
-    dec = zlib.decompressobj(32 + zlib.MAX_WBITS)
-    csv = b""
+    return response.raw
 
-    for block in response.iter_content(1024):
-        csv += dec.decompress(block)
 
-    df = pd.read_csv(
-        io.StringIO(csv.decode("utf-8")),
-        sep="\t",
-    )
+def read_mapping_data(f):
+    """
+    Parse a gzipped NCBI gene_info table, keeping only the columns in
+    :const:`.MAPPING_COLS`.
 
-    LOGGER.info("Read mapping info for {} genes".format(df.shape[0]))
+    The table is decompressed and parsed in chunks as it is read.
+
+    Parameters
+    ----------
+    f : file-like
+        Binary stream of the gzipped table.
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+        Mapping table, indexed by gene symbol.
+    """
+    with io.TextIOWrapper(gzip.GzipFile(fileobj=f), encoding="utf-8") as text:
+        chunks = pd.read_csv(
+            text,
+            sep="\t",
+            usecols=MAPPING_COLS,
+            dtype={"Symbol": str, "Synonyms": str},
+            keep_default_na=False,
+            chunksize=MAPPING_CHUNK_SIZE,
+        )
+        df = pd.concat(list(chunks), ignore_index=True)
+
+    return df.set_index("Symbol")[[
+        i for i in MAPPING_COLS if i != "Symbol"
+    ]]
+
+
+def fetch_mapping_data(species):
+    name = "{}.gene_info.gz".format(_species_name(species))
+
+    if "://" in MAPPING_URL:
+        url = MAPPING_URL + name
+    else:
+        url = os.path.join(MAPPING_URL, name)
+
+    LOGGER.info("Fetching mapping data from {}".format(url))
+
+    f = _open_url(url)
 
-    df = df.set_index("Symbol")
+    try:
+        df = read_mapping_data(f)
+    finally:
+        f.close()
+
+    LOGGER.info("Read mapping info for {} genes".format(df.shape[0]))
 
     return df
 
 
-def get_mapping_data(species="Mus musculus", force=False):
-    global MAPPING_DATA
-    global MAPPING_CACHE
-
-    if MAPPING_DATA is None:
-        if not force:
-            try:
-                with open(MAPPING_CACHE, "rb") as f:
-                    MAPPING_DATA = pickle.load(f)
-            except:
-                MAPPING_DATA = {}
-        else:
-            MAPPING_DATA = {}
-
-    if species in MAPPING_DATA:
-        return MAPPING_DATA[species]
+def build_mapping_index(data):
+    """
+    Index the symbols and synonyms of a gene mapping table.
+
+    Primary symbols take precedence over synonyms. A name shared by several
+    genes maps to the first of them in the table.
+
+    Parameters
+    ----------
+    data : :class:`pandas.DataFrame`
+        Gene mapping table, indexed by symbol, with a "Synonyms" column.
+
+    Returns
+    -------
+    index : :class:`pandas.Series`
+        Row position of each symbol and synonym in data.
+    """
+    synonyms = [
+        i.split("|") if isinstance(i, str) else []
+        for i in data["Synonyms"]
+    ]
+    rows = np.arange(data.shape[0])
+
+    index = pd.Series(
+        np.concatenate([
+            rows,
+            np.repeat(rows, [len(i) for i in synonyms]),
+        ]),
+        index=list(data.index) + list(chain.from_iterable(synonyms)),
+    )
+    index = index[index.index != "-"]
+
+    return index[~index.index.duplicated()]
+
+
+def _save_columns(path, columns):
+    # Save a dict of columns to a .npz file. Strings are stored as one
+    # newline-separated UTF-8 blob per column, so no pickling is needed.
+    arrays = {}
+    strings = []
+
+    for name, vals in columns.items():
+        vals = np.asarray(vals)
+
+        if vals.dtype.kind in "OSU":
+            strings.append((name, vals.shape[0]))
+            vals = np.frombuffer(
+                "\n".join(vals).encode("utf-8"),
+                dtype=np.uint8,
+            )
+
+        arrays[name] = vals
+
+    arrays["_strings"] = np.array([i[0] for i in strings], dtype=str)
+    arrays["_lengths"] = np.array([i[1] for i in strings], dtype=int)
 
-    MAPPING_DATA[species] = fetch_mapping_data(
-        species
+    dirname = os.path.dirname(path)
+    utils.makedirs(dirname)
+
+    with tempfile.NamedTemporaryFile(
+        dir=dirname, suffix=".tmp", delete=False,
+    ) as f:
+        np.savez(f, **arrays)
+
+    os.replace(f.name, path)
+
+
+def _load_columns(path):
+    with np.load(path, allow_pickle=False) as f:
+        columns = {name: f[name] for name in f.files}
+
+    for name, length in zip(
+        columns.pop("_strings"), columns.pop("_lengths"),
+    ):
+        vals = columns[name].tobytes().decode("utf-8").split("\n")
+        columns[name] = np.array(vals[:length], dtype=object)
+
+    return columns
+
+
+def _mapping_path(species):
+    return os.path.join(
+        MAPPING_CACHE_DIR,
+        "{}.npz".format(_species_name(species)),
     )
 
+
+def _save_mapping_cache(species):
+    data, index = MAPPING_DATA[species], MAPPING_INDEX[species]
+
     try:
-        with open(MAPPING_CACHE, "wb") as f:
-            pickle.dump(MAPPING_DATA, f)
+        _save_columns(
+            _mapping_path(species),
+            {
+                "Symbol": data.index.values,
+                "GeneID": data["GeneID"].values,
+                "Synonyms": data["Synonyms"].values,
+                "index_names": index.index.values,
+                "index_rows": index.values,
+            },
+        )
     except Exception as e:
         LOGGER.warning(
             "Unable to save mapping information to cache: {}"
             .format(e)
         )
 
+
+def _load_mapping_cache(species):
+    try:
+        columns = _load_columns(_mapping_path(species))
+    except (IOError, OSError, KeyError, ValueError):
+        return False
+
+    MAPPING_DATA[species] = pd.DataFrame(
+        {
+            "GeneID": columns["GeneID"],
+            "Synonyms": columns["Synonyms"],
+        },
+        index=pd.Index(columns["Symbol"], name="Symbol"),
+        columns=["GeneID", "Synonyms"],
+    )
+    MAPPING_INDEX[species] = pd.Series(
+        columns["index_rows"],
+        index=columns["index_names"],
+    )
+
+    return True
+
+
+def get_mapping_data(species="Mus musculus", force=False):
+    """
+    Get the NCBI gene mapping table for a species.
+
+    Each species' table is saved in its own file under
+    :const:`.MAPPING_CACHE_DIR` and only loaded when it is first requested.
+
+    Parameters
+    ----------
+    species : str
+    force : bool, optional
+        Download the table again, even if it is cached.
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+        Mapping table, indexed by gene symbol.
+    """
+    if species in MAPPING_DATA and not force:
+        return MAPPING_DATA[species]
+
+    if force or not _load_mapping_cache(species):
+        MAPPING_DATA[species] = fetch_mapping_data(species)
+        MAPPING_INDEX[species] = build_mapping_index(MAPPING_DATA[species])
+
+        _save_mapping_cache(species)
+
     return MAPPING_DATA[species]
+
+
+def get_mapping_index(species="Mus musculus", force=False):
+    """
+    Get the symbol and synonym index for a species' gene mapping table.
+
+    The index is built once and saved with the species' mapping table.
+
+    Parameters
+    ----------
+    species : str
+    force : bool, optional
+
+    Returns
+    -------
+    index : :class:`pandas.Series`
+        See :func:`.build_mapping_index`.
+    """
+    data = get_mapping_data(species=species, force=force)
+
+    if species not in MAPPING_INDEX:
+        MAPPING_INDEX[species] = build_mapping_index(data)
+
+    return MAPPING_INDEX[species]
@@ -1,10 +1,13 @@
 
 from __future__ import division
 
-import pickle
+from itertools import chain
 import logging
+import os
+import warnings
 
 import numpy as np
+import pandas as pd
 
 import brainrnaseq as brs
 from . import cache
@@ -12,70 +15,188 @@ from . import cache
 LOGGER = logging.getLogger("brainrnaseq.enrichments")
 
 
-def build_enrichment_table(cell_types=None, force=False):
-    if not force:
-        try:
-            with open(cache.ENRICHMENT_CACHE, "rb") as f:
-                return pickle.load(f)
-        except:
-            pass
+def _enrichment_path(species):
+    return os.path.join(
+        cache.ENRICHMENT_CACHE_DIR,
+        "{}.npz".format(cache._species_name(species)),
+    )
 
-    if cell_types is None:
-        cell_types = brs.DEFAULT_CELL_TYPES
 
-    cache.get_barres_seq_data(force=force)
+def _calculate_enrichment(data, species, cell_types):
+    for col in data.columns:
+        if hasattr(col, "lower") and col.lower() == "gene":
+            gene_col_name = col
+            break
 
-    LOGGER.info("Calculating cell type enrichment")
-    enriched = {}
+    data = data.drop_duplicates(subset=gene_col_name)
 
-    for species, data in cache.SPECIES_DATA.items():
-        enriched[species] = {}
+    with warnings.catch_warnings():
+        # Genes without any reads in a cell type have a mean of NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
 
-        for col in data.columns:
-            if hasattr(col, "lower") and col.lower() == "gene":
-                gene_col_name = col
-                break
+        means = np.stack(
+            [
+                np.nanmean(
+                    data[brs.CELL_TYPE_COLS[species][cell_type]]
+                    .values.astype(float),
+                    axis=1,
+                )
+                for cell_type in cell_types
+            ],
+            axis=1,
+        )
+
+    codes = np.argmax(np.where(np.isnan(means), -np.inf, means), axis=1)
+    max_mean = means[np.arange(means.shape[0]), codes]
 
-        data = data.drop_duplicates(subset=gene_col_name)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        enrichment = max_mean / (means.sum(axis=1) - max_mean)
 
-        for _, row in data.iterrows():
-            means = {
-                cell_type: np.nanmean(np.array(row[cols].values, dtype=float))
-                for cell_type, cols in brs.CELL_TYPE_COLS[species].items()
-                if cell_type in cell_types
-            }
-            max_cell, max_mean = max(means.items(), key=lambda x: x[1])
-            enrichment = max_mean / (sum(means.values()) - max_mean)
+    return pd.DataFrame(
+        {
+            "cell_type": pd.Categorical.from_codes(codes, cell_types),
+            "enrichment": enrichment,
+        },
+        index=data[gene_col_name].astype(str).values,
+        columns=["cell_type", "enrichment"],
+    )
 
-            enriched[species][row[gene_col_name]] = max_cell, enrichment
 
+def _load_enrichment_table(species, cell_types):
     try:
-        with open(cache.ENRICHMENT_CACHE, "wb") as f:
-            pickle.dump(enriched, f)
+        columns = cache._load_columns(_enrichment_path(species))
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+    types = list(columns["cell_types"])
+
+    if types != cell_types:
+        return None
+
+    return pd.DataFrame(
+        {
+            "cell_type": pd.Categorical.from_codes(columns["codes"], types),
+            "enrichment": columns["enrichment"],
+        },
+        index=columns["genes"],
+        columns=["cell_type", "enrichment"],
+    )
+
+
+def _save_enrichment_table(species, table):
+    try:
+        cache._save_columns(
+            _enrichment_path(species),
+            {
+                "genes": table.index.values,
+                "cell_types": np.asarray(
+                    table["cell_type"].cat.categories, dtype=object,
+                ),
+                "codes": table["cell_type"].cat.codes.values,
+                "enrichment": table["enrichment"].values,
+            },
+        )
     except Exception as e:
         LOGGER.warning(
             "Unable to save enrichment information to cache: {}"
             .format(e)
         )
 
-    return enriched
 
+def get_enrichment_table(species, cell_types=None, force=False):
+    """
+    Get the cell type that each gene is most enriched in.
+
+    Tables are saved per species under :const:`.cache.ENRICHMENT_CACHE_DIR`.
+
+    Parameters
+    ----------
+    species : str
+    cell_types : list of str, optional
+        Defaults to :const:`brainrnaseq.DEFAULT_CELL_TYPES`.
+    force : bool, optional
+        Recalculate the table, even if it is cached, downloading the
+        Barres RNA-Seq data again if it is not already loaded.
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+        Table indexed by gene, with "cell_type" and "enrichment" columns. A
+        gene's enrichment is its mean expression in its top cell type over the
+        sum of its mean expression in all other cell types.
+    """
+    if cell_types is None:
+        cell_types = brs.DEFAULT_CELL_TYPES
+
+    cell_types = [
+        i for i in brs.CELL_TYPE_COLS[species]
+        if i in cell_types
+    ]
 
-def get_enrichments(species, add_mappings=True, cutoff=2.5, **kwargs):
-    enrichments = {
-        key: val
-        for key, val in build_enrichment_table(**kwargs)[species].items()
-        if val[1] >= cutoff
-    }
+    if not force:
+        table = _load_enrichment_table(species, cell_types)
+
+        if table is not None:
+            return table
+
+    if species not in cache.SPECIES_DATA:
+        cache.get_barres_seq_data(force=force)
 
-    for index, row in cache.get_mapping_data(species=species).iterrows():
-        if index not in enrichments:
-            continue
+    LOGGER.info("Calculating cell type enrichment for {}".format(species))
 
-        for syn in row["Synonyms"].split("|"):
-            if syn in enrichments or syn == "-":
-                continue
+    table = _calculate_enrichment(
+        cache.SPECIES_DATA[species], species, cell_types,
+    )
+    _save_enrichment_table(species, table)
 
-            enrichments[syn] = enrichments[index]
+    return table
 
-    return enrichments
+
+def build_enrichment_table(cell_types=None, force=False):
+    if force:
+        cache.get_barres_seq_data(force=force)
+
+    enriched = {}
+
+    for species in brs.CELL_TYPE_COLS:
+        table = get_enrichment_table(
+            species, cell_types=cell_types, force=force,
+        )
+        enriched[species] = dict(
+            zip(table.index, zip(table["cell_type"], table["enrichment"]))
+        )
+
+    return enriched
+
+
+def get_enrichments(species, add_mappings=True, cutoff=2.5, **kwargs):
+    table = get_enrichment_table(species, **kwargs)
+    table = table[table["enrichment"] >= cutoff]
+
+    if add_mappings:
+        mapping = cache.get_mapping_data(species=species)
+        mapping = mapping[mapping.index.isin(table.index)]
+
+        synonyms = [
+            i.split("|") if isinstance(i, str) else []
+            for i in mapping["Synonyms"]
+        ]
+        synonyms = pd.DataFrame({
+            "gene": np.repeat(
+                mapping.index.values, [len(i) for i in synonyms],
+            ),
+            "synonym": list(chain.from_iterable(synonyms)),
+        })
+        synonyms = synonyms[
+            (synonyms["synonym"] != "-") &
+            ~synonyms["synonym"].isin(table.index)
+        ].drop_duplicates(subset="synonym")
+
+        mapped = table.loc[synonyms["gene"].values]
+        mapped.index = synonyms["synonym"].values
+
+        table = pd.concat([table, mapped])
+
+    return dict(
+        zip(table.index, zip(table["cell_type"], table["enrichment"]))
+    )
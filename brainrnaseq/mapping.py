@@ -2,48 +2,78 @@
 from . import cache, utils
 
 
-def _find_uniprot_gene(gene, data):
-    try:
-        rows = data.loc[gene]
-    except KeyError:
-        pass
-    else:
-        if len(rows.shape) > 1:
-            rows = rows.iloc[0]
-
-        return rows
-
-    rows = data[
-        data["Synonyms"].apply(lambda x: gene in x.split("|"))
+def _find_uniprot_genes(genes, species):
+    data = cache.get_mapping_data(species=species)
+    index = cache.get_mapping_index(species=species)
+
+    rows = index.reindex(genes)
+
+    return data, [
+        None if row != row else int(row)
+        for row in rows.values
     ]
 
-    if rows.shape[0] > 0:
-        return rows.iloc[0]
 
-    return None
+def get_symbol_mappings(genes, species="Mouse"):
+    """
+    Map gene symbols or synonyms to their primary symbols.
 
+    Parameters
+    ----------
+    genes : list of str
+    species : str, optional
+
+    Returns
+    -------
+    list of str
+        Primary symbol of each gene, or None if the gene was not found.
+    """
+    data, rows = _find_uniprot_genes(genes, species)
+
+    return [
+        data.index[row] if row is not None else None
+        for row in rows
+    ]
+
+
+def get_entrez_mappings(genes, species="Mouse"):
+    """
+    Map gene symbols or synonyms to their Entrez Gene IDs.
 
-@utils.memoize
+    Parameters
+    ----------
+    genes : list of str
+    species : str, optional
+
+    Returns
+    -------
+    list of str
+        Gene ID of each gene, or None if the gene was not found.
+    """
+    data, rows = _find_uniprot_genes(genes, species)
+    gene_ids = data["GeneID"].values
+
+    return [
+        str(gene_ids[row]) if row is not None else None
+        for row in rows
+    ]
+
+
+@utils.memoize(maxsize=2 ** 16)
 def get_symbol_mapping(gene, species="Mouse"):
     """
     Returns
     -------
     pandas.Series
     """
-    data = cache.get_mapping_data(species=species)
+    return get_symbol_mappings([gene], species=species)[0]
 
-    row = _find_uniprot_gene(gene, data)
-    return row.name if row is not None else None
 
-
-@utils.memoize
+@utils.memoize(maxsize=2 ** 16)
 def get_entrez_mapping(gene, species="Mouse"):
     """
     Returns
     -------
     pandas.Series
     """
-    data = cache.get_mapping_data(species=species)
-
-    row = _find_uniprot_gene(gene, data)
-    return str(row["GeneID"]) if row is not None else None
+    return get_entrez_mappings([gene], species=species)[0]
@@ -1,7 +1,8 @@
 
-import functools
 import os
 
+from pyproteome.utils import memoize
+
 
 def makedirs(folder_name=None):
     """
@@ -18,16 +19,7 @@ def makedirs(folder_name=None):
             pass
 
 
-def memoize(func):
-    cache = func.cache = {}
-
-    @functools.wraps(func)
-    def memoized_func(*args, **kwargs):
-        key = str(args) + str(kwargs)
-
-        if key not in cache:
-            cache[key] = func(*args, **kwargs)
-
-        return cache[key]
-
-    return memoized_func
+__all__ = [
+    "makedirs",
+    "memoize",
+]
@@ -1,23 +1,37 @@
 
+import sys
+
+from . import paths, utils, version
 from .utils import DEFAULT_DPI
-from .analysis import (
-    correlation, tables, volcano,
-)
-from .motifs import (
-    logo, motif, phosphosite,
-)
-from . import (
-    analysis, bca, data_sets, discoverer, levels, loading, motifs, paths,
-    pride, species, utils, version,
+
+# Submodules are imported on first access so that scripts which only load
+# data sets do not pay for importing matplotlib, seaborn, and sklearn.
+utils.lazy_import(
+    globals(),
+    submodules=[
+        "analysis", "bca", "camv", "cluster", "data_sets", "discoverer",
+        "levels", "loading", "motifs", "pathways", "pride", "pypuniprot",
+        "species", "store",
+    ],
+    attrs={
+        "correlation": ("analysis.correlation", None),
+        "tables": ("analysis.tables", None),
+        "volcano": ("analysis.volcano", None),
+        "logo": ("motifs.logo", None),
+        "motif": ("motifs.motif", None),
+        "phosphosite": ("motifs.phosphosite", None),
+    },
 )
-from . import cluster, pathways
 
-try:
+
+def _get_ipython():
+    # IPython is slow to import, only look for a shell if one is running
+    if "IPython" not in sys.modules:
+        return None
+
     from IPython import get_ipython
-    from IPython.core.magic import register_line_magic
-except ImportError:
-    get_ipython = None
-    register_line_magic = None
+
+    return get_ipython()
 
 
 def import_all(line=None):
@@ -29,10 +43,11 @@ def import_all(line=None):
         >>> from pyproteome import *
         >>> %import_all
     """
-    if get_ipython is None:
+    ip = _get_ipython()
+
+    if ip is None:
         return
 
-    ip = get_ipython()
     ip.run_line_magic(
         "config",
         "InlineBackend.figure_formats = ['retina']",
@@ -81,11 +96,9 @@ def import_all(line=None):
     )
 
 
-if (
-    register_line_magic is not None and
-    get_ipython is not None and
-    get_ipython() is not None
-):
+if _get_ipython() is not None:
+    from IPython.core.magic import register_line_magic
+
     import_all = register_line_magic(import_all)
 
 __all__ = [
@@ -6,7 +6,12 @@ Functions include volcano plots, sorted tables, and plotting sequence
 levels.
 """
 
-from . import correlation, heatmap, plot, tables, qc, volcano
+import pyproteome as pyp
+
+pyp.utils.lazy_import(
+    globals(),
+    submodules=["correlation", "heatmap", "plot", "tables", "qc", "volcano"],
+)
 
 __all__ = [
     "correlation",
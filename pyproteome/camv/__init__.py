@@ -8,6 +8,7 @@ from __future__ import absolute_import, division
 
 import logging
 import os
+import sys
 
 import pandas as pd
 
@@ -21,15 +22,32 @@ except NameError:
 
 LOGGER = logging.getLogger("pyproteome.camv")
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-CAMV_PATH = pyp.utils.which("CAMV.exe")
 
-if CAMV_PATH is None:
-    CAMV_PATH = os.path.abspath(
-        os.path.join(
-            THIS_DIR, "..",
-            "CAMV", "CAMV", "for_redistribution_files_only", "CAMV.exe",
+
+def __getattr__(name):
+    # Searching PATH for CAMV is deferred until CAMV_PATH is first used
+    global CAMV_PATH
+
+    if name != "CAMV_PATH":
+        raise AttributeError(
+            "module '{}' has no attribute '{}'".format(__name__, name)
         )
-    )
+
+    CAMV_PATH = pyp.utils.which("CAMV.exe")
+
+    if CAMV_PATH is None:
+        CAMV_PATH = os.path.abspath(
+            os.path.join(
+                THIS_DIR, "..",
+                "CAMV", "CAMV", "for_redistribution_files_only", "CAMV.exe",
+            )
+        )
+
+    return CAMV_PATH
+
+
+if sys.version_info < (3, 7):
+    __getattr__("CAMV_PATH")
 
 
 def load_camv_validation(basename):
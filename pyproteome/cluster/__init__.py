@@ -1,8 +1,14 @@
 
-from . import auto, clusterer, plot
+import pyproteome as pyp
 
-from .clusterer import (
-    cluster, get_data, cluster_clusters,
+pyp.utils.lazy_import(
+    globals(),
+    submodules=["auto", "clusterer", "plot"],
+    attrs={
+        "cluster": ("clusterer", "cluster"),
+        "get_data": ("clusterer", "get_data"),
+        "cluster_clusters": ("clusterer", "cluster_clusters"),
+    },
 )
 
 __all__ = [
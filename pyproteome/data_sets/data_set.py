@@ -8,7 +8,7 @@ structured format.
 # Built-ins
 from __future__ import absolute_import, division
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 import copy
 import logging
 import os
@@ -20,7 +20,6 @@ from functools import partial
 import pandas as pd
 import numpy as np
 import numpy.ma as ma
-from scipy.stats import ttest_ind, pearsonr, spearmanr
 
 from . import modification, protein, sequence
 
@@ -106,6 +105,12 @@ class DataSet:
         Peptide levels used for normalization.
     sets : int
         Number of sets merged into this data set.
+    gene_index : dict of str, :class:`numpy.ndarray`
+        Maps gene names to the row positions of all peptides in psms that
+        map to that gene.
+    accession_index : dict of str, :class:`numpy.ndarray`
+        Maps UniProt accessions to the row positions of all peptides in psms
+        that map to that protein.
     """
     def __init__(
         self,
@@ -161,6 +166,11 @@ class DataSet:
         if search_name and os.path.splitext(search_name)[1] == "":
             search_name += ".msf"
 
+        self._psms = None
+        self._gene_index = None
+        self._accession_index = None
+        self._index_rows = 0
+
         self.channels = channels or OrderedDict()
         self.groups = groups or OrderedDict()
         self.cmp_groups = cmp_groups or None
@@ -255,13 +265,141 @@ class DataSet:
         """
         new = copy.copy(self)
 
+        # Row order is unchanged by copying, so the protein indexes can be
+        # shared with the new data set.
         new.psms = new.psms.copy()
+        new._gene_index = self._gene_index
+        new._accession_index = self._accession_index
+        new._index_rows = self._index_rows
+
         new.channels = new.channels.copy()
         new.groups = new.groups.copy()
         new.species = new.species.copy()
 
         return new
 
+    @property
+    def psms(self):
+        """
+        Get the peptide-spectrum matches in this data set.
+
+        Returns
+        -------
+        df : :class:`pandas.DataFrame`
+        """
+        return self._psms
+
+    @psms.setter
+    def psms(self, value):
+        self._psms = value
+        self.invalidate_index()
+
+    def invalidate_index(self):
+        """
+        Discard the cached :attr:`.gene_index` and :attr:`.accession_index`.
+
+        Replacing psms, or dropping rows from it, does this automatically.
+        Call it after reordering the rows of psms in place (e.g.
+        psms.sort_values(inplace=True)) or editing its Proteins column.
+        """
+        self._gene_index = None
+        self._accession_index = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_gene_index"] = None
+        state["_accession_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        # Data sets pickled before psms became a property store it directly
+        if "psms" in state:
+            state["_psms"] = state.pop("psms")
+
+        state.setdefault("_gene_index", None)
+        state.setdefault("_accession_index", None)
+        state.setdefault("_index_rows", 0)
+
+        self.__dict__.update(state)
+
+    def _build_index(self):
+        # Rebuild if psms was replaced or had rows dropped in place
+        if (
+            self._gene_index is not None and
+            self._index_rows == self._psms.shape[0]
+        ):
+            return
+
+        genes, accessions = defaultdict(list), defaultdict(list)
+
+        for pos, prots in enumerate(self._psms["Proteins"]):
+            for gene in prots.genes:
+                genes[gene].append(pos)
+
+            for acc in prots.accessions:
+                accessions[acc].append(pos)
+
+        self._index_rows = self._psms.shape[0]
+        self._gene_index = {
+            key: np.array(val, dtype=int)
+            for key, val in genes.items()
+        }
+        self._accession_index = {
+            key: np.array(val, dtype=int)
+            for key, val in accessions.items()
+        }
+
+    @property
+    def gene_index(self):
+        """
+        Get an index mapping each gene name to the row positions of its
+        peptides.
+
+        The index is built on first access and kept until psms is replaced
+        or loses rows. See :meth:`.invalidate_index` for other edits.
+
+        Returns
+        -------
+        dict of str, :class:`numpy.ndarray`
+        """
+        self._build_index()
+        return self._gene_index
+
+    @property
+    def accession_index(self):
+        """
+        Get an index mapping each UniProt accession to the row positions of
+        its peptides.
+
+        The index is built on first access and kept until psms is replaced
+        or loses rows. See :meth:`.invalidate_index` for other edits.
+
+        Returns
+        -------
+        dict of str, :class:`numpy.ndarray`
+        """
+        self._build_index()
+        return self._accession_index
+
+    def get_peptides(self, gene):
+        """
+        Get all peptides that map to a gene name or UniProt accession.
+
+        Parameters
+        ----------
+        gene : str
+
+        Returns
+        -------
+        df : :class:`pandas.DataFrame`
+        """
+        rows = np.union1d(
+            self.gene_index.get(gene, []),
+            self.accession_index.get(gene, []),
+        ).astype(int)
+
+        return self.psms.iloc[rows]
+
     @property
     def samples(self):
         """
@@ -677,26 +815,32 @@ class DataSet:
         -------
         found_all : bool
         """
+        raw_dir = _list_raw_dir(pyp.paths.MS_RAW_DIR)
+        raw_paths = self.psms["Raw Paths"]
+
         try:
-            raw_dir = [
-                i.lower()
-                for i in os.listdir(pyp.paths.MS_RAW_DIR)
-            ]
-        except OSError:
-            raw_dir = []
+            raw_paths = pd.Categorical(raw_paths)
+        except TypeError:
+            # Merged data sets store a set of raw files for each peptide
+            raw_paths = pd.Categorical(
+                list(
+                    chain.from_iterable(
+                        [i] if isinstance(i, str) else i
+                        for i in raw_paths
+                    )
+                )
+            )
 
-        found_all = True
+        names = raw_paths.categories
+        missing = names[~names.astype(str).str.lower().isin(raw_dir)]
 
-        for raw in pyp.utils.flatten_set(
-            row["Raw Paths"]
-            for _, row in self.psms.iterrows()
-        ):
-            if raw.lower() not in raw_dir:
-                LOGGER.warning(
-                    "{}: Unable to locate raw file for {}"
-                    .format(self.name, raw)
-                )
-                found_all = False
+        for raw in sorted(missing):
+            LOGGER.warning(
+                "{}: Unable to locate raw file for {}"
+                .format(self.name, raw)
+            )
+
+        found_all = len(missing) == 0
 
         return found_all
 
@@ -946,9 +1090,7 @@ class DataSet:
             ),
 
             "protein": lambda val, psms:
-            psms["Proteins"].apply(
-                lambda x: bool(set(val).intersection(x.genes))
-            )
+            _rows_mask(new.gene_index, val, psms.shape[0])
             if isinstance(val, (list, set, tuple, pd.Series)) else
             psms["Proteins"] == val,
 
@@ -1139,6 +1281,8 @@ class DataSet:
         ]
 
         if channels_a and channels_b and self.shape[0] > 0:
+            from scipy.stats import ttest_ind
+
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore", category=RuntimeWarning)
                 self.psms["Fold Change"] = pd.Series(
@@ -1329,13 +1473,7 @@ class DataSet:
         -------
         list of str
         """
-        return sorted(
-            set(
-                gene
-                for i in self.psms["Proteins"]
-                for gene in i.genes
-            )
-        )
+        return sorted(self.gene_index)
 
     @property
     def accessions(self):
@@ -1346,13 +1484,7 @@ class DataSet:
         -------
         list of str
         """
-        return sorted(
-            set(
-                gene
-                for i in self.psms["Proteins"]
-                for gene in i.accessions
-            )
-        )
+        return sorted(self.accession_index)
 
     @property
     def data(self):
@@ -1849,6 +1981,41 @@ def merge_proteins(ds, inplace=False):
     return new
 
 
+_RAW_DIR_CACHE = {}
+
+
+def _list_raw_dir(path):
+    """
+    List the lower-cased file names in a directory, reusing the listing from
+    earlier calls until the directory's modification time changes.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return frozenset()
+
+    cached = _RAW_DIR_CACHE.get(path)
+
+    if cached is None or cached[0] != mtime:
+        try:
+            names = frozenset(i.lower() for i in os.listdir(path))
+        except OSError:
+            names = frozenset()
+
+        cached = _RAW_DIR_CACHE[path] = (mtime, names)
+
+    return cached[1]
+
+
+def _rows_mask(index, keys, n_rows):
+    mask = np.zeros(n_rows, dtype=bool)
+
+    for key in keys:
+        mask[index.get(key, [])] = True
+
+    return mask
+
+
 def _nan_median(lst):
     if all(np.isnan(i) for i in lst):
         return np.nan
@@ -1880,6 +2047,8 @@ def update_correlation(ds, corr, metric="spearman", min_periods=5):
     -------
     ds : :class:`.DataSet`
     """
+    from scipy.stats import pearsonr, spearmanr
+
     ds = ds.copy()
 
     metric = {
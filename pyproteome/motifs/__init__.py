@@ -6,12 +6,17 @@ motif logos. These logos can be generated locally (:func:`.logo.make_logo`) or
 via automated hooks into online tools (:func:`.plogo.make_logo`,
 :func:`.weblogo.make_logo`, :func:`.icelogo.make_logo`).
 """
-from . import (
-    icelogo, logo, motif, neighborhood, phosphosite, plogo, weblogo,
-)
+import pyproteome as pyp
 
-from .motif import (
-    generate_n_mers,
+pyp.utils.lazy_import(
+    globals(),
+    submodules=[
+        "icelogo", "logo", "motif", "neighborhood", "phosphosite", "plogo",
+        "weblogo",
+    ],
+    attrs={
+        "generate_n_mers": ("motif", "generate_n_mers"),
+    },
 )
 
 __all__ = [
@@ -10,16 +10,38 @@ from collections import defaultdict, Iterable
 from functools import partial
 import logging
 import multiprocessing
+import hashlib
+import os
 import pickle
-import random
+import queue
 import re
 
+import numpy as np
 import pandas as pd
 from scipy.stats import hypergeom
 
+from .. import utils
+
 
 LOGGER = logging.getLogger("pyproteome.motif")
 
+MOTIF_CACHE_DIR = os.environ.get(
+    "PYPROTEOME_MOTIF_CACHE_DIR",
+    os.path.join(utils.PICKLE_DIR, "motifs"),
+)
+"""
+Directory holding saved motif analyses. Defaults to the
+PYPROTEOME_MOTIF_CACHE_DIR environment variable, if set.
+"""
+
+MOTIF_CACHE_SIZE = 1 << 28
+"""
+Maximum size of :const:`.MOTIF_CACHE_DIR`, in bytes. The least recently used
+analyses are removed once the cache grows beyond this size.
+"""
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=int)
+
 
 class Motif:
     """
@@ -48,7 +70,7 @@ class Motif:
         # Set _motif and _re explicitly, py2.7 does not call motif's setter
         # if we just set self.motif here...
         self._motif = motif
-        self._re = self._compile_re(motif)
+        self._re = None
 
     char_mapping = {
         "x": "st",
@@ -65,7 +87,7 @@ class Motif:
     @motif.setter
     def motif(self, value):
         self._motif = value
-        self._re = self._compile_re(value)
+        self._re = None
 
     def _compile_re(self, motif):
         ret = ""
@@ -181,9 +203,137 @@ class Motif:
         -------
         bool
         """
+        # Motifs are only compiled once they are matched against strings
+        if self._re is None:
+            self._re = self._compile_re(self.motif)
+
         return bool(self._re.match(other))
 
 
+class _SeqBits:
+    """
+    Bitsets of the sequences that match each motif character at each
+    position of a list of n-mers.
+
+    Sequences are encoded once as an (n_seqs x positions) matrix of residue
+    codes. The sequences matching a motif are the bitwise AND of the bitsets
+    of its characters, and are counted with a popcount.
+    """
+    def __init__(self, seqs, residues=None):
+        if residues is None:
+            residues = np.frombuffer(
+                "".join(seqs).encode("ascii"),
+                dtype=np.uint8,
+            ).reshape(len(seqs), -1)
+
+        self.seqs = seqs
+        self.residues = residues
+        self._bits = {}
+
+    def subset(self, indices):
+        """
+        Select some of the sequences, without encoding them again.
+
+        Parameters
+        ----------
+        indices : list of int
+
+        Returns
+        -------
+        seq_bits : :class:`._SeqBits`
+        """
+        return _SeqBits(
+            [self.seqs[i] for i in indices],
+            residues=self.residues[indices],
+        )
+
+    def char_bits(self, pos, char):
+        """
+        Get the bitset of sequences matching a motif character at a
+        position.
+
+        Parameters
+        ----------
+        pos : int
+        char : str
+
+        Returns
+        -------
+        bits : :class:`numpy.ndarray` of uint8
+        """
+        key = pos, char
+
+        if key not in self._bits:
+            chars = char + Motif.char_mapping.get(char, "")
+            self._bits[key] = np.packbits(
+                np.in1d(
+                    self.residues[:, pos],
+                    np.frombuffer(chars.encode("ascii"), dtype=np.uint8),
+                )
+            )
+
+        return self._bits[key]
+
+    def match(self, motif, bits=None, parent=None):
+        """
+        Get the bitset of sequences matching a motif.
+
+        Parameters
+        ----------
+        motif : :class:`.Motif`
+        bits : :class:`numpy.ndarray` of uint8, optional
+            Bitset of sequences matching parent.
+        parent : :class:`.Motif`, optional
+            A less specific motif, whose characters are all either "." or
+            the same as motif's.
+
+        Returns
+        -------
+        bits : :class:`numpy.ndarray` of uint8
+        """
+        if bits is None:
+            bits = np.packbits(np.ones(len(self.seqs), dtype=bool))
+            parent = Motif("." * len(motif.motif))
+
+        for pos, (old, new) in enumerate(zip(parent.motif, motif.motif)):
+            if old != new:
+                bits = bits & self.char_bits(pos, new)
+
+        return bits
+
+    def hits(self, bits):
+        """
+        Get the sequences in a bitset.
+
+        Parameters
+        ----------
+        bits : :class:`numpy.ndarray` of uint8
+
+        Returns
+        -------
+        list of str
+        """
+        return [
+            self.seqs[i]
+            for i in np.flatnonzero(np.unpackbits(bits)[:len(self.seqs)])
+        ]
+
+    @staticmethod
+    def count(bits):
+        """
+        Count the sequences in a bitset.
+
+        Parameters
+        ----------
+        bits : :class:`numpy.ndarray` of uint8
+
+        Returns
+        -------
+        int
+        """
+        return int(_POPCOUNT[bits].sum())
+
+
 def get_nmer_args(kwargs):
     nmer_args = {}
 
@@ -318,25 +468,19 @@ def _check_anchestry(motif, parent, done):
         if index == motif_length // 2 or char != ".":
             continue
 
-        new_motif = Motif(
-            motif.motif[:index] + "." + motif.motif[index + 1:]
-        )
+        new_motif = motif.motif[:index] + "." + motif.motif[index + 1:]
 
-        if new_motif != parent and new_motif in done:
+        if new_motif != parent.motif and Motif(new_motif) in done:
             return True
 
     return False
 
 
-def _count_occurences(motif, parent, hit_list):
-    hits = [
-        i
-        for i in hit_list[parent]
-        if motif.match(i)
-    ]
-    hit_list[motif] = hits
+def _count_occurences(motif, parent, hit_list, seq_bits):
+    bits = seq_bits.match(motif, bits=hit_list[parent], parent=parent)
+    hit_list[motif] = bits
 
-    return len(hits)
+    return seq_bits.count(bits)
 
 
 def _motif_sig(fore_hits, fore_size, back_hits, back_size):
@@ -382,36 +526,88 @@ def _lowpriority():
         os.nice(1)
 
 
-def _random_pdist(x, background, fore_size, kwargs):
-    _lowpriority()
+_PPDIST = {}
 
-    return motif_enrichment(
-        random.sample(background, fore_size),
-        background,
-        force=True,
-        **kwargs
-    )[1]
 
+def _init_ppdist(background, fore_size, kwargs, low_priority=True):
+    # Encode the background once per worker. Its bitsets are then shared by
+    # all of the worker's tasks.
+    if low_priority:
+        _lowpriority()
 
-def _generate_ppdist(
-    background, fore_size, p_iter,
-    cpu_count=None,
-    **kwargs
-):
+    _PPDIST["bg_bits"] = _SeqBits(background)
+    _PPDIST["fore_size"] = fore_size
+    _PPDIST["kwargs"] = kwargs
+
+
+def _random_pdist(seed):
+    rng = np.random.default_rng(seed)
+    bg_bits = _PPDIST["bg_bits"]
+    kwargs = _PPDIST["kwargs"].copy()
+
+    fg_bits = bg_bits.subset(
+        rng.choice(
+            len(bg_bits.seqs), _PPDIST["fore_size"], replace=False,
+        )
+    )
+    starts = _get_starts(
+        kwargs.pop("start_letters", None),
+        bg_bits.residues.shape[1],
+    )
+
+    return [
+        p_value
+        for result in _search_serial(starts, fg_bits, bg_bits, **kwargs)
+        for p_value in result[2]
+    ]
+
+
+def _get_cpu_count(cpu_count=None):
     if cpu_count is None:
         try:
             cpu_count = multiprocessing.cpu_count() - 1
         except NotImplementedError:
             cpu_count = 1
 
-    kwargs = kwargs.copy()
-    kwargs["pp_value"] = False
+    return max([cpu_count, 1])
 
-    pp_dist = []
 
-    pool = multiprocessing.Pool(
-        processes=cpu_count,
-    )
+def _generate_ppdist(
+    background, fore_size, p_iter,
+    cpu_count=None,
+    seed=None,
+    **kwargs
+):
+    """
+    Simulate the distribution of the best motif p-value found in random
+    foregrounds drawn from the background.
+
+    Each worker process encodes the background once. Every iteration draws
+    its foreground from its own random stream, spawned from seed, so the
+    distribution does not depend on the number of CPUs used.
+
+    Parameters
+    ----------
+    background : list of str
+    fore_size : int
+    p_iter : int
+    cpu_count : int, optional
+    seed : int or :class:`numpy.random.SeedSequence`, optional
+    kwargs : dict
+        Search arguments (sig_cutoff, min_fore_hits, start_letters).
+
+    Returns
+    -------
+    pp_dist : list of float
+    """
+    cpu_count = _get_cpu_count(cpu_count)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    seeds = seed.spawn(p_iter)
+    pp_dist = []
+    pool = None
 
     LOGGER.info(
         "Calculating distribution of {} p-values using {} CPUs".format(
@@ -420,27 +616,37 @@ def _generate_ppdist(
         )
     )
 
-    for ind, p_dist in enumerate(
-        pool.imap_unordered(
-            partial(
-                _random_pdist,
-                background=background,
-                fore_size=fore_size,
-                kwargs=kwargs,
-            ),
-            range(p_iter),
-        ),
-        start=1,
-    ):
-        pp_dist.append(
-            min(p_dist + [kwargs.get("sig_cutoff")])
+    if cpu_count > 1:
+        pool = multiprocessing.Pool(
+            processes=cpu_count,
+            initializer=_init_ppdist,
+            initargs=(background, fore_size, kwargs),
+        )
+        p_dists = pool.imap(
+            _random_pdist, seeds,
+            chunksize=max([1, p_iter // (cpu_count * 4)]),
         )
+    else:
+        _init_ppdist(background, fore_size, kwargs, low_priority=False)
+        p_dists = (_random_pdist(i) for i in seeds)
 
-        if ind % (p_iter // min([p_iter, 10])) == 0:
-            LOGGER.info(
-                "Calculated {}/{} pvals".format(ind, p_iter)
+    try:
+        for ind, p_dist in enumerate(p_dists, start=1):
+            pp_dist.append(
+                min(p_dist + [kwargs.get("sig_cutoff")])
             )
 
+            if ind % (p_iter // min([p_iter, 10])) == 0:
+                LOGGER.info(
+                    "Calculated {}/{} pvals".format(ind, p_iter)
+                )
+    finally:
+        if pool is None:
+            _PPDIST.clear()
+        else:
+            pool.terminate()
+            pool.join()
+
     return pp_dist
 
 
@@ -455,93 +661,169 @@ def _make_index(args):
     return _to_tuple(args)
 
 
-def _open_cache():
+def _cache_path(args):
+    digest = hashlib.sha1(
+        repr(_make_index(args)).encode("utf-8"),
+    ).hexdigest()
+
+    return os.path.join(
+        MOTIF_CACHE_DIR, digest[:2], "{}.pkl".format(digest),
+    )
+
+
+def _cache_entries():
+    entries = []
+
     try:
-        with open(".motif_cache.pickle", "rb") as f:
-            return pickle.load(f)
+        shards = os.listdir(MOTIF_CACHE_DIR)
     except (OSError, IOError):
-        return {}
-    except (EOFError, pickle.UnpicklingError, KeyError, TypeError):
-        LOGGER.warning("Unable to open motif cache")
-        return {}
+        return entries
+
+    for shard in shards:
+        try:
+            names = os.listdir(os.path.join(MOTIF_CACHE_DIR, shard))
+        except (OSError, IOError):
+            continue
+
+        for name in names:
+            if not name.endswith(".pkl"):
+                continue
+
+            path = os.path.join(MOTIF_CACHE_DIR, shard, name)
+
+            try:
+                stat = os.stat(path)
+            except (OSError, IOError):
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    return entries
+
+
+def _evict_cache():
+    entries = sorted(_cache_entries())
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, path in entries:
+        if total <= MOTIF_CACHE_SIZE:
+            break
+
+        try:
+            os.remove(path)
+        except (OSError, IOError):
+            continue
+
+        total -= size
 
 
 def _get_cache(args):
-    return _open_cache().get(_make_index(args), None)
+    path = _cache_path(args)
+
+    try:
+        with open(path, "rb") as f:
+            ret = pickle.load(f)
+    except (OSError, IOError):
+        return None
+    except (
+        EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+        IndexError, KeyError, TypeError, ValueError,
+    ):
+        LOGGER.warning("Unable to open motif cache entry {}".format(path))
+        return None
+
+    # Mark the entry as recently used, so that it is evicted last
+    try:
+        os.utime(path, None)
+    except (OSError, IOError):
+        pass
+
+    return ret
 
 
 def _add_cache(args, ret):
     LOGGER.info("Adding motifs to cache")
-    cache = _open_cache()
-    cache[_make_index(args)] = ret
 
     try:
-        with open(".motif_cache.pickle", "wb") as f:
-            pickle.dump(cache, f)
-            return ret
-    except OSError:
-        return ret
+        with utils._file_lock(os.path.join(MOTIF_CACHE_DIR, ".lock")):
+            utils._atomic_dump(_cache_path(args), ret)
+            _evict_cache()
+    except (OSError, IOError) as err:
+        LOGGER.warning("Unable to add motifs to cache: {}".format(err))
 
+    return ret
 
-def run_motif_enrichment(data, f, **kwargs):
-    nmer_args = get_nmer_args(kwargs)
-    foreground = sorted(
-        generate_n_mers(data.filter(f)["Sequence"], **nmer_args)
-    )
-    background = sorted(
-        generate_n_mers(data["Sequence"], **nmer_args)
-    )
 
-    return motif_enrichment(
-        foreground,
-        background,
-        **kwargs
-    )
+def clear_cache():
+    """
+    Remove all motif analyses saved in :const:`.MOTIF_CACHE_DIR`.
+    """
+    with utils._file_lock(os.path.join(MOTIF_CACHE_DIR, ".lock")):
+        for _, _, path in _cache_entries():
+            try:
+                os.remove(path)
+            except (OSError, IOError):
+                pass
 
 
-def motif_enrichment(
-    foreground, background,
+_SEARCH = {}
+
+
+def _init_search(foreground, background):
+    _SEARCH["fg_bits"] = _SeqBits(foreground)
+    _SEARCH["bg_bits"] = _SeqBits(background)
+
+
+def _search_start(
+    start, done,
     sig_cutoff=0.01,
     min_fore_hits=0,
-    start_letters=None,
-    pp_value=False,
-    pp_iterations=100,
-    cpu_count=None,
-    force=False,
+    fg_bits=None,
+    bg_bits=None,
 ):
     """
-    Calculate motifs significantly enriched in a set of sequences. Uses a
-    depth-first search algorithm to find discrete motifs that are enriched in
-    a foreground set compared to a given background [1]_.
+    Run the depth-first search for motifs from one starting motif.
 
     Parameters
     ----------
-    foreground : list of str
-    background : list of str
+    start : :class:`.Motif`
+    done : dict of (:class:`.Motif`, tuple of int)
+        Motifs found by the searches that this search depends on.
     sig_cutoff : float, optional
     min_fore_hits : int, optional
-    start_letters : list of str, optional
-    pp_value : bool, optional
-    pp_iterations : int, optional
-    cpu_count : int, optional
-        Number of CPUs to use when calculating pp-values, does not apply to
-        a single motif-enrichment process.
+    fg_bits : :class:`._SeqBits`, optional
+    bg_bits : :class:`._SeqBits`, optional
+        Encoded foreground and background sequences. Default to the
+        sequences set up by :func:`._init_search` in worker processes.
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`
+    motif_hits : set of :class:`.Motif`
+    found : dict of (:class:`.Motif`, tuple of int)
+        Foreground and background hits of each motif in motif_hits.
     p_dist : list of float
-    pp_dist : list of float
-
-    Notes
-    -----
-    .. [1] Joughin, Brian a et al. "An Integrated Comparative Phosphoproteomic
-           and Bioinformatic Approach Reveals a Novel Class of MPM-2 Motifs
-           Upregulated in EGFRvIII-Expressing Glioblastoma Cells." Molecular
-           bioSystems 5.1 (2009): 59-67.
+    failed : dict of (str, int)
     """
+    if fg_bits is None:
+        fg_bits, bg_bits = _SEARCH["fg_bits"], _SEARCH["bg_bits"]
+
+    fore_size, back_size = len(fg_bits.seqs), len(bg_bits.seqs)
+    visited, done = set(), dict(done)
+    fg_hit_list = {start: fg_bits.match(start)}
+    bg_hit_list = {start: bg_bits.match(start)}
+    failed = defaultdict(int)
 
     p_dist = []
+    sigs = {}
+
+    def _sig(fore_hits, back_hits):
+        # Hit counts repeat across motifs, only calculate each p-value once
+        key = fore_hits, back_hits
+
+        if key not in sigs:
+            sigs[key] = _motif_sig(fore_hits, fore_size, back_hits, back_size)
+
+        return sigs[key]
 
     def _search_children(children, parent=None):
         """
@@ -562,7 +844,9 @@ def motif_enrichment(
                 continue
 
             # Calculate the number of foreground hits
-            fore_hits = _count_occurences(motif, parent, fg_hit_list)
+            fore_hits = _count_occurences(
+                motif, parent, fg_hit_list, fg_bits,
+            )
 
             if fore_hits < min_fore_hits:
                 failed["count"] = 1
@@ -577,7 +861,7 @@ def motif_enrichment(
                 continue
 
             # Shortcut calculating back-hits if we can help it
-            best_p = _motif_sig(fore_hits, fore_size, fore_hits, back_size)
+            best_p = _sig(fore_hits, fore_hits)
             if best_p > sig_cutoff:
                 failed["bestsig"] += 1
                 del fg_hit_list[motif]
@@ -589,10 +873,12 @@ def motif_enrichment(
                 continue
 
             # Calculate the number of background hits
-            back_hits = _count_occurences(motif, parent, bg_hit_list)
+            back_hits = _count_occurences(
+                motif, parent, bg_hit_list, bg_bits,
+            )
 
             # Check the signifiance of the motif
-            p_value = _motif_sig(fore_hits, fore_size, back_hits, back_size)
+            p_value = _sig(fore_hits, back_hits)
             p_dist.append(p_value)
 
             if p_value > sig_cutoff:
@@ -616,7 +902,9 @@ def motif_enrichment(
             )
             motif_hits.update(
                 _search_children(
-                    children=motif.pairwise_children(fg_hit_list),
+                    children=motif.pairwise_children(
+                        {motif: fg_bits.hits(fg_hit_list[motif])},
+                    ),
                     parent=motif,
                 )
             )
@@ -626,6 +914,232 @@ def motif_enrichment(
 
         return motif_hits
 
+    motif_hits = _search_children(
+        children=start.children(),
+        parent=start,
+    )
+
+    # Starting motifs pair residues from the entire foreground
+    motif_hits.update(
+        _search_children(
+            children=start.pairwise_children({start: fg_bits.seqs}),
+            parent=start,
+        )
+    )
+
+    return (
+        motif_hits,
+        dict((motif, done[motif]) for motif in motif_hits),
+        p_dist,
+        dict(failed),
+    )
+
+
+def _get_starts(start_letters, motif_length):
+    # Note: Order matters, put less specific to the end of this list
+    if start_letters is None:
+        start_letters = ["k", "y", "s", "t", "x"]
+
+    return [
+        Motif(
+            "." * (motif_length // 2) + letter + "." * (motif_length // 2)
+        )
+        for letter in start_letters
+    ]
+
+
+def _search_deps(starts):
+    # A search depends on the earlier searches whose motifs its own motifs
+    # can match. Other searches never share visited or done motifs with it.
+    return [
+        [j for j in range(i) if starts[j].motif in starts[i]]
+        for i in range(len(starts))
+    ]
+
+
+def _run_searches(
+    starts, foreground, background,
+    cpu_count=None,
+    **kwargs
+):
+    """
+    Search for motifs from each starting motif.
+
+    Searches that do not depend on each other run in parallel, each one
+    starting as soon as the searches it depends on finish. Every search
+    sees the same done motifs as it would in a serial search, so the motifs
+    found are the same.
+
+    Parameters
+    ----------
+    starts : list of :class:`.Motif`
+    foreground : list of str
+    background : list of str
+    cpu_count : int, optional
+    kwargs : dict
+        Arguments passed to :func:`._search_start`.
+
+    Returns
+    -------
+    results : list of tuple
+        Return value of :func:`._search_start` for each starting motif.
+    """
+    cpu_count = _get_cpu_count(cpu_count)
+    deps = _search_deps(starts)
+    results = [None] * len(starts)
+
+    def _done(i):
+        done = {}
+
+        for j in deps[i]:
+            done.update(results[j][1])
+
+        return done
+
+    if cpu_count <= 1 or len(starts) <= 1:
+        return _search_serial(
+            starts, _SeqBits(foreground), _SeqBits(background),
+            **kwargs
+        )
+
+    LOGGER.info(
+        "Searching {} starting motifs using {} CPUs".format(
+            len(starts),
+            min([cpu_count, len(starts)]),
+        )
+    )
+
+    finished = queue.Queue()
+    pending = list(range(len(starts)))
+    running = 0
+
+    pool = multiprocessing.Pool(
+        processes=min([cpu_count, len(starts)]),
+        initializer=_init_search,
+        initargs=(foreground, background),
+    )
+
+    try:
+        while pending or running:
+            for i in [
+                i for i in pending
+                if all(results[j] is not None for j in deps[i])
+            ]:
+                pending.remove(i)
+                running += 1
+
+                pool.apply_async(
+                    _search_start,
+                    (starts[i], _done(i)),
+                    kwargs,
+                    callback=partial(_put_result, finished, i),
+                    error_callback=partial(_put_result, finished, i),
+                )
+
+            i, val = finished.get()
+            running -= 1
+
+            if isinstance(val, BaseException):
+                raise val
+
+            results[i] = val
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return results
+
+
+def _search_serial(starts, fg_bits, bg_bits, **kwargs):
+    deps = _search_deps(starts)
+    results = []
+
+    for i, start in enumerate(starts):
+        done = {}
+
+        for j in deps[i]:
+            done.update(results[j][1])
+
+        results.append(
+            _search_start(
+                start, done,
+                fg_bits=fg_bits,
+                bg_bits=bg_bits,
+                **kwargs
+            )
+        )
+
+    return results
+
+
+def _put_result(finished, i, val):
+    finished.put((i, val))
+
+
+def run_motif_enrichment(data, f, **kwargs):
+    nmer_args = get_nmer_args(kwargs)
+    foreground = sorted(
+        generate_n_mers(data.filter(f)["Sequence"], **nmer_args)
+    )
+    background = sorted(
+        generate_n_mers(data["Sequence"], **nmer_args)
+    )
+
+    return motif_enrichment(
+        foreground,
+        background,
+        **kwargs
+    )
+
+
+def motif_enrichment(
+    foreground, background,
+    sig_cutoff=0.01,
+    min_fore_hits=0,
+    start_letters=None,
+    pp_value=False,
+    pp_iterations=100,
+    cpu_count=None,
+    seed=None,
+    force=False,
+):
+    """
+    Calculate motifs significantly enriched in a set of sequences. Uses a
+    depth-first search algorithm to find discrete motifs that are enriched in
+    a foreground set compared to a given background [1]_.
+
+    Parameters
+    ----------
+    foreground : list of str
+    background : list of str
+    sig_cutoff : float, optional
+    min_fore_hits : int, optional
+    start_letters : list of str, optional
+    pp_value : bool, optional
+    pp_iterations : int, optional
+    cpu_count : int, optional
+        Number of CPUs to use when searching for motifs and calculating
+        pp-values. Defaults to all but one CPU.
+    seed : int, optional
+        Seed for the random foregrounds used to calculate pp-values.
+    force : bool, optional
+        Recalculate motifs, instead of loading them from
+        :const:`.MOTIF_CACHE_DIR`.
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+    p_dist : list of float
+    pp_dist : list of float
+
+    Notes
+    -----
+    .. [1] Joughin, Brian a et al. "An Integrated Comparative Phosphoproteomic
+           and Bioinformatic Approach Reveals a Novel Class of MPM-2 Motifs
+           Upregulated in EGFRvIII-Expressing Glioblastoma Cells." Molecular
+           bioSystems 5.1 (2009): 59-67.
+    """
+
     fore_size = len(foreground)
     back_size = len(background)
 
@@ -666,6 +1180,7 @@ def motif_enrichment(
         start_letters,
         pp_value,
         pp_iterations if pp_value else None,
+        seed if pp_value else None,
     )
     if not force:
         cache = _get_cache(cache_args)
@@ -684,65 +1199,45 @@ def motif_enrichment(
         )
     )
 
-    visited, done = set(), {}
-    fg_hit_list = defaultdict(list)
-    bg_hit_list = defaultdict(list)
-    failed = defaultdict(int)
-
     # Set the starting motif and begin adding modifications to it.
-    # Note: Order matters, put less specific to the end of this list
-    if start_letters is None:
-        start_letters = ["k", "y", "s", "t", "x"]
-
-    starts = [
-        Motif(
-            "." * (motif_length // 2) + letter + "." * (motif_length // 2)
-        )
-        for letter in start_letters
-    ]
+    starts = _get_starts(start_letters, motif_length)
 
     LOGGER.info(
         "Starting Motifs: {}".format(", ".join(str(i) for i in starts))
     )
 
-    for start in starts:
-        fg_hit_list[start] = foreground
-        bg_hit_list[start] = background
-
-    first_pass = set()
+    first_pass, done, p_dist = set(), {}, []
+    failed = defaultdict(int)
 
     try:
-        for start in starts:
-            first_pass.update(
-                _search_children(
-                    children=start.children(),
-                    parent=start,
-                )
-            )
-
-            first_pass.update(
-                _search_children(
-                    children=start.pairwise_children(fg_hit_list),
-                    parent=start,
-                )
-            )
-
-            del fg_hit_list[start]
-            del bg_hit_list[start]
+        results = _run_searches(
+            starts, foreground, background,
+            cpu_count=cpu_count,
+            sig_cutoff=sig_cutoff,
+            min_fore_hits=min_fore_hits,
+        )
     except KeyboardInterrupt:
         LOGGER.info("Keyboard interrupted motif search")
         return
-    finally:
-        # Output some debugging information to compare with Brian's output
-        LOGGER.info(
-            "\n".join(
-                "FAIL_{}: {}".format(key.upper(), failed[key])
-                for key in [
-                    "done", "sub", "count", "sig", "bestsig",
-                    "anchestry", "checkpat",
-                ]
-            ) + "\nSUCCEED: {}".format(failed["succeed"])
-        )
+
+    for motif_hits, found, start_p_dist, start_failed in results:
+        first_pass.update(motif_hits)
+        done.update(found)
+        p_dist.extend(start_p_dist)
+
+        for key, val in start_failed.items():
+            failed[key] += val
+
+    # Output some debugging information to compare with Brian's output
+    LOGGER.info(
+        "\n".join(
+            "FAIL_{}: {}".format(key.upper(), failed[key])
+            for key in [
+                "done", "sub", "count", "sig", "bestsig",
+                "anchestry", "checkpat",
+            ]
+        ) + "\nSUCCEED: {}".format(failed["succeed"])
+    )
 
     LOGGER.info("First pass: {} motifs".format(len(first_pass)))
 
@@ -762,6 +1257,7 @@ def motif_enrichment(
             min_fore_hits=min_fore_hits,
             start_letters=start_letters,
             cpu_count=cpu_count,
+            seed=seed,
         ) if pp_value else None
 
         if pp_dist is not None and len(pp_dist) != pp_iterations:
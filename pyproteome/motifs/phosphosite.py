@@ -3,10 +3,8 @@ This file includes functions for downloading kinase-substrate associations from
 PhosphoSite Plus (https://www.phosphosite.org/).
 """
 
-from io import BytesIO
 import gzip
 import os
-import requests
 
 import numpy as np
 import pandas as pd
@@ -19,6 +17,7 @@ DATA_URL = "https://www.phosphosite.org/downloads/Kinase_Substrate_Dataset.gz"
 
 
 @pyp.utils.memoize
+@pyp.store.cached("phosphosite")
 def get_data():
     """
     Download the Kinase-Substrate Dataset from Phosphosite Plus.
@@ -27,10 +26,9 @@ def get_data():
     -------
     df : :class:`pandas.DataFrame`
     """
-    data = requests.get(DATA_URL, stream=True)
-    content = BytesIO(data.content)
+    path = pyp.store.fetch("phosphosite", DATA_URL)
 
-    with gzip.GzipFile(fileobj=content) as f:
+    with gzip.open(path) as f:
         df = pd.read_csv(f, skiprows=range(2), sep="\t")
 
     return df
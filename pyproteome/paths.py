@@ -5,6 +5,7 @@ here when using a custom data hierarchy.
 
 import logging
 import os
+import sys
 
 LOGGER = logging.getLogger("pyproteome.paths")
 
@@ -14,15 +15,20 @@ BASE_DIR_OPTS = (
     os.path.abspath(".."),
 )
 
-(
-    BCA_ASSAY_DIR,
-    CAMV_OUT_DIR,
-    CAMV_SESS_DIR,
-    MS_SEARCHED_DIR,
-    MS_RAW_DIR,
-    SCRIPTS_DIR,
-    FIGURES_DIR,
-) = (None,) * 7
+DIR_ATTRS = (
+    "BCA_ASSAY_DIR",
+    "CAMV_OUT_DIR",
+    "CAMV_SESS_DIR",
+    "MS_SEARCHED_DIR",
+    "MS_RAW_DIR",
+    "SCRIPTS_DIR",
+    "FIGURES_DIR",
+)
+"""
+Directory paths that are set by :func:`.set_base_dir`. If none has been set
+when one is first accessed, the base directory is located using
+:func:`.find_base_dir`.
+"""
 
 BCA_NAME = "BCA Protein Assays"
 CAMV_NAME = "CAMV Output"
@@ -53,7 +59,7 @@ def set_base_dir(path):
     path : str
     """
     global \
-        BCA_ASSAY_DIR, CAMV_OUT_DIR, CAMV_SESS_DIR, MASCOT_XML_DIR, \
+        BCA_ASSAY_DIR, CAMV_OUT_DIR, CAMV_SESS_DIR, \
         MS_SEARCHED_DIR, MS_RAW_DIR, SCRIPTS_DIR, FIGURES_DIR
 
     BCA_ASSAY_DIR = os.path.join(path, BCA_NAME)
@@ -96,4 +102,20 @@ def find_base_dir():
     return BASE_DIR_OPTS[0]
 
 
-set_base_dir(find_base_dir())
+def __getattr__(name):
+    if name not in DIR_ATTRS:
+        raise AttributeError(
+            "module '{}' has no attribute '{}'".format(__name__, name)
+        )
+
+    # Only fill in directories that have not already been set by the user
+    base_dir = find_base_dir()
+
+    for attr, dir_name in zip(DIR_ATTRS, DIR_NAMES):
+        globals().setdefault(attr, os.path.join(base_dir, dir_name))
+
+    return globals()[name]
+
+
+if sys.version_info < (3, 7):
+    set_base_dir(find_base_dir())
@@ -9,6 +9,7 @@ Phospho Set Enrichment Analysis (PSEA).
 from __future__ import absolute_import, division
 
 from collections import OrderedDict
+from itertools import chain
 import logging
 import os
 
@@ -22,6 +23,7 @@ import pyproteome as pyp
 import brainrnaseq as brs
 from . import (
     enrichments,
+    genesets,
     gskb,
     msigdb,
     pathwayscommon,
@@ -44,45 +46,17 @@ def _remap_data(psms, from_species, to_species):
         "Remapping phosphosites from {} to {}".format(from_species, to_species)
     )
 
-    mapping = psp.get_phosphomap_data()
-    mapping = mapping[["ACC_ID", "MOD_RSD", "ORGANISM", "SITE_GRP_ID"]]
+    mapping = psp.get_site_mapping(to_species)
+    mapping = mapping[mapping["ORGANISM"] == from_species]
 
-    acc_mapping = mapping[
-        mapping["ORGANISM"] == from_species
-    ].set_index(
-        ["ACC_ID", "MOD_RSD"]
-    ).sort_index()
-    site_mapping = mapping[
-        mapping["ORGANISM"] == to_species
-    ].set_index(
-        ["SITE_GRP_ID"]
-    ).sort_index()
-
-    del mapping
-
-    def _remap(val):
-        acc, mod = val.split(",")
-
-        try:
-            site = acc_mapping.loc[acc, mod]
-        except KeyError:
-            return None
-
-        site = site.iloc[0]["SITE_GRP_ID"]
-
-        try:
-            re_map = site_mapping.loc[site]
-        except KeyError:
-            return None
-
-        if len(re_map.shape) > 1:
-            re_map = re_map.iloc[0]
-
-        acc = re_map["ACC_ID"]
-        mod = re_map["MOD_RSD"]
-        return ",".join([acc, mod])
-
-    new["ID"] = new["ID"].apply(_remap)
+    new["ID"] = new["ID"].map(
+        pd.Series(
+            (
+                mapping["MAPPED_ACC_ID"] + "," + mapping["MAPPED_MOD_RSD"]
+            ).values,
+            index=mapping["ACC_ID"] + "," + mapping["MOD_RSD"],
+        )
+    )
     new = new[~(new["ID"].isnull())]
 
     LOGGER.info(
@@ -93,48 +67,46 @@ def _remap_data(psms, from_species, to_species):
     return new
 
 
-def _get_psite_ids(ds, species):
+def _get_psite_ids(ds, species, columns=None):
     LOGGER.info("Building list of individual phosphosites")
-    new_rows = []
+    rows, ids = [], []
 
-    def _split_rows(row):
-        mods = row["Modifications"].get_mods("Phospho")
+    # Generate IDs for each phosphosite on a peptide mapped to each possible
+    # protein for ambiguous peptides.
+    for pos, (mods, prots) in enumerate(
+        zip(ds.psms["Modifications"], ds.psms["Proteins"])
+    ):
+        accessions = prots.accessions
 
-        # Generate rows for each phosphosite on a peptide mapped to each
-        # possible protein for ambiguous peptides.
-        for mod in mods:
-            for gene, abs_pos in zip(row["Proteins"].accessions, mod.abs_pos):
-                new_row = row.to_dict()
+        for mod in mods.get_mods("Phospho"):
+            letter = mod.letter
 
-                mod_name = "{}{}-p".format(mod.letter, abs_pos + 1)
+            for gene, abs_pos in zip(accessions, mod.abs_pos):
+                rows.append(pos)
+                ids.append("{},{}{}-p".format(gene, letter, abs_pos + 1))
 
-                new_row["ID"] = ",".join([gene, mod_name])
-                new_rows.append(new_row)
+    psms = ds.psms
 
-    ds.psms.apply(_split_rows, axis=1)
+    if columns is not None:
+        psms = psms[[i for i in psms.columns if i in columns]]
 
-    df = pd.DataFrame(new_rows, columns=list(ds.psms.columns) + ["ID"])
+    df = psms.iloc[np.array(rows, dtype=int)].reset_index(drop=True)
+    df["ID"] = ids
 
     return df
 
 
 def _get_protein_ids(psms, species):
     if "Proteins" in psms.columns:
-        return psms["Proteins"].apply(
-            lambda row:
-            brs.mapping.get_entrez_mapping(
-                row.genes[0],
-                species=species,
-            ),
-        )
+        genes = [i.genes[0] for i in psms["Proteins"]]
     else:
-        return psms["Gene"].apply(
-            lambda row:
-            brs.mapping.get_entrez_mapping(
-                row,
-                species=species,
-            ),
-        )
+        genes = list(psms["Gene"])
+
+    return pd.Series(
+        brs.mapping.get_entrez_mappings(genes, species=species),
+        index=psms.index,
+        dtype=object,
+    )
 
 
 def get_pathways(species, p_sites=False, remap=False):
@@ -149,7 +121,7 @@ def get_pathways(species, p_sites=False, remap=False):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info(
         "building gene sets (psites={}, remap={})"
@@ -177,7 +149,7 @@ def get_pathways(species, p_sites=False, remap=False):
 
     LOGGER.info("Loaded {} gene sets".format(pathways_df.shape[0]))
 
-    return pathways_df.reset_index()
+    return genesets.as_gene_sets(pathways_df.reset_index())
 
 
 def _filter_ambiguous_peptides(ds):
@@ -292,50 +264,32 @@ def filter_fn(vals, ds=None, species=None):
             )
         )
 
-    if p_sites:
-        if isinstance(vals, pd.Series):
-            v_set = set(
-                (
-                    x.split(",")[0],
-                    x.split(",")[1][0],
-                    int(x.split(",")[1][1:].split("-")[0]),
-                )
-                for col in col_names
-                for x in vals[col]
-            )
-        else:
-            v_set = set(
-                tup
-                for col in col_names
-                for val_set in vals[col].apply(
-                    lambda s:
-                    set(
-                        (
-                            x.split(",")[0],
-                            x.split(",")[1][0],
-                            int(x.split(",")[1][1:].split("-")[0]),
-                        )
-                        for x in s
-                    ),
-                )
-                for tup in val_set
+    if isinstance(vals, pd.Series):
+        ids = set(
+            i
+            for col in col_names
+            for i in vals[col]
+        )
+    elif col_names == genesets._get_set_cols(vals.columns):
+        ids = set(genesets.as_gene_sets(vals).ids)
+    else:
+        ids = set(
+            chain.from_iterable(
+                chain.from_iterable(vals[col] for col in col_names)
             )
+        )
+
+    if p_sites:
+        sites = pd.Series(list(ids), dtype=object).str.extract(
+            r"^([^,]+),(.)(\d+)",
+        ).dropna()
+        v_set = set(
+            zip(sites[0], sites[1], sites[2].astype(int))
+        )
 
         fn = _p_site_isin
     else:
-        if isinstance(vals, pd.Series):
-            v_set = set(
-                i
-                for col in col_names
-                for i in vals[col]
-            )
-        else:
-            v_set = set(
-                acc
-                for col in col_names
-                for set in vals[col]
-                for acc in set
-            )
+        v_set = ids
 
         fn = _gene_isin
 
@@ -435,7 +389,12 @@ def gsea(
             )
 
         if p_sites:
-            psms = _get_psite_ids(ds, species)
+            psms = _get_psite_ids(
+                ds, species,
+                columns=["Fold Change"] + (
+                    [] if phenotype is None else list(phenotype.index)
+                ),
+            )
         else:
             psms = ds.psms.copy()
             psms["ID"] = _get_protein_ids(psms, species)
@@ -464,7 +423,10 @@ def gsea(
     }
     es_args.update({
         i: kwargs.pop(i)
-        for i in ["p", "pval", "p_iter", "n_cpus"]
+        for i in [
+            "p", "pval", "p_iter", "n_cpus", "max_err", "seed",
+            "shuffle_psms",
+        ]
         if i in kwargs
     })
 
@@ -496,6 +458,7 @@ def gsea(
             vals, gene_changes,
             folder_name=folder_name,
             name=name,
+            p=es_args.get("p"),
             **kwargs
         )
 
@@ -521,14 +484,51 @@ def ssgsea(
     ds=None,
     folder_name=None,
     thres_na=None,
-    *args, **kwargs
+    gene_sets=None,
+    metric="fold",
+    species=None,
+    min_hits=10,
+    p_sites=False,
+    remap=True,
+    **kwargs
 ):
+    """
+    Perform single-sample Gene Set Enrichment Analysis (ssGSEA) on each
+    sample of a data set.
+
+    IDs are mapped and gene sets are loaded and pre-filtered once. All
+    samples are then scored together by
+    :func:`pyproteome.pathways.enrichments.single_sample_scores`, with gene
+    sets that have fewer than min_hits hits in a sample given NaN scores for
+    that sample.
+
+    Parameters
+    ----------
+    ds : :class:`pyproteome.data_sets.DataSet`
+    folder_name : str, optional
+    thres_na : int, optional
+        Minimum number of samples in which a gene set must be scored to be
+        shown in the heatmap. See :func:`.plot_ssgsea_heatmap`.
+    gene_sets : :class:`pandas.DataFrame`, optional
+    metric : str, optional
+        Can be one of ["fold", "log2", "zscore"].
+    species : str, optional
+    min_hits : int, optional
+        Minimum number of hits a gene set needs in a sample to be scored.
+    p_sites : bool, optional
+    remap : bool, optional
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+    """
     assert ds is not None
+    assert metric in ["log2", "fold", "zscore"]
 
     folder_name = pyp.utils.make_folder(
         data=ds,
         folder_name=folder_name,
-        sub="ssPSEA" if kwargs.get("p_sites", False) else "ssGSEA",
+        sub="ssPSEA" if p_sites else "ssGSEA",
     )
 
     cmp_groups = ds.cmp_groups or [list(ds.groups.keys())]
@@ -548,23 +548,63 @@ def ssgsea(
         for sample in samples
     ]
 
-    gsea_vals = OrderedDict()
-
-    assert kwargs.get("metric", "fold") in ["log2", "fold", "zscore"]
-
     LOGGER.info(
         "Calculating ssGSEA scores for {} samples".format(len(samples))
     )
 
-    for ind, (sample, chan) in enumerate(zip(samples, channels), start=1):
-        LOGGER.info(
-            "-- ssGSEA {}/{}: {} ({})".format(ind, len(samples), sample, chan)
+    filtered = _filter_ambiguous_peptides(ds)
+
+    if species is None:
+        species = list(filtered.species)[0]
+
+    if p_sites:
+        psms = _get_psite_ids(filtered, species, columns=channels)
+    else:
+        psms = filtered.psms[channels].copy()
+        psms["ID"] = _get_protein_ids(filtered.psms, species)
+
+    if species not in filtered.species:
+        psms = _remap_data(
+            psms,
+            from_species=list(filtered.species)[0],
+            to_species=species,
         )
 
-        ds.psms["Fold Change"] = ds.psms[chan]
-        vals, gene_changes = gsea(ds=ds, show_plots=False, *args, **kwargs)
+    if gene_sets is None:
+        gene_sets = get_pathways(species, p_sites=p_sites, remap=remap)
+
+    psms = psms[~psms["ID"].isnull()].groupby("ID")[channels].max()
+
+    values = pd.DataFrame(
+        OrderedDict([
+            (
+                sample,
+                enrichments.correlate_phenotype(
+                    pd.DataFrame({"Fold Change": psms[chan]}).dropna(),
+                    metric=metric,
+                )["Correlation"],
+            )
+            for sample, chan in zip(samples, channels)
+        ]),
+        index=psms.index,
+    )
+    values = values[values.notnull().any(axis=1)]
 
-        gsea_vals[sample] = vals
+    gene_sets = enrichments.filter_gene_sets(
+        gene_sets, values.reset_index(),
+        min_hits=min_hits,
+    )
+
+    df_ssgsea = enrichments.single_sample_scores(
+        values,
+        gene_sets,
+        min_hits=min_hits,
+        **{
+            i: kwargs[i]
+            for i in ["p", "pval", "p_iter", "n_cpus", "seed"]
+            if i in kwargs
+        }
+    )
 
     cols = [
         "sample",
@@ -575,30 +615,23 @@ def ssgsea(
         "p-value",
         "q-value",
     ]
+    df_ssgsea = df_ssgsea[[i for i in cols if i in df_ssgsea.columns]]
 
-    for name in gsea_vals:
-        gsea_vals[name]["sample"] = name
-
-    cols = [
-        i
-        for i in cols
-        if any([i in vals.columns for vals in gsea_vals.values()])
-    ]
-
-    df_ssgsea = pd.concat([
-        vals[cols]
-        for vals in gsea_vals.values()
-    ])
-    df_ssgsea["sort_index"] = df_ssgsea["sample"].apply(
-        lambda x: samples.index(x)
+    df_ssgsea.to_csv(
+        os.path.join(
+            folder_name,
+            ("ssPSEA" if p_sites else "ssGSEA") + ".csv",
+        ),
     )
-    df_ssgsea = df_ssgsea.sort_values("sort_index", ascending=True)
 
-    plot_ssgsea_heatmap(
-        df_ssgsea,
-        ds=ds,
-        max_qval=kwargs.get("max_qval", 1),
-    )
+    if "q-value" in df_ssgsea.columns:
+        plot_ssgsea_heatmap(
+            df_ssgsea,
+            ds=ds,
+            max_qval=kwargs.get("max_qval", 1),
+            thres_na=thres_na,
+        )
+
     return df_ssgsea
 
 
@@ -641,7 +674,7 @@ def plot_ssgsea_heatmap(
         name
         for name in set(df["name"])
         if
-        (df["name"] == name).sum() >= thres_na and
+        ((df["name"] == name) & df["NES(S)"].notnull()).sum() >= thres_na and
         ((df["name"] == name) & df["sig"]).sum() >= thres_sig
     ]
     df = df[df["name"].isin(filtered_names)]
@@ -679,6 +712,7 @@ __all__ = [
     filter_fn,
     get_pathways,
     enrichments,
+    genesets,
     gskb,
     msigdb,
     pathwayscommon,
@@ -7,7 +7,8 @@ for GSEA / PSEA.
 """
 from __future__ import division
 
-from collections import defaultdict
+import atexit
+from collections import OrderedDict
 from functools import partial
 import logging
 import os
@@ -16,10 +17,11 @@ import multiprocessing
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
+from scipy import sparse
 import seaborn as sns
-from sklearn.utils import shuffle
 
 import pyproteome as pyp
+from .genesets import as_gene_sets
 
 
 LOGGER = logging.getLogger("pyproteome.enrichments")
@@ -55,6 +57,72 @@ DEFAULT_CORR_CPUS = 4
 """
 Default number of CPUs to use when scrambling columns of a data set.
 """
+MIN_ITER = 100
+"""
+Minimum number of permutations run for every gene set when p-values are
+estimated adaptively.
+"""
+DEFAULT_BLOCK_SIZE = 2 ** 22
+"""
+Maximum number of (hit x permutation) elements scored at once when
+simulating ES(S, pi).
+"""
+
+
+_POOL = [None, 0]
+
+
+def get_pool(n_cpus):
+    """
+    Get the process pool shared by all enrichment analyses.
+
+    The pool is created on first use and reused by later calls to
+    gsea() / ssgsea(). It is recreated if a different number of CPUs is
+    requested, and shut down at exit or by calling close_pool().
+
+    Parameters
+    ----------
+    n_cpus : int
+
+    Returns
+    -------
+    pool : :class:`multiprocessing.pool.Pool`
+    """
+    if _POOL[0] is not None and _POOL[1] != n_cpus:
+        close_pool()
+
+    if _POOL[0] is None:
+        LOGGER.info("Starting process pool with {} cpus".format(n_cpus))
+        _POOL[:] = multiprocessing.Pool(processes=n_cpus), n_cpus
+
+    return _POOL[0]
+
+
+def close_pool(terminate=False):
+    """
+    Shut down the process pool shared by enrichment analyses.
+
+    Parameters
+    ----------
+    terminate : bool, optional
+        Stop workers immediately, without waiting for pending tasks.
+    """
+    pool = _POOL[0]
+
+    if pool is None:
+        return
+
+    _POOL[:] = None, 0
+
+    if terminate:
+        pool.terminate()
+    else:
+        pool.close()
+
+    pool.join()
+
+
+atexit.register(close_pool)
 
 
 class PrPDF(object):
@@ -109,19 +177,139 @@ class PrPDF(object):
         )
 
 
-def _calc_p(ess, ess_pi):
-    return [
-        abs(ess) <= abs(i)
-        for i in ess_pi
-        if (i < 0) == (ess < 0)
-    ]
+def _p_resolved(n_same, n_exceed, max_err):
+    """
+    Check whether permutation p-values have been estimated to within a given
+    relative standard error.
+
+    For p = n_exceed / n_same, the relative standard error of p is
+    sqrt((1 - p) / n_exceed).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (n_exceed > 0) & (
+            (1 - n_exceed / n_same) / n_exceed <= max_err ** 2
+        )
+
+
+def _simulate_ess_pi(
+    ess,
+    psms,
+    gene_sets,
+    phenotype=None,
+    p=None,
+    metric="spearman",
+    p_iter=1000,
+    n_cpus=None,
+    block_size=None,
+    max_err=None,
+    seed=None,
+    shuffle_psms=False,
+):
+    """
+    Calculate ES(S, pi) as a dense (sets x permutations) array.
+
+    Permutations that were not run for a gene set (see max_err in
+    simulate_es_s_pi) are left as NaN.
+
+    Returns
+    -------
+    ess_pi : :class:`numpy.ndarray`
+    n_perms : :class:`numpy.ndarray`
+        Number of permutations run for each gene set.
+    """
+    assert metric in CORRELATION_METRICS
+
+    LOGGER.info(
+        "Calculating ES(S, pi) for {} gene sets".format(len(gene_sets))
+    )
+
+    if n_cpus is None:
+        n_cpus = DEFAULT_RANK_CPUS
+
+        if metric in ["spearman", "pearson", "kendall"]:
+            n_cpus = DEFAULT_CORR_CPUS
+
+    data = _essdist_data(
+        psms, gene_sets,
+        phenotype=phenotype,
+        metric=metric,
+        shuffle_psms=shuffle_psms,
+    )
+
+    ess_pi = np.full((gene_sets.shape[0], p_iter), np.nan)
+    n_perms = np.zeros(gene_sets.shape[0], dtype=int)
+    n_same = np.zeros(gene_sets.shape[0], dtype=int)
+    n_exceed = np.zeros(gene_sets.shape[0], dtype=int)
+    active = np.arange(gene_sets.shape[0])
+    done = 0
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    LOGGER.info("Calculating ES(S, pi) using {} cpus".format(n_cpus))
+
+    pool = get_pool(n_cpus) if n_cpus > 1 else None
 
+    try:
+        while done < p_iter and active.shape[0] > 0:
+            n_round = p_iter - done
 
-def _shuffle(ser):
-    ind = ser.index
-    ser = shuffle(ser)
-    ser.index = ind
-    return ser
+            if max_err is not None:
+                n_round = min([max([done, MIN_ITER]), n_round])
+
+            sub = dict(data, hits=[mat[:, active] for mat in data["hits"]])
+            round_size = block_size
+
+            if round_size is None:
+                round_size = max([
+                    DEFAULT_BLOCK_SIZE // max([
+                        sum(mat.nnz for mat in sub["hits"]), 1,
+                    ]),
+                    1,
+                ])
+
+                if n_cpus > 1:
+                    round_size = min([round_size, -(-n_round // n_cpus)])
+
+            blocks = [
+                range(i, min([i + round_size, done + n_round]))
+                for i in range(done, done + n_round, round_size)
+            ]
+            calc = partial(_calc_essdist, data=sub, p=p, seed=seed)
+
+            if pool is not None and len(blocks) > 1:
+                gen = pool.imap(calc, blocks)
+            else:
+                gen = (calc(i) for i in blocks)
+
+            for block in gen:
+                ess_pi[active, done:done + block.shape[1]] = block
+                n_perms[active] += block.shape[1]
+
+                same = (block < 0) == (ess[active] < 0)[:, None]
+                n_same[active] += same.sum(axis=1)
+                n_exceed[active] += (
+                    same & (abs(block) >= abs(ess[active])[:, None])
+                ).sum(axis=1)
+
+                done += block.shape[1]
+
+                LOGGER.info(
+                    "-- Calculated {}/{} pvals ({} gene sets)"
+                    .format(done, p_iter, active.shape[0])
+                )
+
+            if max_err is not None:
+                active = active[
+                    ~_p_resolved(n_same[active], n_exceed[active], max_err)
+                ]
+    except BaseException:
+        if pool is not None:
+            close_pool(terminate=True)
+
+        raise
+
+    return ess_pi[:, :done], n_perms
 
 
 def simulate_es_s_pi(
@@ -133,11 +321,34 @@ def simulate_es_s_pi(
     metric="spearman",
     p_iter=1000,
     n_cpus=None,
+    block_size=None,
+    max_err=None,
+    seed=None,
+    shuffle_psms=False,
 ):
     """
     Simulate ES(S, pi) by scrambling the phenotype / correlation values for a
     data set and recalculating gene set enrichment scores.
 
+    For the "fold" and "zscore" metrics, peptides are averaged into one value
+    per ID once and each permutation only reassigns those values' ranks. Set
+    shuffle_psms to instead shuffle peptides' values before averaging them.
+
+    Permutations are scored in blocks: each block's permuted rankings form
+    one (IDs x permutations) matrix that is scored against all gene sets at
+    once. Blocks are spread across a shared pool of n_cpus processes.
+
+    Each permutation draws from its own random stream, spawned from seed, so
+    results do not depend on n_cpus or block_size.
+
+    If max_err is set, permutations are run in rounds of doubling size
+    (starting at MIN_ITER) and a gene set stops being permuted once the
+    relative standard error of its p-value is below max_err. Only
+    unresolved sets run the full p_iter permutations.
+
+    All scores are kept in one (sets x permutations) array. Each row of the
+    "ES(S, pi)" column is a view into that array.
+
     Parameters
     ----------
     vals : :class:`pandas.DataFrame`
@@ -148,143 +359,131 @@ def simulate_es_s_pi(
     metric : str, optional
     p_iter : int, optional
     n_cpus : int, optional
+    block_size : int, optional
+        Number of permutations scored in each block. By default, blocks are
+        sized to hold about DEFAULT_BLOCK_SIZE (hit x permutation) elements.
+    max_err : float, optional
+        Relative standard error at which a gene set's p-value is resolved.
+    seed : int or :class:`numpy.random.SeedSequence`, optional
+        Seed for the permutations' random streams.
+    shuffle_psms : bool, optional
+        Shuffle peptide-level values for the "fold" and "zscore" metrics.
 
     Returns
     -------
     df : :class:`pandas.DataFrame`
     """
-    assert metric in CORRELATION_METRICS
-
-    LOGGER.info(
-        "Calculating ES(S, pi) for {} gene sets".format(len(gene_sets))
+    ess_pi, n_perms = _simulate_ess_pi(
+        vals["ES(S)"].reindex(gene_sets.index).values.astype(float),
+        psms, gene_sets,
+        phenotype=phenotype,
+        p=p,
+        metric=metric,
+        p_iter=p_iter,
+        n_cpus=n_cpus,
+        block_size=block_size,
+        max_err=max_err,
+        seed=seed,
+        shuffle_psms=shuffle_psms,
+    )
+    rows = pd.Series(
+        np.arange(gene_sets.shape[0]), index=gene_sets.index,
+    ).reindex(vals.index)
+
+    vals["ES(S, pi)"] = pd.Series(
+        [
+            ess_pi[int(row), :n_perms[int(row)]]
+            if row == row else
+            ess_pi[:0, :0].ravel()
+            for row in rows.values
+        ],
+        index=vals.index,
+        dtype=object,
     )
 
-    if n_cpus is None:
-        n_cpus = DEFAULT_RANK_CPUS
-
-        if metric in ["spearman", "pearson", "kendall"]:
-            n_cpus = DEFAULT_CORR_CPUS
-
-    if n_cpus > 1:
-        pool = multiprocessing.Pool(
-            processes=n_cpus,
-        )
-        gen = pool.imap_unordered(
-            partial(
-                _calc_essdist,
-                psms=psms.copy(),
-                gene_sets=gene_sets,
-                p=p,
-                metric=metric,
-            ),
-            [phenotype for _ in range(p_iter)],
-        )
-    else:
-        gen = (
-            _calc_essdist(
-                phen=phenotype,
-                psms=psms,
-                gene_sets=gene_sets,
-                p=p,
-                metric=metric,
-            )
-            for _ in range(p_iter)
-        )
-
-    ess_dist = defaultdict(list)
-
-    for ind, ess in enumerate(
-        gen,
-        start=1,
-    ):
-        for key, val in ess.items():
-            ess_dist[key].append(val)
-
-        if ind % (p_iter // min([p_iter, 10])) == 0:
-            LOGGER.info(
-                "-- Calculated {}/{} pvals".format(ind, p_iter)
-            )
+    return vals
 
-    LOGGER.info("Calculating ES(S, pi) using {} cpus".format(n_cpus))
 
-    vals["ES(S, pi)"] = vals.index.map(
-        lambda row: ess_dist[row],
+def _dense_pi(ess_pi):
+    # Pad lists of ES(S, pi) values with NaN into a (sets x permutations)
+    # array
+    lens = np.array([len(i) for i in ess_pi], dtype=int)
+    dense = np.full(
+        (lens.shape[0], lens.max() if lens.shape[0] else 0), np.nan,
+    )
+    dense[np.arange(dense.shape[1]) < lens[:, None]] = np.concatenate(
+        [np.asarray(i, dtype=float) for i in ess_pi] or [[]]
     )
 
-    return vals
+    return dense
 
 
-def _calc_q(nes, nes_pdf, nes_pi_pdf):
-    if nes > 0:
-        return (
-            nes_pi_pdf.sf(nes)
-        ) / (
-            nes_pdf.pdf(nes) + nes_pdf.sf(nes)
-        )
+def _calc_q(nes, nes_pdf, nes_pi_pdf, upper):
+    if upper:
+        return nes_pi_pdf.sf(nes) / (nes_pdf.pdf(nes) + nes_pdf.sf(nes))
     else:
-        return (
-            nes_pi_pdf.cdf(nes)
-        ) / (
-            nes_pdf.pdf(nes) + nes_pdf.cdf(nes)
-        )
+        return nes_pi_pdf.cdf(nes) / (nes_pdf.pdf(nes) + nes_pdf.cdf(nes))
 
 
-def estimate_pq(vals):
+def estimate_pq(vals, show_plots=True, ess_pi=None):
     """
     Estimate p- and q-values for an enrichment analysis using the ES(S, pi)
     values generated by `simulate_es_s_pi`.
 
+    All gene sets' permutations are handled together as one (sets x
+    permutations) array.
+
     Parameters
     ----------
     vals : :class:`pandas.DataFrame`
+    show_plots : bool, optional
+        Plot the distributions of NES(S) and NES(S, pi).
+    ess_pi : :class:`numpy.ndarray`, optional
+        (sets x permutations) ES(S, pi) values, with NaN for permutations
+        that were not run. Defaults to the "ES(S, pi)" column of vals.
     """
     assert "ES(S)" in vals.columns
-    assert "ES(S, pi)" in vals.columns
 
-    vals = vals.copy()
+    if ess_pi is None:
+        assert "ES(S, pi)" in vals.columns
 
-    mask = vals["ES(S)"] > 0
+        ess_pi = _dense_pi(vals["ES(S, pi)"].tolist())
 
-    pos_ess = vals["ES(S)"][mask]
-    neg_ess = vals["ES(S)"][~mask]
+    vals = vals.copy()
 
-    pos_pi = vals["ES(S, pi)"].apply(np.array).apply(lambda x: x[x > 0])
-    neg_pi = vals["ES(S, pi)"].apply(np.array).apply(lambda x: x[x < 0])
+    ess = vals["ES(S)"].values.astype(float)
+    valid = ~np.isnan(ess_pi)
 
-    pos_mean = pos_pi.apply(np.mean)
-    neg_mean = neg_pi.apply(np.mean)
+    pos_pi = ess_pi > 0
+    neg_pi = ess_pi < 0
 
-    pos_nes = pos_ess / pos_mean
-    neg_nes = neg_ess.apply(lambda x: -x) / neg_mean
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pos_mean = np.where(pos_pi, ess_pi, 0).sum(axis=1) / pos_pi.sum(axis=1)
+        neg_mean = np.where(neg_pi, ess_pi, 0).sum(axis=1) / neg_pi.sum(axis=1)
 
-    # assert (pos_nes.isnull() | neg_nes.isnull()).all()
-    # assert ((~pos_nes.isnull()) | (~neg_nes.isnull())).all()
+        # Scores with the opposite sign are masked out as NaN
+        pos_pi_nes = np.where(pos_pi, ess_pi / pos_mean[:, None], np.nan)
+        neg_pi_nes = np.where(neg_pi, -ess_pi / neg_mean[:, None], np.nan)
 
-    pos_pi_nes = pos_pi / pos_mean
-    neg_pi_nes = neg_pi.apply(lambda x: -x) / neg_mean
+        mask = ess > 0
+        nes = np.where(mask, ess / pos_mean, -ess / neg_mean)
 
-    vals["NES(S)"] = pos_nes.fillna(neg_nes)
-    vals["pos NES(S, pi)"] = pos_pi_nes
-    vals["neg NES(S, pi)"] = neg_pi_nes
+    vals["NES(S)"] = nes
 
-    pos_mat = (
-        np.concatenate(pos_pi_nes.values)
-        if pos_pi_nes.shape[0] > 0 else
-        np.array([])
-    )
-    neg_mat = (
-        np.concatenate(neg_pi_nes.values)
-        if neg_pi_nes.shape[0] > 0 else
-        np.array([])
-    )
+    # Pool the same number of permutations from each gene set into the null
+    # distribution, as adaptive runs permute some sets more than others.
+    n_min = valid.sum(axis=1).min() if valid.shape[0] > 0 else 0
+    pos_mat = pos_pi_nes[:, :n_min][pos_pi[:, :n_min]]
+    neg_mat = neg_pi_nes[:, :n_min][neg_pi[:, :n_min]]
 
-    plot_nes_dist(
-        vals["NES(S)"].values,
-        np.concatenate([pos_mat, neg_mat]),
-    )
+    if show_plots:
+        plot_nes_dist(
+            nes,
+            np.concatenate([pos_mat, neg_mat]),
+        )
 
-    pos_pdf = PrPDF(pos_nes.dropna().values)
-    neg_pdf = PrPDF(neg_nes.dropna().values)
+    pos_pdf = PrPDF(nes[mask & ~np.isnan(nes)])
+    neg_pdf = PrPDF(nes[~mask & ~np.isnan(nes)])
 
     pos_pi_pdf = PrPDF(pos_mat)
     neg_pi_pdf = PrPDF(neg_mat)
@@ -292,31 +491,25 @@ def estimate_pq(vals):
     LOGGER.info("Generated NES(S) distributions")
 
     if vals.shape[0] > 0:
-        vals["p-value"] = vals.apply(
-            lambda x:
-            _frac_true(
-                _calc_p(x["ES(S)"], x["ES(S, pi)"])
-            ),
-            axis=1,
-        )
+        same = valid & ((ess_pi < 0) == (ess < 0)[:, None])
+        exceed = same & (np.abs(ess)[:, None] <= np.abs(ess_pi))
 
-        vals["q-value"] = vals.apply(
-            lambda x:
-            _calc_q(
-                x["NES(S)"],
-                pos_pdf if x["NES(S)"] > 0 else neg_pdf,
-                pos_pi_pdf if x["NES(S)"] > 0 else neg_pi_pdf,
-            ),
-            axis=1,
-        )
+        vals["p-value"] = exceed.sum(axis=1) / np.maximum(same.sum(axis=1), 1)
 
-        LOGGER.info("Calculated p, q values")
+        upper = nes > 0
+        qvals = np.empty(nes.shape[0])
 
-    return vals
+        if upper.any():
+            qvals[upper] = _calc_q(nes[upper], pos_pdf, pos_pi_pdf, True)
 
+        if (~upper).any():
+            qvals[~upper] = _calc_q(nes[~upper], neg_pdf, neg_pi_pdf, False)
 
-def _frac_true(x):
-    return sum(x) / max([len(x), 1])
+        vals["q-value"] = qvals
+
+        LOGGER.info("Calculated p, q values")
+
+    return vals
 
 
 def get_gene_changes(psms):
@@ -347,27 +540,274 @@ def get_gene_changes(psms):
     return gene_changes
 
 
-def _calc_essdist(phen, psms=None, gene_sets=None, p=None, metric="spearman"):
-    assert metric in CORRELATION_METRICS
+def _essdist_data(
+    psms, gene_sets, phenotype=None, metric="spearman", shuffle_psms=False,
+):
+    gene_sets = as_gene_sets(gene_sets)
+    codes, ids = pd.factorize(psms["ID"])
+    mask = codes >= 0
+
+    data = {
+        "metric": metric,
+        "phenotype": phenotype,
+        "groups": sparse.csr_matrix(
+            (
+                np.ones(mask.sum()),
+                (codes[mask], np.arange(codes.shape[0])[mask]),
+            ),
+            shape=(len(ids), codes.shape[0]),
+        ),
+        "hits": [
+            gene_sets.hits(ids, col=col).tocsc()
+            for col in gene_sets.set_cols
+        ],
+    }
 
-    if phen is not None:
-        phen = _shuffle(phen)
+    if metric in ["spearman", "pearson", "kendall"]:
+        data["values"] = psms[list(phenotype.index)].apply(
+            pd.to_numeric,
+        ).values.astype(float)
+    else:
+        data["corr"] = correlate_phenotype(
+            psms[["Fold Change"]], metric=metric,
+        )["Correlation"].values
 
-    if metric in ["fold", "zscore"]:
-        psms = psms.copy()
-        psms["Fold Change"] = _shuffle(psms["Fold Change"])
+        if metric in ["fold", "zscore"] and not shuffle_psms:
+            # Every permutation shares the same per-ID values and only
+            # reassigns their ranks, so sort them once. IDs without a value
+            # stay at the end of each ranking.
+            corr = _group_mean(data["groups"], data["corr"])
+            data["ranked"] = -np.sort(-corr)[:, None]
+            data["valid"] = ~np.isnan(corr)
 
-    vals = enrichment_scores(
-        psms,
-        gene_sets,
-        phenotype=phen,
-        metric=metric,
-        p=p,
-        recorrelate=True,
-        pval=False,
+    return data
+
+
+def _group_mean(groups, corr):
+    mask = np.isnan(corr)
+    sums = groups.dot(np.where(mask, 0, corr))
+    counts = groups.dot((~mask).astype(float))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / counts
+
+
+def _permutation_rngs(seed, perms):
+    return [
+        np.random.Generator(
+            np.random.PCG64(
+                np.random.SeedSequence(
+                    seed.entropy,
+                    spawn_key=seed.spawn_key + (i,),
+                )
+            )
+        )
+        for i in perms
+    ]
+
+
+def _calc_essdist(perms, data=None, p=None, seed=None):
+    rngs = _permutation_rngs(seed, perms)
+    metric = data["metric"]
+    phen = data["phenotype"]
+
+    if metric in ["spearman", "pearson", "kendall"]:
+        corr = correlate_matrix(
+            data["values"],
+            np.stack(
+                [rng.permutation(phen.values) for rng in rngs],
+                axis=1,
+            ),
+            metric=metric,
+        )
+    elif "ranked" in data:
+        valid = data["valid"]
+        n_valid = valid.sum()
+
+        rank = np.empty((valid.shape[0], len(rngs)), dtype=int)
+        rank[valid] = np.stack(
+            [rng.permutation(n_valid) for rng in rngs],
+            axis=1,
+        )
+        rank[~valid] = np.arange(n_valid, valid.shape[0])[:, None]
+
+        return _es_ranked(data["ranked"], rank, data["hits"], p)
+    elif metric in ["fold", "zscore"]:
+        corr = np.stack(
+            [rng.permutation(data["corr"]) for rng in rngs],
+            axis=1,
+        )
+    else:
+        corr = np.repeat(data["corr"][:, None], len(rngs), axis=1)
+
+    return _es_matrix(_group_mean(data["groups"], corr), data["hits"], p)
+
+
+def _tied_pairs(*vals):
+    # Count pairs tied in all of vals, which are sorted along the last axis
+    equal = vals[0][..., 1:] == vals[0][..., :-1]
+
+    for val in vals[1:]:
+        equal &= val[..., 1:] == val[..., :-1]
+
+    ind = np.arange(1, vals[0].shape[-1])
+    start = np.maximum.accumulate(np.where(equal, 0, ind), axis=-1)
+
+    return (ind - start).sum(axis=-1)
+
+
+def _count_inversions(vals):
+    """
+    Count the pairs i < j with vals[..., i] > vals[..., j].
+
+    Runs a bottom-up merge sort over the last axis of every row at once,
+    counting the left-half elements that each right-half element passes.
+    Merges use numpy's stable sort, which is linear on two sorted runs.
+    """
+    shape, n = vals.shape[:-1], vals.shape[-1]
+    n_pad = 1 << max([n - 1, 0]).bit_length()
+    vals = np.concatenate(
+        [vals, np.full(shape + (n_pad - n,), np.inf)],
+        axis=-1,
     )
+    swaps = np.zeros(shape, dtype=int)
+    width = 1
+
+    while width < n_pad:
+        blocks = vals.reshape(shape + (-1, 2 * width))
+        order = np.argsort(blocks, axis=-1, kind="mergesort")
+        right = order >= width
+        swaps += (
+            (width - np.cumsum(~right, axis=-1)) * right
+        ).sum(axis=(-2, -1))
+        vals = np.take_along_axis(blocks, order, axis=-1).reshape(vals.shape)
+        width *= 2
+
+    return swaps
+
+
+def _kendall(x, y):
+    """
+    Calculate Kendall's tau-b between x and y along their last axis, using
+    Knight's O(n log n) algorithm.
+    """
+    n = x.shape[-1]
+    n_0 = n * (n - 1) // 2
+
+    order = np.lexsort((y, x), axis=-1)
+    x = np.take_along_axis(x, order, axis=-1)
+    y = np.take_along_axis(y, order, axis=-1)
+
+    n_1 = _tied_pairs(x)
+    n_2 = _tied_pairs(np.sort(y, axis=-1))
+    n_3 = _tied_pairs(x, y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (
+            n_0 - n_1 - n_2 + n_3 - 2 * _count_inversions(y)
+        ) / np.sqrt((n_0 - n_1) * (n_0 - n_2))
+
+
+def _pearson(x, y):
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=0, keepdims=True)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return x.dot(y) / np.sqrt(
+            (x ** 2).sum(axis=1)[:, None] * (y ** 2).sum(axis=0)[None, :]
+        )
+
+
+def _correlate(x, y, metric):
+    if metric == "pearson":
+        return _pearson(x, y)
+
+    if metric == "spearman":
+        return _pearson(
+            pd.DataFrame(x).rank(axis=1).values,
+            pd.DataFrame(y).rank(axis=0).values,
+        )
+
+    # Score (rows x phenotypes) pairs in chunks of about DEFAULT_BLOCK_SIZE
+    corr = np.empty((x.shape[0], y.shape[1]))
+    step = max([DEFAULT_BLOCK_SIZE // max([y.size, 1]), 1])
+
+    for ind in range(0, x.shape[0], step):
+        chunk = x[ind:ind + step]
+        corr[ind:ind + step] = _kendall(
+            np.repeat(chunk[:, None, :], y.shape[1], axis=1),
+            np.repeat(y.T[None, :, :], chunk.shape[0], axis=0),
+        )
+
+    return corr
+
+
+def correlate_matrix(data, phenotypes, metric="spearman", min_periods=None):
+    """
+    Correlate each row of a data matrix against one or more phenotypes.
+
+    Samples missing from either side are dropped pairwise and scores with
+    fewer than min_periods pairs are NaN, as in pandas.Series.corr(). Rows
+    are scored in groups that share the same missing samples.
+
+    Parameters
+    ----------
+    data : :class:`numpy.ndarray`
+        (rows x samples) quantification values.
+    phenotypes : :class:`numpy.ndarray`
+        (samples,) phenotype or (samples x phenotypes) matrix, such as a set
+        of permuted phenotypes.
+    metric : str, optional
+        One of "spearman", "pearson", or "kendall".
+    min_periods : int, optional
+        Defaults to MIN_PERIODS.
+
+    Returns
+    -------
+    corr : :class:`numpy.ndarray`
+        (rows,) or (rows x phenotypes) correlation values.
+    """
+    assert metric in ["spearman", "pearson", "kendall"]
+
+    if min_periods is None:
+        min_periods = MIN_PERIODS
+
+    data = np.asarray(data, dtype=float)
+    phenotypes = np.asarray(phenotypes, dtype=float)
+    vector = phenotypes.ndim == 1
+
+    if vector:
+        phenotypes = phenotypes[:, None]
+
+    corr = np.full((data.shape[0], phenotypes.shape[1]), np.nan)
+
+    x_masks, x_groups = np.unique(
+        ~np.isnan(data), axis=0, return_inverse=True,
+    )
+    y_masks, y_groups = np.unique(
+        ~np.isnan(phenotypes).T, axis=0, return_inverse=True,
+    )
+
+    for y_ind, y_mask in enumerate(y_masks):
+        cols = np.nonzero(y_groups == y_ind)[0]
+
+        for x_ind, x_mask in enumerate(x_masks):
+            mask = x_mask & y_mask
+
+            if mask.sum() < max([min_periods, 1]):
+                continue
+
+            rows = np.nonzero(x_groups == x_ind)[0]
+            corr[np.ix_(rows, cols)] = np.clip(
+                _correlate(
+                    data[np.ix_(rows, mask)],
+                    phenotypes[np.ix_(mask, cols)],
+                    metric,
+                ),
+                -1, 1,
+            )
 
-    return vals["ES(S)"]
+    return corr[:, 0] if vector else corr
 
 
 def correlate_phenotype(psms, phenotype=None, metric="spearman"):
@@ -391,14 +831,10 @@ def correlate_phenotype(psms, phenotype=None, metric="spearman"):
             "Calculating correlations using metric '{}' (samples: {})"
             .format(metric, list(phenotype.index))
         )
-        psms["Correlation"] = psms.apply(
-            lambda row:
-            phenotype.corr(
-                pd.to_numeric(row[phenotype.index]),
-                method=metric,
-                min_periods=MIN_PERIODS,
-            ),
-            axis=1,
+        psms["Correlation"] = correlate_matrix(
+            psms[list(phenotype.index)].apply(pd.to_numeric).values,
+            phenotype.values,
+            metric=metric,
         )
     else:
         LOGGER.info(
@@ -420,6 +856,28 @@ def correlate_phenotype(psms, phenotype=None, metric="spearman"):
     return psms
 
 
+def _running_sum(hits, corr, p, n_h):
+    n = hits.shape[0]
+    weights = np.abs(corr) ** p
+    n_r = np.nansum(weights[hits])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(
+            hits,
+            weights / n_r,
+            (-1 / (n - n_h)) if n != n_h else 0,
+        )
+
+    return np.cumsum(np.concatenate([[0], scores]))
+
+
+def _es_from_cumsum(cumsum):
+    ess = cumsum.max() - cumsum.min()
+    ess *= np.sign(max(cumsum, key=abs))
+
+    return ess
+
+
 def calculate_es_s(gene_changes, gene_set, p=None, n_h=None):
     """
     Calculate the enrichment score for an individual gene set.
@@ -434,8 +892,6 @@ def calculate_es_s(gene_changes, gene_set, p=None, n_h=None):
     if p is None:
         p = DEFAULT_P
 
-    n = len(gene_changes)
-
     gene_set = set(
         gene
         for gene in gene_set
@@ -447,26 +903,12 @@ def calculate_es_s(gene_changes, gene_set, p=None, n_h=None):
     if n_h is None:
         n_h = len(gene_set)
 
-    n_r = gene_changes[hits]["Correlation"].apply(
-        lambda x: abs(x) ** p
-    ).sum()
-
-    scores = [0] + [
-        ((abs(val) ** p) / n_r)
-        if hit else
-        (-1 / (n - n_h))
-        for hit, val in zip(hits, gene_changes["Correlation"])
-    ]
-    cumsum = np.cumsum(scores)
-
-    ess = cumsum.max() - cumsum.min()
-    ess *= np.sign(max(cumsum, key=abs))
-    # ess = max(cumsum, key=abs)
+    cumsum = _running_sum(hits, gene_changes["Correlation"].values, p, n_h)
 
     return {
         "hits": hits,
         "cumscore": cumsum,
-        "ess": ess,
+        "ess": _es_from_cumsum(cumsum),
         "hit_list": hit_list,
     }
 
@@ -527,13 +969,337 @@ def calculate_es_s_ud(gene_changes, up_set, down_set, p=None):
     }
 
 
-def _get_set_cols(cols):
-    for set_cols in [
-        ["up_set", "down_set"],
-        ["set"],
-    ]:
-        if any([i in cols for i in set_cols]):
-            return set_cols
+def _running_es(pos, weights, indptr, n, n_h):
+    """
+    Find the extremes of the running-sum statistic of many gene sets against
+    one or more rankings at once.
+
+    A running sum is linear between two hits, so its extremes lie just
+    before or after a hit (or at either end of the walk). Only those points
+    are evaluated, without building each cumsum.
+
+    Parameters
+    ----------
+    pos : :class:`numpy.ndarray`
+        (hits x rankings) rank positions of each set's hits, sorted within
+        each set.
+    weights : :class:`numpy.ndarray`
+        (hits x rankings) abs(correlation) ** p of each hit.
+    indptr : :class:`numpy.ndarray`
+        Offsets of each set's hits in pos / weights.
+    n : int
+        Number of ranked IDs.
+    n_h : :class:`numpy.ndarray`
+        Hit count used to weight each set's misses.
+
+    Returns
+    -------
+    es_max : :class:`numpy.ndarray`
+    es_min : :class:`numpy.ndarray`
+        (sets x rankings) maximum and minimum of each running sum.
+    """
+    m = np.diff(indptr)
+    n_sets, n_cols = m.shape[0], pos.shape[1]
+    nonempty = m > 0
+    starts = indptr[:-1][nonempty]
+
+    miss = np.zeros(n_sets)
+    np.divide(1, n - n_h, out=miss, where=n != n_h)
+
+    n_r = np.zeros((n_sets, n_cols))
+    seg_max = np.full((n_sets, n_cols), -np.inf)
+    seg_min = np.full((n_sets, n_cols), np.inf)
+
+    if starts.shape[0] > 0:
+        # A NaN hit makes a set's running sum, and ES(S), NaN (as in
+        # calculate_es_s), without spilling into any other set
+        missing = np.isnan(weights)
+        weights = np.where(missing, 0, weights)
+
+        n_r[nonempty] = np.add.reduceat(weights, starts, axis=0)
+
+        # Cumulative hit weight within each set, reset at the start of each
+        # set by subtracting the previous set's total
+        cum = weights.copy()
+        cum[starts[1:]] -= n_r[nonempty][:-1]
+        cum = np.cumsum(cum, axis=0)
+        # Number of misses seen up to and including each hit
+        n_miss = pos + 1 - (
+            np.arange(pos.shape[0]) - np.repeat(indptr[:-1], m) + 1
+        )[:, None]
+
+        r_n_r = np.repeat(n_r, m, axis=0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            after = cum / r_n_r - n_miss * np.repeat(miss, m)[:, None]
+            before = after - weights / r_n_r
+
+        seg_max[nonempty] = np.maximum(
+            np.maximum.reduceat(after, starts, axis=0),
+            np.maximum.reduceat(before, starts, axis=0),
+        )
+        seg_min[nonempty] = np.minimum(
+            np.minimum.reduceat(after, starts, axis=0),
+            np.minimum.reduceat(before, starts, axis=0),
+        )
+
+        nan_sets = np.zeros((n_sets, n_cols), dtype=bool)
+        nan_sets[nonempty] = np.logical_or.reduceat(missing, starts, axis=0)
+        seg_max[nan_sets] = np.nan
+        seg_min[nan_sets] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        end = np.where(nonempty[:, None], n_r / n_r, 0) - (
+            (n - m) * miss
+        )[:, None]
+
+    es_max = np.maximum(np.maximum(seg_max, end), 0)
+    es_min = np.minimum(np.minimum(seg_min, end), 0)
+
+    return es_max, es_min
+
+
+def _max_deviation(pos, corr, p, n_h):
+    """
+    Find the position in a running sum (as built by _running_sum) with the
+    largest absolute deviation from 0, using only the set's hit positions.
+    """
+    n = corr.shape[0]
+    weights = np.abs(corr[pos]) ** p
+    n_r = np.nansum(weights)
+    miss = 1 / (n - n_h) if n != n_h else 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        after = np.cumsum(weights) / n_r - (
+            pos + 1 - np.arange(1, pos.shape[0] + 1)
+        ) * miss
+        before = after - weights / n_r
+
+        end = (1 if pos.shape[0] > 0 else 0) - (n - pos.shape[0]) * miss
+
+    points = np.concatenate([[0], pos, pos + 1, [n]])
+    scores = np.concatenate([[0], before, after, [end]])
+    order = np.argsort(points, kind="mergesort")
+
+    return int(points[order][np.nanargmax(np.abs(scores[order]))])
+
+
+def running_sums(row, gene_changes, p=None):
+    """
+    Recompute the running-sum statistic of one gene set from the hit
+    positions stored by :func:`.enrichment_scores`.
+
+    Parameters
+    ----------
+    row : :class:`pandas.Series`
+        One row of the table returned by enrichment_scores().
+    gene_changes : :class:`pandas.DataFrame`
+        The ranked IDs that row was scored against.
+    p : float, optional
+
+    Returns
+    -------
+    dict
+        "hits" and "cumscore", as well as "down_hits" and "down_cumscore"
+        for phospho sets, matching the output of calculate_es_s() /
+        calculate_es_s_ud().
+    """
+    if p is None:
+        p = DEFAULT_P
+
+    corr = gene_changes["Correlation"].values
+    cols = [
+        col
+        for col in ["hit_pos", "down_hit_pos"]
+        if col in row.index
+    ]
+    n_h = sum(len(row[col]) for col in cols)
+    out = {}
+
+    for col, prefix in zip(cols, ["", "down_"]):
+        hits = np.zeros(corr.shape[0], dtype=bool)
+        hits[row[col]] = True
+
+        out[prefix + "hits"] = hits
+        out[prefix + "cumscore"] = _running_sum(hits, corr, p, n_h)
+
+    return out
+
+
+def leading_edge(row, gene_changes):
+    """
+    Get the IDs in the leading edge of a gene set: the hits ranked before
+    the running sum's maximum deviation for positive scores, and after it
+    for negative scores.
+
+    Down-regulated phospho sets use the opposite direction of ES(S).
+
+    Parameters
+    ----------
+    row : :class:`pandas.Series`
+        One row of the table returned by enrichment_scores().
+    gene_changes : :class:`pandas.DataFrame`
+
+    Returns
+    -------
+    list of str
+    """
+    edge = []
+
+    for col, sign in [("", 1), ("down_", -1)]:
+        if col + "hit_pos" not in row.index:
+            continue
+
+        pos = np.asarray(row[col + "hit_pos"], dtype=int)
+        max_pos = row[col + "max_pos"]
+
+        if sign * row["ES(S)"] >= 0:
+            pos = pos[pos < max_pos]
+        else:
+            pos = pos[pos >= max_pos]
+
+        edge += gene_changes.index[pos].tolist()
+
+    return edge
+
+
+def _es_matrix(values, hits, p, exact=False):
+    """
+    Calculate the enrichment scores of gene sets against many rankings.
+
+    Parameters
+    ----------
+    values : :class:`numpy.ndarray`
+        (IDs x rankings) correlation values.
+    hits : list of :class:`scipy.sparse.csc_matrix`
+        (IDs x sets) incidence matrices, one for each set column.
+    p : float
+    exact : bool, optional
+        Break ties between a running sum's maximum and minimum by which
+        occurs first, as calculate_es_s() does.
+
+    Returns
+    -------
+    ess : :class:`numpy.ndarray`
+        (sets x rankings) enrichment scores.
+    """
+    n = values.shape[0]
+    order = np.argsort(-values, axis=0, kind="mergesort")
+
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(n)[:, None], axis=0)
+
+    return _es_ranked(
+        np.take_along_axis(values, order, axis=0), rank, hits, p,
+        exact=exact,
+    )
+
+
+def _es_ranked(ranked, rank, hits, p, exact=False):
+    """
+    Calculate the enrichment scores of gene sets against rankings that have
+    already been sorted.
+
+    Parameters
+    ----------
+    ranked : :class:`numpy.ndarray`
+        (IDs x rankings) correlation values, sorted in descending order. A
+        single column is shared by all rankings.
+    rank : :class:`numpy.ndarray`
+        (IDs x rankings) position of each ID in its ranking.
+    hits : list of :class:`scipy.sparse.csc_matrix`
+    p : float
+    exact : bool, optional
+
+    Returns
+    -------
+    ess : :class:`numpy.ndarray`
+        (sets x rankings) enrichment scores.
+    """
+    if p is None:
+        p = DEFAULT_P
+
+    n = rank.shape[0]
+    weights = np.abs(ranked) ** p
+
+    n_hits = [np.diff(mat.indptr) for mat in hits]
+    n_h = sum(n_hits)
+    ess = []
+
+    for mat, m in zip(hits, n_hits):
+        offset = (np.repeat(np.arange(m.shape[0]), m) * n)[:, None]
+        pos = np.sort(rank[mat.indices] + offset, axis=0) - offset
+
+        es_max, es_min = _running_es(
+            pos,
+            np.take_along_axis(weights, pos, axis=0),
+            mat.indptr,
+            n,
+            n_h,
+        )
+        es = (es_max - es_min) * np.where(es_max >= -es_min, 1, -1)
+
+        if exact:
+            # Extremes built from different sums can differ by rounding
+            # error, recompute any near-ties as calculate_es_s() does
+            for ind, col in zip(
+                *np.nonzero(np.isclose(es_max, -es_min) & (es_max != 0))
+            ):
+                hit = np.zeros(n, dtype=bool)
+                hit[pos[mat.indptr[ind]:mat.indptr[ind + 1], col]] = True
+                es[ind, col] = _es_from_cumsum(
+                    _running_sum(
+                        hit,
+                        ranked[:, col if ranked.shape[1] > 1 else 0],
+                        p,
+                        n_h[ind],
+                    )
+                )
+
+        ess.append(
+            np.where(m[:, None] > 0, es, 0)
+            if len(hits) > 1 else
+            es
+        )
+
+    return ess[0] - ess[1] if len(ess) > 1 else ess[0]
+
+
+def calculate_es_s_sets(gene_changes, gene_sets, p=None):
+    """
+    Calculate the enrichment scores for all gene sets at once.
+
+    Gene sets are encoded as sparse incidence matrices against the ranked
+    IDs in gene_changes. Scores match those from calculate_es_s() /
+    calculate_es_s_ud().
+
+    Parameters
+    ----------
+    gene_changes : :class:`pandas.DataFrame`
+    gene_sets : :class:`pandas.DataFrame`
+    p : float, optional
+
+    Returns
+    -------
+    dict
+        "ess" is an array of enrichment scores, "hits" a list of (IDs x
+        sets) incidence matrices, one for each set column.
+    """
+    gene_sets = as_gene_sets(gene_sets)
+    hits = [
+        gene_sets.hits(gene_changes.index, col=col).tocsc()
+        for col in gene_sets.set_cols
+    ]
+
+    return {
+        "ess": _es_matrix(
+            gene_changes["Correlation"].values[:, None],
+            hits,
+            p,
+            exact=True,
+        )[:, 0],
+        "hits": hits,
+    }
 
 
 def enrichment_scores(
@@ -546,6 +1312,9 @@ def enrichment_scores(
     recorrelate=False,
     p_iter=1000,
     n_cpus=None,
+    max_err=None,
+    seed=None,
+    shuffle_psms=False,
 ):
     """
     Calculate enrichment scores for each gene set.
@@ -565,6 +1334,14 @@ def enrichment_scores(
     recorrelate : bool, optional
     p_iter : int, optional
     n_cpus : int, optional
+    max_err : float, optional
+        Stop permuting each gene set once its p-value's relative standard
+        error is below this bound. See simulate_es_s_pi().
+    seed : int, optional
+        Seed for the permutations used to estimate p-values.
+    shuffle_psms : bool, optional
+        Shuffle peptide-level fold changes, rather than per-ID values, when
+        estimating p-values. See simulate_es_s_pi().
 
     Returns
     -------
@@ -583,65 +1360,78 @@ def enrichment_scores(
 
     gene_changes = get_gene_changes(psms)
 
-    set_cols = _get_set_cols(gene_sets.columns)
+    gene_sets = as_gene_sets(gene_sets)
+    set_cols = gene_sets.set_cols
 
-    cols = [
-        "name",
-        "cumscore",
-        "down_cumscore",
-        "ES(S)",
-        "hits",
-        "down_hits",
-        "hit_list",
-        "n_hits",
-    ] + set_cols
-    vals = pd.DataFrame(
-        columns=cols,
-    )
+    scores = calculate_es_s_sets(gene_changes, gene_sets, p=p)
 
-    for set_id, row in gene_sets.iterrows():
-        if set(set_cols) == set(["set"]):
-            es_vals = calculate_es_s(
-                gene_changes,
-                row["set"],
-                p=p,
-            )
-        else:
-            es_vals = calculate_es_s_ud(
-                gene_changes,
-                row["up_set"],
-                row["down_set"],
-                p=p,
-            )
+    if p is None:
+        p = DEFAULT_P
 
-        vals = vals.append(
-            pd.Series(
-                [
-                    row["name"],
-                    es_vals.get("cumscore", []),
-                    es_vals.get("down_cumscore", []),
-                    es_vals.get("ess", 0),
-                    es_vals.get("hits", []),
-                    es_vals.get("down_hits", []),
-                    es_vals.get("hit_list", []),
-                    len(es_vals.get("hit_list", [])),
-                ] + [row[i] for i in set_cols],
-                name=set_id,
-                index=cols,
-            )
-        )
+    corr = gene_changes["Correlation"].values
+    n_h = sum(np.diff(mat.indptr) for mat in scores["hits"])
+    hit_pos = [
+        [
+            np.sort(mat.indices[mat.indptr[ind]:mat.indptr[ind + 1]])
+            for ind in range(gene_sets.shape[0])
+        ]
+        for mat in scores["hits"]
+    ]
+    hit_list = [
+        [
+            i
+            for pos in hit_pos
+            for i in gene_changes.index[pos[ind]]
+        ]
+        for ind in range(gene_sets.shape[0])
+    ]
+
+    def _col(vals):
+        return pd.Series(vals, index=gene_sets.index, dtype=object)
+
+    vals = pd.DataFrame(
+        OrderedDict([
+            ("name", gene_sets["name"]),
+            ("ES(S)", pd.Series(scores["ess"], index=gene_sets.index)),
+        ] + [
+            (prefix + col, col_vals)
+            for pos, prefix in zip(hit_pos, ["", "down_"])
+            for col, col_vals in [
+                ("max_pos", pd.Series(
+                    [
+                        _max_deviation(i, corr, p, n)
+                        for i, n in zip(pos, n_h)
+                    ],
+                    index=gene_sets.index,
+                )),
+                ("hit_pos", _col(pos)),
+            ]
+        ] + [
+            ("hit_list", _col(hit_list)),
+            ("n_hits", pd.Series(
+                [len(i) for i in hit_list], index=gene_sets.index,
+            )),
+        ] + [
+            (col, gene_sets[col])
+            for col in set_cols
+        ]),
+        index=gene_sets.index,
+    )
 
     if pval:
-        vals = simulate_es_s_pi(
-            vals, psms, gene_sets,
+        ess_pi, _ = _simulate_ess_pi(
+            scores["ess"], psms, gene_sets,
             phenotype=phenotype,
             p=p,
             metric=metric,
             p_iter=p_iter,
             n_cpus=n_cpus,
+            max_err=max_err,
+            seed=seed,
+            shuffle_psms=shuffle_psms,
         )
 
-        vals = estimate_pq(vals)
+        vals = estimate_pq(vals, ess_pi=ess_pi)
         vals = vals.sort_values("NES(S)", ascending=False)
     else:
         vals = vals.sort_values("ES(S)", ascending=False)
@@ -649,6 +1439,195 @@ def enrichment_scores(
     return vals
 
 
+def _ss_data(values, gene_sets):
+    # Group samples by which IDs they quantify, so that each group can be
+    # ranked as one matrix.
+    mask = ~np.isnan(values.values)
+    patterns, inverse = np.unique(mask, axis=1, return_inverse=True)
+    groups = []
+
+    for ind, pattern in enumerate(patterns.T):
+        rows = np.nonzero(pattern)[0]
+        groups.append((
+            rows,
+            np.nonzero(inverse.ravel() == ind)[0],
+            [
+                gene_sets.hits(values.index[rows], col=col).tocsc()
+                for col in gene_sets.set_cols
+            ],
+        ))
+
+    return {
+        "values": values.values.astype(float),
+        "groups": groups,
+        "n_sets": gene_sets.shape[0],
+    }
+
+
+def _calc_ss_essdist(perms, data=None, p=None, seed=None):
+    rngs = _permutation_rngs(seed, perms)
+    ess = np.empty((data["n_sets"], data["values"].shape[1], len(perms)))
+
+    for rows, cols, hits in data["groups"]:
+        # Each permutation reorders the IDs of every sample in the same way
+        order = np.stack(
+            [rng.permutation(rows.shape[0]) for rng in rngs],
+            axis=1,
+        )
+        values = data["values"][rows][:, cols][order]
+
+        ess[:, cols] = _es_matrix(
+            values.reshape(rows.shape[0], -1), hits, p,
+        ).reshape(ess.shape[0], len(perms), cols.shape[0]).transpose(0, 2, 1)
+
+    return ess
+
+
+def single_sample_scores(
+    values,
+    gene_sets,
+    p=None,
+    pval=True,
+    p_iter=1000,
+    n_cpus=None,
+    block_size=None,
+    seed=None,
+    min_hits=0,
+):
+    """
+    Calculate single-sample enrichment scores for many samples at once.
+
+    Gene set incidence matrices are built once and every sample is scored as
+    a column of one (IDs x samples) matrix. Permutations reorder the IDs of
+    all samples together, so one set of permutations is shared across
+    samples.
+
+    Parameters
+    ----------
+    values : :class:`pandas.DataFrame`
+        (IDs x samples) ranking values, such as the "Correlation" column
+        generated by :func:`.correlate_phenotype` for each sample. IDs with
+        missing values are left out of that sample's ranking.
+    gene_sets : :class:`pandas.DataFrame`
+    p : float, optional
+    pval : bool, optional
+    p_iter : int, optional
+    n_cpus : int, optional
+    block_size : int, optional
+        Number of permutations scored in each block.
+    seed : int or :class:`numpy.random.SeedSequence`, optional
+    min_hits : int, optional
+        Gene sets with fewer hits than this in a sample are given NaN scores
+        for that sample and left out of its p- and q-value estimates.
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+        One row for each sample and gene set, with "sample", "name", "ES(S)",
+        and "n_hits" columns, as well as "NES(S)", "p-value", and "q-value"
+        if pval is set.
+    """
+    gene_sets = as_gene_sets(gene_sets)
+    data = _ss_data(values, gene_sets)
+
+    n_sets, n_samples = gene_sets.shape[0], values.shape[1]
+    ess = np.zeros((n_sets, n_samples))
+    n_hits = np.zeros((n_sets, n_samples), dtype=int)
+
+    LOGGER.info(
+        "Calculating ES(S) for {} gene sets, {} samples"
+        .format(n_sets, n_samples)
+    )
+
+    for rows, cols, hits in data["groups"]:
+        ess[:, cols] = _es_matrix(
+            data["values"][rows][:, cols], hits, p, exact=True,
+        )
+        n_hits[:, cols] = sum(np.diff(mat.indptr) for mat in hits)[:, None]
+
+    scored = n_hits >= min_hits
+    ess[~scored] = np.nan
+
+    ess_pi = np.zeros((n_sets, n_samples, 0))
+
+    if pval:
+        if n_cpus is None:
+            n_cpus = DEFAULT_RANK_CPUS
+
+        if block_size is None:
+            block_size = max([
+                DEFAULT_BLOCK_SIZE // max([
+                    sum(
+                        mat.nnz * cols.shape[0]
+                        for _, cols, hits in data["groups"]
+                        for mat in hits
+                    ),
+                    1,
+                ]),
+                1,
+            ])
+
+            if n_cpus > 1:
+                block_size = min([block_size, -(-p_iter // n_cpus)])
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+
+        blocks = [
+            range(i, min([i + block_size, p_iter]))
+            for i in range(0, p_iter, block_size)
+        ]
+        calc = partial(_calc_ss_essdist, data=data, p=p, seed=seed)
+        pool = get_pool(n_cpus) if n_cpus > 1 and len(blocks) > 1 else None
+
+        LOGGER.info(
+            "Calculating ES(S, pi) using {} cpus".format(max([n_cpus, 1]))
+        )
+
+        try:
+            ess_pi = np.concatenate(
+                list(
+                    pool.imap(calc, blocks)
+                    if pool is not None else
+                    (calc(i) for i in blocks)
+                ) or [ess_pi],
+                axis=2,
+            )
+        except BaseException:
+            if pool is not None:
+                close_pool(terminate=True)
+
+            raise
+
+    vals = []
+
+    for ind, sample in enumerate(values.columns):
+        sample_vals = pd.DataFrame(
+            OrderedDict([
+                ("sample", sample),
+                ("name", gene_sets["name"]),
+                ("ES(S)", ess[:, ind]),
+                ("n_hits", n_hits[:, ind]),
+            ]),
+            index=gene_sets.index,
+        )
+
+        if pval:
+            keep = scored[:, ind]
+            sample_vals = pd.concat([
+                estimate_pq(
+                    sample_vals[keep],
+                    show_plots=False,
+                    ess_pi=ess_pi[keep, ind],
+                ),
+                sample_vals[~keep],
+            ]).loc[sample_vals.index]
+
+        vals.append(sample_vals)
+
+    return pd.concat(vals) if vals else pd.DataFrame()
+
+
 def filter_gene_sets(gene_sets, psms, min_hits=10):
     """
     Filter gene sets to include only those with at least a given number of
@@ -662,32 +1641,20 @@ def filter_gene_sets(gene_sets, psms, min_hits=10):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Filtering gene sets")
 
-    total_sets = gene_sets
-    all_genes = set(psms["ID"])
+    total_sets = gene_sets = as_gene_sets(gene_sets)
+    all_genes = psms["ID"].unique()
 
-    set_cols = _get_set_cols(gene_sets.columns)
-    combined_set = gene_sets.apply(
-        lambda x:
-        set(
-            i
-            for col in set_cols
-            for i in x[col]
-        ),
-        axis=1,
+    gene_sets = gene_sets._subset(
+        (
+            (gene_sets.sizes() < len(all_genes)) &
+            (gene_sets.overlap(all_genes) >= min_hits)
+        ).values
     )
 
-    gene_sets = gene_sets[
-        combined_set.apply(
-            lambda x:
-            len(x) < len(all_genes) and
-            len(all_genes.intersection(x)) >= min_hits
-        )
-    ]
-
     LOGGER.info(
         "Filtered {} gene sets down to {} with ≥ {} genes present"
         .format(total_sets.shape[0], gene_sets.shape[0], min_hits)
@@ -939,16 +1906,35 @@ def plot_correlations(gene_changes, figsize=None):
 def plot_enrichment(
     vals,
     cols=5,
+    gene_changes=None,
+    p=None,
 ):
     """
     Plot enrichment score curves for each gene set.
 
+    Running sums are recomputed from each set's hit positions, so
+    gene_changes must be the ranked IDs that vals was scored against.
+
     Parameters
     ----------
     vals : :class:`pandas.DataFrame`
         The gene sets and scores calculated by enrichment_scores().
     cols : int, optional
+    gene_changes : :class:`pandas.DataFrame`, optional
+        Required unless vals already carries cumscore / hits columns.
+    p : float, optional
+
+    Examples
+    --------
+    >>> gene_changes = get_gene_changes(psms)
+    >>> vals = enrichment_scores(psms, gene_sets)
+    >>> f, axes = plot_enrichment(vals, gene_changes=gene_changes)
     """
+    if gene_changes is None and "hit_pos" in vals.columns:
+        raise ValueError(
+            "gene_changes is needed to recompute running sums for vals"
+        )
+
     LOGGER.info("Plotting ES(S) graphs")
 
     rows = max([int(np.ceil(len(vals) / cols)), 1])
@@ -970,6 +1956,12 @@ def plot_enrichment(
     for index, (set_id, row) in enumerate(vals.iterrows()):
         ax = next(ax_iter)
 
+        if "hit_pos" in row.index:
+            row = pd.concat([
+                row,
+                pd.Series(running_sums(row, gene_changes, p=p)),
+            ])
+
         if (
             "cumscore" in row and
             len(row["cumscore"]) > 0 and
@@ -984,14 +1976,12 @@ def plot_enrichment(
         ):
             ax.plot(row["down_cumscore"], color="r")
 
-        for ind, hit in enumerate(row["hits"]):
-            if hit:
-                ax.axvline(ind, linestyle=":", alpha=.25, color="g")
+        for ind in np.nonzero(row["hits"])[0]:
+            ax.axvline(ind, linestyle=":", alpha=.25, color="g")
 
         if "down_hits" in row:
-            for ind, hit in enumerate(row["down_hits"]):
-                if hit:
-                    ax.axvline(ind, linestyle=":", alpha=.25, color="r")
+            for ind in np.nonzero(row["down_hits"])[0]:
+                ax.axvline(ind, linestyle=":", alpha=.25, color="r")
 
         name = row["name"]
         name = name if len(name) < 35 else name[:35] + "..."
@@ -1088,6 +2078,7 @@ def plot_gsea(
                 max_qval=max_qval,
                 min_hits=min_hits,
             ),
+            gene_changes=gene_changes,
             **kwargs
         )[0],
 
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+This module provides a collection type for gene sets and phospho sets.
+
+Set members are mapped to integer codes once and each set column is kept as a
+sparse incidence matrix, so that filtering sets or finding the IDs that hit
+them are sparse matrix operations.
+"""
+from __future__ import division
+
+from itertools import chain
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+LOGGER = logging.getLogger("pyproteome.genesets")
+
+
+def _get_set_cols(cols):
+    for set_cols in [
+        ["up_set", "down_set"],
+        ["set"],
+    ]:
+        if any([i in cols for i in set_cols]):
+            return set_cols
+
+
+class GeneSets(pd.DataFrame):
+    """
+    A table of gene sets, with a "name" column and either a "set" column or
+    "up_set" and "down_set" columns of Python set() objects.
+
+    GeneSets behaves like any other :class:`pandas.DataFrame`. The first time
+    it is queried, every member ID is assigned an integer code and each set
+    column is encoded as a (sets x IDs) CSR incidence matrix. The encoding is
+    kept until the table is modified, see :meth:`.invalidate`.
+    """
+    @property
+    def _constructor(self):
+        return GeneSets
+
+    @property
+    def set_cols(self):
+        """
+        The columns holding each gene set's members.
+
+        Returns
+        -------
+        list of str
+        """
+        return _get_set_cols(self.columns)
+
+    def __setitem__(self, key, value):
+        super(GeneSets, self).__setitem__(key, value)
+        self.invalidate()
+
+    def _update_inplace(self, *args, **kwargs):
+        super(GeneSets, self)._update_inplace(*args, **kwargs)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Discard the cached encoding of this table's sets.
+
+        Setting a column, or modifying the table with in place methods such
+        as sort_values(inplace=True), does this automatically. Call it after
+        editing cells with .loc / .iloc or editing any of the set objects
+        themselves.
+        """
+        self.__dict__.pop("_encoding", None)
+
+    def _encode(self):
+        cache = self.__dict__.get("_encoding")
+
+        if cache is not None and cache[0] is self.index:
+            return cache[1]
+
+        sets = [self[col].values for col in self.set_cols]
+        lens = [
+            np.fromiter(map(len, col_sets), dtype=int, count=len(col_sets))
+            for col_sets in sets
+        ]
+
+        members = np.empty(sum(i.sum() for i in lens), dtype=object)
+        members[:] = list(chain.from_iterable(chain.from_iterable(sets)))
+        codes, ids = pd.factorize(members)
+        ids = pd.Index(ids)
+
+        mats = []
+        offset = 0
+
+        for col_lens in lens:
+            # Members of a set are unique, so codes can be used as the CSR
+            # column indices directly
+            indptr = np.concatenate([[0], np.cumsum(col_lens)])
+            mat = sparse.csr_matrix(
+                (
+                    np.ones(indptr[-1], dtype=bool),
+                    codes[offset:offset + indptr[-1]],
+                    indptr,
+                ),
+                shape=(col_lens.shape[0], len(ids)),
+            )
+            mat.sort_indices()
+            mats.append(mat)
+            offset += indptr[-1]
+
+        encoding = ids, mats
+        self.__dict__["_encoding"] = self.index, encoding
+
+        return encoding
+
+    def _subset(self, mask):
+        # Select rows, slicing the encoding instead of rebuilding it
+        ids, mats = self._encode()
+        gene_sets = self[mask]
+
+        mats = [mat[mask] for mat in mats]
+        used = np.unique(np.concatenate([mat.indices for mat in mats]))
+        codes = np.full(len(ids), -1, dtype=int)
+        codes[used] = np.arange(used.shape[0])
+
+        gene_sets.__dict__["_encoding"] = gene_sets.index, (
+            ids[used],
+            [
+                sparse.csr_matrix(
+                    (mat.data, codes[mat.indices], mat.indptr),
+                    shape=(mat.shape[0], used.shape[0]),
+                )
+                for mat in mats
+            ],
+        )
+
+        return gene_sets
+
+    @property
+    def ids(self):
+        """
+        All member IDs, in the order of their integer codes.
+
+        Returns
+        -------
+        ids : :class:`pandas.Index`
+        """
+        return self._encode()[0]
+
+    def incidence(self, col=None):
+        """
+        Get the (sets x IDs) incidence matrix of a set column.
+
+        Parameters
+        ----------
+        col : str, optional
+            The set column to use. Defaults to the union of all set columns.
+
+        Returns
+        -------
+        mat : :class:`scipy.sparse.csr_matrix`
+        """
+        ids, mats = self._encode()
+
+        if col is not None:
+            return mats[self.set_cols.index(col)]
+
+        mat = mats[0]
+
+        for other in mats[1:]:
+            mat = mat + other
+
+        return mat.astype(bool)
+
+    def sizes(self):
+        """
+        Count the members of each set, across all set columns.
+
+        Returns
+        -------
+        sizes : :class:`pandas.Series`
+        """
+        return pd.Series(
+            self.incidence().getnnz(axis=1),
+            index=self.index,
+        )
+
+    def hits(self, ids, col=None):
+        """
+        Find which of a list of IDs hit each set.
+
+        Parameters
+        ----------
+        ids : list of str
+            IDs, such as the "ID" column of a table of peptides. IDs may be
+            repeated or missing from all sets.
+        col : str, optional
+            The set column to use. Defaults to the union of all set columns.
+
+        Returns
+        -------
+        mat : :class:`scipy.sparse.csr_matrix`
+            Boolean (IDs x sets) matrix.
+        """
+        codes = self.ids.get_indexer(pd.Index(ids))
+        mask = codes >= 0
+
+        mat = self.incidence(col=col).T.tocsr()
+        mat = mat[codes[mask]].tocoo()
+
+        return sparse.csr_matrix(
+            (mat.data, (np.nonzero(mask)[0][mat.row], mat.col)),
+            shape=(codes.shape[0], self.shape[0]),
+            dtype=bool,
+        )
+
+    def overlap(self, ids):
+        """
+        Count the distinct IDs from a list that are members of each set.
+
+        Parameters
+        ----------
+        ids : list of str
+
+        Returns
+        -------
+        overlap : :class:`pandas.Series`
+        """
+        codes = self.ids.get_indexer(pd.Index(ids).unique())
+
+        return pd.Series(
+            self.incidence()[:, codes[codes >= 0]].getnnz(axis=1),
+            index=self.index,
+        )
+
+    def filter_hits(self, ids, min_hits=10):
+        """
+        Select the sets with at least min_hits distinct members in a list of
+        IDs.
+
+        Parameters
+        ----------
+        ids : list of str
+        min_hits : int, optional
+
+        Returns
+        -------
+        gene_sets : :class:`.GeneSets`
+        """
+        return self._subset((self.overlap(ids) >= min_hits).values)
+
+    def to_encoded(self):
+        """
+        Split the table into its other columns and its encoded set columns.
+
+        Returns
+        -------
+        frame : :class:`pandas.DataFrame`
+        ids : :class:`numpy.ndarray`
+        mats : list of :class:`scipy.sparse.csr_matrix`
+        """
+        ids, mats = self._encode()
+
+        return (
+            pd.DataFrame(self.drop(columns=self.set_cols)),
+            np.asarray(ids, dtype=object),
+            mats,
+        )
+
+    @classmethod
+    def from_encoded(cls, frame, ids, mats, set_cols):
+        """
+        Rebuild a table from the output of :meth:`.to_encoded`, without
+        having to re-encode its sets.
+
+        Parameters
+        ----------
+        frame : :class:`pandas.DataFrame`
+        ids : :class:`numpy.ndarray`
+        mats : list of :class:`scipy.sparse.csr_matrix`
+        set_cols : list of str
+
+        Returns
+        -------
+        gene_sets : :class:`.GeneSets`
+        """
+        gene_sets = cls(frame)
+
+        for col, mat in zip(set_cols, mats):
+            members = ids[mat.indices]
+            gene_sets[col] = [
+                set(members[start:end])
+                for start, end in zip(mat.indptr[:-1], mat.indptr[1:])
+            ]
+
+        gene_sets.__dict__["_encoding"] = (
+            gene_sets.index,
+            (pd.Index(ids), mats),
+        )
+
+        return gene_sets
+
+
+def as_gene_sets(gene_sets):
+    """
+    Wrap a table of gene sets as a :class:`.GeneSets` object.
+
+    Parameters
+    ----------
+    gene_sets : :class:`pandas.DataFrame`
+
+    Returns
+    -------
+    gene_sets : :class:`.GeneSets`
+    """
+    if isinstance(gene_sets, GeneSets):
+        return gene_sets
+
+    return GeneSets(gene_sets)
@@ -5,6 +5,7 @@ import requests
 import pandas as pd
 
 import pyproteome as pyp
+from .genesets import GeneSets
 
 LOGGER = logging.getLogger("pyproteome.gskb")
 
@@ -24,7 +25,7 @@ def get_gskb_pathways(species):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Fetching GSKB pathways")
 
@@ -49,4 +50,4 @@ def get_gskb_pathways(species):
         columns=["name", "set"],
     )
 
-    return pathways_df
+    return GeneSets(pathways_df)
@@ -1,16 +1,17 @@
 
 import logging
-import requests
 
 import pandas as pd
 
 import pyproteome as pyp
+from .genesets import GeneSets
 
 
 MSIGDB_URL = (
     "https://raw.githubusercontent.com/white-lab/pyproteome-data"
     "/master/msigdb/"
 )
+MSIGDB_VERSION = "v6.1"
 MSIGDB_FILES = (
     "h.all.v6.1.entrez.gmt",
     # "c1.all.v6.1.entrez.gmt",
@@ -43,6 +44,7 @@ except ImportError:
 
 
 @pyp.utils.memoize
+@pyp.store.cached("msigdb", version=MSIGDB_VERSION)
 def get_msigdb_pathways(species, remap=None):
     """
     Download gene sets from MSigDB. Currently downloads v6.1 of the gene
@@ -54,23 +56,23 @@ def get_msigdb_pathways(species, remap=None):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Fetching MSigDB pathways")
 
-    def _get_requests():
+    def _get_lines():
         for file in MSIGDB_FILES:
-            url = MSIGDB_URL + file
+            path = pyp.store.fetch(
+                "msigdb", MSIGDB_URL + file, version=MSIGDB_VERSION,
+            )
 
-            LOGGER.info("Fetching {}".format(url))
-
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-
-            yield response
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield line
 
     def _get_data(line):
-        line = line.decode("utf-8")
+        line = line.decode("utf-8").rstrip("\r\n")
         name, _, genes = line.split("\t", 2)
         # name, _, _, spec = name.split("%")
         # assert species == spec
@@ -79,8 +81,7 @@ def get_msigdb_pathways(species, remap=None):
     pathways_df = pd.DataFrame(
         data=[
             _get_data(line)
-            for response in _get_requests()
-            for line in response.iter_lines()
+            for line in _get_lines()
         ],
         columns=["name", "set"],
     )
@@ -103,4 +104,4 @@ def get_msigdb_pathways(species, remap=None):
             lambda row: set(mapper.map_ids(row))
         )
 
-    return pathways_df
+    return GeneSets(pathways_df)
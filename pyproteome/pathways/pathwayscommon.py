@@ -8,6 +8,7 @@ import requests
 import pandas as pd
 
 import pyproteome as pyp
+from .genesets import GeneSets
 import brainrnaseq as brs
 
 LOGGER = logging.getLogger("pyproteome.pathwayscommon")
@@ -29,7 +30,7 @@ def get_pathway_common(species):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Fetching Pathways Common")
 
@@ -56,8 +57,9 @@ def get_pathway_common(species):
         assert int(name["organism"]) == 9606
 
         genes = set(
-            brs.mapping.get_entrez_mapping(i, species=species)
-            for i in genes.split("\t")
+            brs.mapping.get_entrez_mappings(
+                genes.split("\t"), species=species,
+            )
         )
 
         return name["name"], genes
@@ -70,4 +72,4 @@ def get_pathway_common(species):
         columns=["name", "set"],
     )
 
-    return pathways_df
+    return GeneSets(pathways_df)
@@ -1,12 +1,13 @@
 
+from itertools import chain
 import gzip
-import io
 import logging
-import requests
 
+import numpy as np
 import pandas as pd
 
 import pyproteome as pyp
+from .genesets import GeneSets
 
 LOGGER = logging.getLogger("pyproteome.phosphosite")
 
@@ -19,6 +20,7 @@ PSP_SITE_MAPPING_URL = (
 
 
 @pyp.utils.memoize
+@pyp.store.cached("phosphosite")
 def get_phosphomap_data():
     """
     Fetch mapping between phosphorylation sites of different species.
@@ -29,17 +31,14 @@ def get_phosphomap_data():
     """
     LOGGER.info("Fetching Phosphosite Plus mapping data")
 
-    url = PSP_SITE_MAPPING_URL
+    path = pyp.store.fetch("phosphosite", PSP_SITE_MAPPING_URL)
 
-    r = requests.get(url, stream=True)
-    r.raise_for_status()
-
-    gz = gzip.GzipFile(fileobj=io.BytesIO(r.content))
-
-    return pd.read_table(gz, skiprows=[0, 1, 2], sep="\t")
+    with gzip.open(path) as gz:
+        return pd.read_table(gz, skiprows=[0, 1, 2], sep="\t")
 
 
 @pyp.utils.memoize
+@pyp.store.cached("phosphosite")
 def get_phosphoreg_data():
     """
     Fetch Phosphosite Plus regulation data.
@@ -50,17 +49,60 @@ def get_phosphoreg_data():
     """
     LOGGER.info("Fetching Phosphosite Plus regulation data")
 
-    url = PSP_REGULATORY_URL
+    path = pyp.store.fetch("phosphosite", PSP_REGULATORY_URL)
+
+    with gzip.open(path) as gz:
+        return pd.read_table(
+            gz, skiprows=[0, 1, 2], sep="\t", usecols=range(21),
+        )
+
+
+@pyp.utils.memoize
+@pyp.store.cached("phosphosite")
+def get_site_mapping(species):
+    """
+    Build a table mapping phosphorylation sites in every other species onto
+    the homologous sites in one species.
+
+    Sites are matched by their SITE_GRP_ID in :func:`.get_phosphomap_data`.
+    Sites without a homolog in species are left out of the table.
+
+    Parameters
+    ----------
+    species : str
+
+    Returns
+    -------
+    df : :class:`pandas.DataFrame`
+        Table with one row per (ACC_ID, MOD_RSD, ORGANISM) site and the
+        MAPPED_ACC_ID, MAPPED_MOD_RSD of its homolog in species.
+    """
+    species = pyp.species.ORGANISM_MAPPING.get(species, species)
+
+    LOGGER.info("Building phosphosite mapping to {}".format(species))
 
-    r = requests.get(url, stream=True)
-    r.raise_for_status()
+    mapping = get_phosphomap_data()
+    mapping = mapping[["ACC_ID", "MOD_RSD", "ORGANISM", "SITE_GRP_ID"]]
+    is_species = mapping["ORGANISM"] == species
 
-    gz = gzip.GzipFile(fileobj=io.BytesIO(r.content))
+    targets = mapping[is_species].drop_duplicates(
+        "SITE_GRP_ID",
+    ).rename(
+        columns={"ACC_ID": "MAPPED_ACC_ID", "MOD_RSD": "MAPPED_MOD_RSD"},
+    )
 
-    return pd.read_table(gz, skiprows=[0, 1, 2], sep="\t", usecols=range(21))
+    return mapping[~is_species].drop_duplicates(
+        ["ACC_ID", "MOD_RSD", "ORGANISM"],
+    ).merge(
+        targets[["SITE_GRP_ID", "MAPPED_ACC_ID", "MAPPED_MOD_RSD"]],
+        on="SITE_GRP_ID",
+    ).drop(
+        columns="SITE_GRP_ID",
+    ).reset_index(drop=True)
 
 
 @pyp.utils.memoize
+@pyp.store.cached("phosphosite")
 def get_phosphosite(species, remap=False):
     """
     Download phospho sets from PhophoSite Plus.
@@ -72,7 +114,7 @@ def get_phosphosite(species, remap=False):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Getting phosphosite data for {}".format(species))
 
@@ -90,31 +132,16 @@ def get_phosphosite(species, remap=False):
 
     psp_data = psp_data[psp_data["SUB_ORGANISM"] == species]
 
-    return pd.DataFrame(
-        [
-            (
-                kinase,
-                set(
-                    psp_data[
-                        psp_data["KINASE"] == kinase
-                    ].apply(
-                        lambda x:
-                        ",".join([
-                            x["SUB_ACC_ID"].split("-")[0],
-                            x["SUB_MOD_RSD"] + ("" if remap else "-p"),
-                        ]),
-                        axis=1,
-                    )
-                ),
-                set(),
-            )
-            for kinase in set(psp_data["KINASE"])
-        ],
-        columns=["name", "up_set", "down_set"]
-    )
+    sets = _site_ids(
+        psp_data["SUB_ACC_ID"],
+        psp_data["SUB_MOD_RSD"] + ("" if remap else "-p"),
+    ).groupby(psp_data["KINASE"]).apply(set)
+
+    return _as_gene_sets(sets)
 
 
 @pyp.utils.memoize
+@pyp.store.cached("phosphosite")
 def get_phosphosite_regulation(species, remap=False):
     """
     Download phospho sets from PhophoSite Plus.
@@ -126,7 +153,7 @@ def get_phosphosite_regulation(species, remap=False):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Getting phosphosite regulation data for {}".format(species))
 
@@ -146,39 +173,43 @@ def get_phosphosite_regulation(species, remap=False):
 
     psp_data = psp_data[psp_data["ORGANISM"] == species]
 
-    paths = set(
-        proc.strip()
-        for row in psp_data["ON_PROCESS"]
-        if pd.notna(row)
-        for proc in row.split(";")
-        if proc.strip()
+    procs = psp_data["ON_PROCESS"].fillna("").str.split(";")
+
+    # Pair each site with every process listed for it
+    ids = _site_ids(psp_data["ACC_ID"], psp_data["MOD_RSD"]).values
+    ids = ids[np.repeat(np.arange(len(procs)), procs.str.len())]
+    procs = pd.Series(
+        list(chain.from_iterable(procs)), dtype=object,
+    ).str.strip().values
+
+    sets = pd.Series(ids[procs != ""]).groupby(procs[procs != ""]).apply(set)
+
+    # A process' set also includes the sites of any process whose name
+    # contains it (i.e. "apoptosis" covers "apoptosis, induced")
+    sets = pd.Series(
+        [
+            set().union(*[
+                sites
+                for other, sites in sets.items()
+                if path in other
+            ])
+            for path in sets.index
+        ],
+        index=sets.index,
     )
 
-    return pd.DataFrame(
+    return _as_gene_sets(sets)
+
+
+def _site_ids(accs, mods):
+    return accs.str.split("-").str[0] + "," + mods
+
+
+def _as_gene_sets(sets):
+    return GeneSets(
         [
-            (
-                path,
-                set(
-                    psp_data[
-                        psp_data["ON_PROCESS"].apply(
-                            lambda x:
-                            pd.notna(x) and any([
-                                path in i.strip()
-                                for i in x.split(";")
-                            ])
-                        )
-                    ].apply(
-                        lambda x:
-                        ",".join([
-                            x["ACC_ID"].split("-")[0],
-                            x["MOD_RSD"],
-                        ]),
-                        axis=1,
-                    )
-                ),
-                set(),
-            )
-            for path in paths
+            (name, sites, set())
+            for name, sites in sets.items()
         ],
         columns=["name", "up_set", "down_set"]
     )
@@ -194,57 +225,25 @@ def _remap_psp(
 ):
     LOGGER.info("Remapping sites to species: {}".format(species))
 
-    mapping = get_phosphomap_data()
-    mapping = mapping[["ACC_ID", "MOD_RSD", "ORGANISM", "SITE_GRP_ID"]]
-
-    mod_mapping = mapping[
-        mapping["ORGANISM"] != species
-    ].set_index(
-        ["ACC_ID", "MOD_RSD", "ORGANISM"]
-    ).sort_index()
-    site_mapping = mapping[
-        mapping["ORGANISM"] == species
-    ].set_index(
-        "SITE_GRP_ID"
-    ).sort_index()
-    del mapping
+    mapping = get_site_mapping(species).rename(
+        columns={
+            "ACC_ID": acc_col,
+            "MOD_RSD": mod_col,
+            "ORGANISM": org_col,
+        },
+    )
 
     new_index = [org_col, set_col, acc_col, mod_col]
 
-    def _remap(row):
-        kinase, acc, mod, old_species = row[
-            [set_col, acc_col, mod_col, org_col]
-        ]
-        mod += append_mod
-
-        if old_species != species:
-            # Remap the phosphorylation site if possible
-            try:
-                site = mod_mapping.loc[acc, mod, old_species]
-            except KeyError:
-                pass
-            else:
-                site = site["SITE_GRP_ID"]
-
-                if hasattr(site, "iloc"):
-                    site = site.iloc[0]
-
-                try:
-                    re_map = site_mapping.loc[site]
-                except KeyError:
-                    pass
-                else:
-                    if len(re_map.shape) > 1:
-                        re_map = re_map.iloc[0]
-
-                    acc, mod = re_map[["ACC_ID", "MOD_RSD"]]
-                    old_species = species
-
-        return pd.Series([
-            old_species,
-            kinase,
-            acc,
-            mod,
-        ], index=new_index)
-
-    return psp.apply(_remap, axis=1)
+    psp = psp[new_index].copy()
+    psp[mod_col] = psp[mod_col] + append_mod
+
+    new = psp.merge(mapping, on=[acc_col, mod_col, org_col], how="left")
+    new.index = psp.index
+
+    found = new["MAPPED_ACC_ID"].notnull()
+    new.loc[found, acc_col] = new.loc[found, "MAPPED_ACC_ID"]
+    new.loc[found, mod_col] = new.loc[found, "MAPPED_MOD_RSD"]
+    new.loc[found, org_col] = species
+
+    return new[new_index]
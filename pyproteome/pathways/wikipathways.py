@@ -1,7 +1,5 @@
 
-import io
 import logging
-import requests
 import re
 import zipfile
 import xml.etree.ElementTree as ET
@@ -9,6 +7,7 @@ import xml.etree.ElementTree as ET
 import pandas as pd
 
 import pyproteome as pyp
+from .genesets import GeneSets
 
 WIKIPATHWAYS_GMT_URL = (
     "http://data.wikipathways.org/{date}/gmt/"
@@ -34,6 +33,7 @@ def _get_wp_date():
 
 
 @pyp.utils.memoize
+@pyp.store.cached("wikipathways", version=_get_wp_date)
 def get_wikipathways(species):
     """
     Download gene sets from WikiPathways.
@@ -44,7 +44,7 @@ def get_wikipathways(species):
 
     Returns
     -------
-    df : :class:`pandas.DataFrame`, optional
+    df : :class:`pyproteome.pathways.genesets.GeneSets`
     """
     LOGGER.info("Fetching WikiPathways")
 
@@ -54,23 +54,24 @@ def get_wikipathways(species):
         date=_get_wp_date(),
         species="_".join(species.split(" ")),
     )
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
+    path = pyp.store.fetch("wikipathways", url, version=_get_wp_date)
 
     def _get_data(line):
-        line = line.decode("utf-8")
+        line = line.decode("utf-8").rstrip("\r\n")
         name, _, genes = line.split("\t", 2)
         name, _, _, spec = name.split("%")
         assert species == spec
         return name, set(i for i in genes.split("\t"))
 
-    pathways_df = pd.DataFrame(
-        data=[
-            _get_data(line)
-            for line in response.iter_lines()
-        ],
-        columns=["name", "set"],
-    )
+    with open(path, "rb") as f:
+        pathways_df = GeneSets(
+            data=[
+                _get_data(line)
+                for line in f
+                if line.strip()
+            ],
+            columns=["name", "set"],
+        )
 
     return pathways_df
 
@@ -96,10 +97,9 @@ def get_wikipathways_psites(species):
         date=_get_wp_date(),
         species="_".join(species.split(" ")),
     )
-    response = requests.get(url, stream=False)
-    response.raise_for_status()
-
-    z = zipfile.ZipFile(io.BytesIO(response.content))
+    z = zipfile.ZipFile(
+        pyp.store.fetch("wikipathways", url, version=_get_wp_date),
+    )
     LOGGER.info("Parsing WikiPathways phosphosites")
 
     def _process_site(sname):
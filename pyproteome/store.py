@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps a local store of the databases that pyproteome downloads
+(MSigDB, WikiPathways, PhosphoSite Plus, ...).
+
+Raw downloads and the tables parsed from them are saved under
+:const:`.STORE_DIR`, keyed by source and version::
+
+    STORE_DIR/<source>/<version>/raw/<file name>
+    STORE_DIR/<source>/<version>/tables/<function>-<digest>.pkl
+
+Parsed gene set tables are saved in their encoded form (see
+:meth:`pyproteome.pathways.genesets.GeneSets.to_encoded`), so that loading
+them does not need to re-parse or re-encode any sets.
+
+A store can be filled on a machine with internet access and copied to one
+without. Set :const:`.OFFLINE` (or the PYPROTEOME_OFFLINE environment
+variable) to raise an error instead of attempting any download.
+"""
+from __future__ import absolute_import
+
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import requests
+
+from . import utils
+
+
+LOGGER = logging.getLogger("pyproteome.store")
+
+STORE_DIR = os.environ.get(
+    "PYPROTEOME_STORE_DIR",
+    os.path.join(utils.PICKLE_DIR, "store"),
+)
+"""
+Directory holding downloaded and parsed databases. Defaults to the
+PYPROTEOME_STORE_DIR environment variable, if set.
+"""
+
+OFFLINE = os.environ.get(
+    "PYPROTEOME_OFFLINE", "",
+).lower() not in ("", "0", "false", "no")
+"""
+Never access the network, only use databases that are already in the store.
+Defaults to True if the PYPROTEOME_OFFLINE environment variable is set.
+"""
+
+STORE_FORMAT = 1
+"""
+Version of the parsed table format. Tables saved with a different format are
+ignored and parsed again from their raw downloads.
+"""
+
+_CHUNK_SIZE = 1 << 20
+
+
+def source_dir(source, version):
+    """
+    Get the directory used to store a version of a source.
+
+    Parameters
+    ----------
+    source : str
+    version : str
+
+    Returns
+    -------
+    path : str
+    """
+    return os.path.join(STORE_DIR, source, version)
+
+
+def versions(source):
+    """
+    List the versions of a source that are in the store.
+
+    Parameters
+    ----------
+    source : str
+
+    Returns
+    -------
+    versions : list of str
+    """
+    try:
+        return sorted(
+            i
+            for i in os.listdir(os.path.join(STORE_DIR, source))
+            if not i.startswith(".")
+        )
+    except (OSError, IOError):
+        return []
+
+
+def get_version(source, version=None):
+    """
+    Resolve which version of a source to use.
+
+    Sources without a fixed version are stored under the date they were first
+    downloaded. The latest stored version is reused until it is removed with
+    :func:`.clear`.
+
+    Parameters
+    ----------
+    source : str
+    version : str or func, optional
+        A fixed version, or a function returning one.
+
+    Returns
+    -------
+    version : str
+    """
+    if callable(version):
+        version = version()
+
+    if version is not None:
+        return str(version)
+
+    stored = versions(source)
+
+    if stored:
+        return stored[-1]
+
+    if OFFLINE:
+        raise IOError(
+            "No version of {} found in {} (offline mode)".format(
+                source, STORE_DIR,
+            )
+        )
+
+    return time.strftime("%Y%m%d")
+
+
+def fetch(source, url, version=None, name=None):
+    """
+    Get the local path of a raw download, downloading it if it is not already
+    in the store.
+
+    Parameters
+    ----------
+    source : str
+    url : str
+    version : str or func, optional
+    name : str, optional
+        File name to save the download as. Defaults to the last component of
+        url.
+
+    Returns
+    -------
+    path : str
+    """
+    version = get_version(source, version=version)
+
+    if name is None:
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+
+    path = os.path.join(source_dir(source, version), "raw", name)
+
+    if os.path.exists(path):
+        return path
+
+    if OFFLINE:
+        raise IOError(
+            "{} ({} {}) not found in {} (offline mode)".format(
+                name, source, version, STORE_DIR,
+            )
+        )
+
+    LOGGER.info("Fetching {}".format(url))
+
+    dirname = utils.makedirs(os.path.dirname(path))
+
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+
+    with tempfile.NamedTemporaryFile(
+        dir=dirname, suffix=".tmp", delete=False,
+    ) as f:
+        try:
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+
+    os.replace(f.name, path)
+
+    return path
+
+
+def _dump_table(path, val):
+    from .pathways.genesets import GeneSets
+
+    if isinstance(val, GeneSets) and val.set_cols:
+        val = ("GeneSets", val.set_cols) + val.to_encoded()
+
+    utils._atomic_dump(path, (STORE_FORMAT, val))
+
+
+def _load_table(path):
+    with open(path, "rb") as f:
+        fmt, val = pickle.load(f)
+
+    if fmt != STORE_FORMAT:
+        raise ValueError(fmt)
+
+    if isinstance(val, tuple) and val[0] == "GeneSets":
+        from .pathways.genesets import GeneSets
+
+        _, set_cols, frame, ids, mats = val
+        val = GeneSets.from_encoded(frame, ids, mats, set_cols)
+
+    return val
+
+
+def cached(source, version=None):
+    """
+    Save the tables parsed by a function in the store, reusing them in later
+    sessions.
+
+    Tables are keyed by the source version and the function's arguments.
+
+    Examples
+    --------
+    >>> from pyproteome import store, utils
+    >>> @utils.memoize
+    ... @store.cached("msigdb", version="v6.1")
+    ... def get_msigdb_pathways(species):
+    ...     path = store.fetch("msigdb", MSIGDB_URL, version="v6.1")
+    ...     ...  # Parse path into a table
+
+    Parameters
+    ----------
+    source : str
+    version : str or func, optional
+
+    Returns
+    -------
+    decorator : func
+    """
+    def decorator(func):
+        try:
+            sig = inspect.signature(func)
+        except (TypeError, ValueError):
+            sig = None
+
+        def _digest(args, kwargs):
+            if sig is not None:
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                args, kwargs = bound.args, bound.kwargs
+
+            key = utils._canonical(utils._hashable((args, kwargs)))
+
+            return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+        @functools.wraps(func)
+        def cached_func(*args, **kwargs):
+            path = os.path.join(
+                source_dir(source, get_version(source, version=version)),
+                "tables",
+                "{}-{}.pkl".format(func.__name__, _digest(args, kwargs)),
+            )
+
+            try:
+                return _load_table(path)
+            except (
+                OSError, IOError, ValueError, pickle.UnpicklingError,
+                AttributeError, EOFError, ImportError, IndexError,
+            ):
+                pass
+
+            val = func(*args, **kwargs)
+            _dump_table(path, val)
+
+            return val
+
+        return cached_func
+
+    return decorator
+
+
+def clear(source=None, version=None):
+    """
+    Remove databases from the store.
+
+    Parameters
+    ----------
+    source : str, optional
+        Source to remove. Defaults to all sources.
+    version : str, optional
+        Version to remove. Defaults to all versions of source.
+    """
+    path = STORE_DIR
+
+    if source is not None:
+        path = os.path.join(path, source)
+
+        if version is not None:
+            path = os.path.join(path, version)
+
+    shutil.rmtree(path, ignore_errors=True)
@@ -1,26 +1,103 @@
 """Utility functions used in other modules."""
 
 # Built-ins
-from collections import OrderedDict, Callable
+from collections import OrderedDict, Callable, namedtuple
+import contextlib
 import copy
 import difflib
 import functools
+import hashlib
+import importlib
+import inspect
+import logging
 import os
 import pickle
+import shutil
+import sys
+import tempfile
+import threading
 import types
 
 import numpy as np
 import pandas as pd
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
 from . import paths
 
 
+LOGGER = logging.getLogger("pyproteome.utils")
+
 DEFAULT_DPI = 300
 """
 The DPI to use when generating all image figures.
 """
 
 
+def lazy_import(namespace, submodules=(), attrs=None):
+    """
+    Defer importing a package's submodules until they are first accessed.
+
+    Installs module-level `__getattr__` and `__dir__` functions (PEP 562)
+    into a package's namespace. On Python versions before 3.7, which do not
+    support these hooks, everything is imported immediately instead.
+
+    Parameters
+    ----------
+    namespace : dict
+        The package's `globals()`.
+    submodules : list of str, optional
+        Names of submodules to expose as attributes of the package.
+    attrs : dict of (str, tuple of (str, str)), optional
+        Maps attribute names to a (submodule, attribute) pair. Use None as
+        the attribute to expose the submodule itself under a different name.
+
+    Examples
+    --------
+        >>> utils.lazy_import(
+        ...     globals(),
+        ...     submodules=["logo", "motif"],
+        ...     attrs={"generate_n_mers": ("motif", "generate_n_mers")},
+        ... )
+    """
+    package = namespace["__name__"]
+    lazy = {
+        name: (name, None)
+        for name in submodules
+    }
+    lazy.update(attrs or {})
+
+    def __getattr__(name):
+        if name not in lazy:
+            raise AttributeError(
+                "module '{}' has no attribute '{}'".format(package, name)
+            )
+
+        mod_name, attr = lazy[name]
+        val = importlib.import_module("." + mod_name, package)
+
+        if attr is not None:
+            val = getattr(val, attr)
+
+        namespace[name] = val
+
+        return val
+
+    def __dir__():
+        return sorted(set(namespace).union(lazy))
+
+    namespace["__getattr__"] = __getattr__
+    namespace["__dir__"] = __dir__
+
+    if sys.version_info < (3, 7):
+        for name in lazy:
+            __getattr__(name)
+
+
 def fuzzy_find(needle, haystack):
     """
     Find the longest matching subsequence of needle within haystack.
@@ -210,10 +287,62 @@ class DefaultOrderedDict(OrderedDict):
         )
 
 
-def memoize(func):
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "disk_hits", "maxsize", "currsize"],
+)
+"""
+Hit / miss statistics returned by a memoized function's `cache_info()`.
+"""
+
+DEFAULT_MEMOIZE_SIZE = 128
+"""
+Default number of return values kept in memory by :func:`.memoize`.
+"""
+
+
+def _hashable(val):
+    if isinstance(val, (list, tuple)):
+        return tuple(_hashable(i) for i in val)
+
+    if isinstance(val, (set, frozenset)):
+        return frozenset(_hashable(i) for i in val)
+
+    if isinstance(val, dict):
+        return tuple(
+            sorted(
+                ((key, _hashable(i)) for key, i in val.items()),
+                key=repr,
+            )
+        )
+
+    # Raises TypeError for unhashable objects (i.e. data frames)
+    hash(val)
+
+    return val
+
+
+def _canonical(val):
+    # Set ordering depends on the hash seed, sort elements so that keys
+    # serialize identically across processes.
+    if isinstance(val, tuple):
+        return tuple(_canonical(i) for i in val)
+
+    if isinstance(val, frozenset):
+        return tuple(sorted((_canonical(i) for i in val), key=repr))
+
+    return val
+
+
+def memoize(func=None, maxsize=DEFAULT_MEMOIZE_SIZE, disk=False):
     """
     Memoize a function, saving its returned value for a given set of parameters
-    in an in-memory cache.
+    in an in-memory least-recently-used cache.
+
+    Arguments are bound to the function's signature, so that positional,
+    keyword, and default arguments map to the same cache entry. Lists, sets,
+    and dicts are converted to hashable equivalents. Calls with any other
+    unhashable arguments are passed through without being cached.
 
     Examples
     --------
@@ -221,32 +350,189 @@ def memoize(func):
     >>> @utils.memoize
     ... def download_data(species):
     ...    ...  # Fetch / calculate the return value once
-
+    >>> @utils.memoize(maxsize=None, disk=True)
+    ... def download_large_data(species):
+    ...    ...  # Fetch the return value once, and keep it in MEMOIZE_DIR
+    >>> download_data.cache_info()
+    CacheInfo(hits=0, misses=0, disk_hits=0, maxsize=128, currsize=0)
 
     Parameters
     ----------
     func : func
+    maxsize : int, optional
+        Maximum number of return values to keep in memory. Set to None to
+        keep all values.
+    disk : bool, optional
+        Also pickle return values to :const:`.MEMOIZE_DIR`, reusing them in
+        later sessions.
 
     Returns
     -------
     memorized : func
     """
-    cache = func.cache = {}
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize, disk=disk)
+
+    try:
+        sig = inspect.signature(func)
+    except (TypeError, ValueError):
+        sig = None
+
+    cache = OrderedDict()
+    stats = {"hits": 0, "misses": 0, "disk_hits": 0}
+    lock = threading.RLock()
+    name = "{}.{}".format(func.__module__, func.__name__)
+
+    def _make_key(args, kwargs):
+        if sig is not None:
+            try:
+                bound = sig.bind(*args, **kwargs)
+            except TypeError:
+                pass
+            else:
+                bound.apply_defaults()
+                args, kwargs = bound.args, bound.kwargs
+
+        return _hashable((args, kwargs))
+
+    def _disk_path(key):
+        digest = hashlib.sha1(
+            repr(_canonical(key)).encode("utf-8")
+        ).hexdigest()
+
+        return os.path.join(MEMOIZE_DIR, name, digest + ".pkl")
+
+    def _add(key, val):
+        with lock:
+            cache[key] = val
+
+            while maxsize is not None and len(cache) > maxsize:
+                cache.popitem(last=False)
 
     @functools.wraps(func)
     def memoized_func(*args, **kwargs):
-        key = str(args) + str(kwargs)
+        try:
+            key = _make_key(args, kwargs)
+        except TypeError:
+            with lock:
+                stats["misses"] += 1
+
+            return func(*args, **kwargs)
+
+        with lock:
+            if key in cache:
+                stats["hits"] += 1
+                val = cache.pop(key)
+                cache[key] = val
+
+                return val
+
+        if disk:
+            path = _disk_path(key)
+
+            try:
+                with open(path, "rb") as f:
+                    val = pickle.load(f)
+            except (
+                OSError, IOError, pickle.UnpicklingError,
+                AttributeError, EOFError, ImportError, IndexError,
+            ):
+                pass
+            else:
+                with lock:
+                    stats["disk_hits"] += 1
+
+                _add(key, val)
+
+                return val
+
+        with lock:
+            stats["misses"] += 1
+
+        val = func(*args, **kwargs)
+
+        if disk:
+            _atomic_dump(path, val)
+
+        _add(key, val)
+
+        return val
+
+    def cache_info():
+        with lock:
+            return CacheInfo(
+                maxsize=maxsize,
+                currsize=len(cache),
+                **stats
+            )
 
-        if key not in cache:
-            cache[key] = func(*args, **kwargs)
+    def cache_clear(disk=False):
+        with lock:
+            cache.clear()
 
-        return cache[key]
+            for key in stats:
+                stats[key] = 0
+
+        if disk:
+            shutil.rmtree(os.path.join(MEMOIZE_DIR, name), ignore_errors=True)
+
+    memoized_func.cache = cache
+    memoized_func.cache_info = cache_info
+    memoized_func.cache_clear = cache_clear
 
     return memoized_func
 
 
+def _atomic_dump(path, val):
+    dirname = makedirs(os.path.dirname(path))
+
+    try:
+        with tempfile.NamedTemporaryFile(
+            dir=dirname, suffix=".tmp", delete=False,
+        ) as f:
+            pickle.dump(val, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(f.name, path)
+    except (OSError, IOError, pickle.PicklingError) as err:
+        LOGGER.warning("Unable to save {}: {}".format(path, err))
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """
+    Hold an exclusive lock on a file, blocking other processes and threads
+    that try to lock the same file.
+
+    Parameters
+    ----------
+    path : str
+    """
+    makedirs(os.path.dirname(path))
+
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 PICKLE_DIR = ".pyproteome"
 
+MEMOIZE_DIR = os.path.join(PICKLE_DIR, "memoize")
+"""
+Directory used by :func:`.memoize` to persist return values to disk.
+"""
+
 
 def save(name, val=None):
     """
@@ -24,7 +24,7 @@ REQUIREMENTS = [
     "genemap>=0.2.0",
     "ipython>=5.4.1",
     "matplotlib>=2.2.0",
-    "numpy>=1.15.0",
+    "numpy>=1.17.0",
     "numpydoc>=0.8",
     "pandas>=0.23.0",
     "perseuspy>=0.3.8",
@@ -48,6 +48,7 @@ if __name__ == "__main__":
         author_email="morshed@mit.edu",
         license="BSD",
         packages=find_packages(exclude=["*.tests", "tests"]),
+        python_requires=">=3.5",
         install_requires=REQUIREMENTS,
         dependency_links=[
             "git+https://github.com/naderm/genemap.git"
@@ -59,10 +60,7 @@ if __name__ == "__main__":
             "License :: OSI Approved :: BSD License",
             "Natural Language :: English",
             "Operating System :: OS Independent",
-            "Programming Language :: Python :: 2",
-            "Programming Language :: Python :: 2.7",
             "Programming Language :: Python :: 3",
-            "Programming Language :: Python :: 3.4",
             "Programming Language :: Python :: 3.5",
             "Programming Language :: Python :: 3.6",
             "Programming Language :: Python :: 3.7",
@@ -1,10 +1,218 @@
+from itertools import chain
+import gzip
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 import brainrnaseq as brs
 
+import numpy as np
 import pandas as pd
 
 
+MAPPING = pd.DataFrame(
+    [
+        ("Jak2", 16452, "Fd17|JTK10"),
+        ("Fos", 14281, "AP-1|c-fos"),
+        ("Jun", 16476, "AP-1|c-jun"),
+        ("Fd17", 1, "-"),
+        ("Jak2", 2, "Jak2b"),
+        ("Nan1", 3, None),
+    ],
+    columns=["Symbol", "GeneID", "Synonyms"],
+).set_index("Symbol")
+
+
+class MappingCacheTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache = (
+            brs.cache.MAPPING_URL,
+            brs.cache.MAPPING_CACHE_DIR,
+            brs.cache.MAPPING_DATA,
+            brs.cache.MAPPING_INDEX,
+        )
+
+        brs.cache.MAPPING_URL = self.dirname
+        brs.cache.MAPPING_CACHE_DIR = os.path.join(self.dirname, "mapping")
+        brs.cache.MAPPING_DATA = {}
+        brs.cache.MAPPING_INDEX = {}
+        brs.mapping.get_entrez_mapping.cache_clear()
+
+        info = MAPPING.reset_index()
+        info.insert(0, "#tax_id", 10090)
+        info["Synonyms"] = info["Synonyms"].fillna("-")
+        info["description"] = "NA"
+
+        with gzip.open(
+            os.path.join(self.dirname, "Mus_musculus.gene_info.gz"), "wt",
+        ) as f:
+            info.to_csv(f, sep="\t", index=False)
+
+    def tearDown(self):
+        (
+            brs.cache.MAPPING_URL,
+            brs.cache.MAPPING_CACHE_DIR,
+            brs.cache.MAPPING_DATA,
+            brs.cache.MAPPING_INDEX,
+        ) = self.cache
+        brs.mapping.get_entrez_mapping.cache_clear()
+        shutil.rmtree(self.dirname)
+
+    def test_mapping_data(self):
+        expected = MAPPING.fillna("-")
+
+        data = brs.cache.get_mapping_data("Mus musculus")
+        pd.testing.assert_frame_equal(data, expected)
+
+        # Species are read back from their own cache files
+        os.remove(os.path.join(self.dirname, "Mus_musculus.gene_info.gz"))
+        brs.cache.MAPPING_DATA = {}
+        brs.cache.MAPPING_INDEX = {}
+
+        data = brs.cache.get_mapping_data("Mus musculus")
+        pd.testing.assert_frame_equal(data, expected)
+        self.assertEqual(
+            brs.cache.MAPPING_INDEX["Mus musculus"].to_dict(),
+            brs.cache.build_mapping_index(expected).to_dict(),
+        )
+
+        with self.assertRaises(IOError):
+            brs.cache.get_mapping_data("Homo sapiens")
+
+    def test_mapping_index(self):
+        index = brs.cache.build_mapping_index(MAPPING)
+
+        self.assertEqual(
+            index.to_dict(),
+            {
+                "Jak2": 0, "Fos": 1, "Jun": 2, "Fd17": 3, "Nan1": 5,
+                "JTK10": 0, "AP-1": 1, "c-fos": 1, "c-jun": 2, "Jak2b": 4,
+            },
+        )
+
+    def test_entrez_mappings(self):
+        genes = ["Jak2", "JTK10", "AP-1", "c-jun", "Fd17", "-", "Missing"]
+
+        self.assertEqual(
+            brs.mapping.get_entrez_mappings(genes, species="Mus musculus"),
+            ["16452", "16452", "14281", "16476", "1", None, None],
+        )
+        self.assertEqual(
+            brs.mapping.get_symbol_mappings(genes, species="Mus musculus"),
+            ["Jak2", "Jak2", "Fos", "Jun", "Fd17", None, None],
+        )
+        self.assertEqual(
+            brs.mapping.get_entrez_mapping("c-fos", species="Mus musculus"),
+            "14281",
+        )
+
+        # The index is saved with the mapping tables
+        brs.cache.MAPPING_DATA = {}
+        brs.cache.MAPPING_INDEX = {}
+
+        self.assertEqual(
+            brs.cache.get_mapping_index("Mus musculus").to_dict(),
+            brs.cache.build_mapping_index(MAPPING).to_dict(),
+        )
+
+
+class EnrichmentTableTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache = (
+            brs.cache.ENRICHMENT_CACHE_DIR,
+            brs.cache.SPECIES_DATA,
+            brs.cache.MAPPING_DATA,
+            brs.cache.MAPPING_INDEX,
+        )
+
+        brs.cache.ENRICHMENT_CACHE_DIR = self.dirname
+        brs.cache.MAPPING_DATA = {"Mus musculus": MAPPING}
+        brs.cache.MAPPING_INDEX = {}
+
+        rng = np.random.RandomState(0)
+        cols = sorted(set(chain.from_iterable(
+            brs.CELL_TYPE_COLS["Mus musculus"].values()
+        )))
+        data = pd.DataFrame(
+            rng.lognormal(size=(6, len(cols))),
+            columns=cols,
+        )
+        data.iloc[0, :] = np.nan
+        data.loc[1, brs.CELL_TYPE_COLS["Mus musculus"]["Neuron"]] *= 100
+        data.loc[2, brs.CELL_TYPE_COLS["Mus musculus"]["Microglia"]] *= 100
+        data.insert(0, "gene", ["Nan1", "Jak2", "Fos", "Jun", "Jun", "Pzp"])
+
+        brs.cache.SPECIES_DATA = {"Mus musculus": data}
+
+    def tearDown(self):
+        (
+            brs.cache.ENRICHMENT_CACHE_DIR,
+            brs.cache.SPECIES_DATA,
+            brs.cache.MAPPING_DATA,
+            brs.cache.MAPPING_INDEX,
+        ) = self.cache
+        shutil.rmtree(self.dirname)
+
+    def test_enrichment_table(self):
+        data = brs.cache.SPECIES_DATA["Mus musculus"]
+        table = brs.enrichments.get_enrichment_table("Mus musculus")
+
+        self.assertEqual(
+            table.index.tolist(), ["Nan1", "Jak2", "Fos", "Jun", "Pzp"],
+        )
+        self.assertTrue(np.isnan(table["enrichment"].iloc[0]))
+
+        for gene, row in table.iloc[1:].iterrows():
+            vals = data[data["gene"] == gene].iloc[0]
+            means = {
+                cell_type: np.mean(vals[cols].values.astype(float))
+                for cell_type, cols in brs.CELL_TYPE_COLS[
+                    "Mus musculus"
+                ].items()
+                if cell_type in brs.DEFAULT_CELL_TYPES
+            }
+            max_cell, max_mean = max(means.items(), key=lambda x: x[1])
+
+            self.assertEqual(row["cell_type"], max_cell)
+            self.assertAlmostEqual(
+                row["enrichment"],
+                max_mean / (sum(means.values()) - max_mean),
+            )
+
+        self.assertEqual(table.loc["Jak2", "cell_type"], "Neuron")
+        self.assertEqual(table.loc["Fos", "cell_type"], "Microglia")
+
+        # Tables are read back from the cache
+        brs.cache.SPECIES_DATA = {}
+
+        pd.testing.assert_frame_equal(
+            brs.enrichments.get_enrichment_table("Mus musculus"), table,
+        )
+
+    def test_enrichments(self):
+        enrich = brs.enrichments.get_enrichments("Mus musculus")
+
+        self.assertEqual(
+            sorted(enrich),
+            ["AP-1", "Fd17", "Fos", "JTK10", "Jak2", "Jak2b", "c-fos"],
+        )
+        self.assertEqual(enrich["JTK10"], enrich["Jak2"])
+        self.assertEqual(enrich["AP-1"], enrich["Fos"])
+        self.assertEqual(enrich["Fd17"][0], "Neuron")
+
+        self.assertEqual(
+            sorted(
+                brs.enrichments.get_enrichments(
+                    "Mus musculus", add_mappings=False,
+                )
+            ),
+            ["Fos", "Jak2"],
+        )
+
+
 class BrainRNASeqTest(TestCase):
     def test_mapping_data(self):
         items = {
@@ -0,0 +1,157 @@
+
+from collections import OrderedDict
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyproteome import data_sets, paths
+
+
+class DataSetIndexTest(TestCase):
+    def setUp(self):
+        self.channels = OrderedDict([("a", "126"), ("b", "127")])
+        self.groups = OrderedDict([("A", ["a"]), ("B", ["b"])])
+
+        self.data = data_sets.DataSet(
+            channels=self.channels,
+            groups=self.groups,
+        )
+
+        for accs, genes in [
+            (["P1"], ["Jak2"]),
+            (["P2"], ["Stat3"]),
+            (["P1", "P2"], ["Jak2", "Stat3"]),
+        ]:
+            self.data.add_peptide({
+                "Proteins": data_sets.Proteins(
+                    proteins=[
+                        data_sets.Protein(
+                            accession=acc,
+                            gene=gene,
+                            description="",
+                            full_sequence="",
+                        )
+                        for acc, gene in zip(accs, genes)
+                    ],
+                ),
+                "126": 1e4,
+                "127": 2e4,
+            })
+
+    def test_genes(self):
+        self.assertEqual(self.data.genes, ["Jak2", "Stat3"])
+        self.assertEqual(self.data.accessions, ["P1", "P2"])
+
+    def test_gene_index(self):
+        np.testing.assert_array_equal(self.data.gene_index["Jak2"], [0, 2])
+        np.testing.assert_array_equal(
+            self.data.accession_index["P2"], [1, 2],
+        )
+
+        self.assertEqual(self.data.get_peptides("Stat3").shape[0], 2)
+        self.assertEqual(self.data.get_peptides("P1").shape[0], 2)
+        self.assertEqual(self.data.get_peptides("Gfap").shape[0], 0)
+
+    def test_invalidate(self):
+        self.assertEqual(len(self.data.genes), 2)
+
+        self.data.psms = self.data.psms.iloc[:1]
+        self.assertEqual(self.data.genes, ["Jak2"])
+
+        self.data.psms.drop(0, inplace=True)
+        self.assertEqual(self.data.genes, [])
+
+    def test_invalidate_in_place(self):
+        self.data.psms["126"] = [3e4, 1e4, 2e4]
+        self.assertEqual(
+            self.data.get_peptides("Stat3").index.tolist(), [1, 2],
+        )
+
+        self.data.psms.sort_values("126", inplace=True)
+        self.data.invalidate_index()
+        self.assertEqual(
+            self.data.get_peptides("Stat3").index.tolist(), [1, 2],
+        )
+        self.assertEqual(
+            self.data.get_peptides("Jak2").index.tolist(), [2, 0],
+        )
+
+        self.data.psms["Proteins"] = self.data.psms["Proteins"].values[::-1]
+        self.data.invalidate_index()
+        self.assertEqual(
+            self.data.get_peptides("Stat3").index.tolist(), [2, 0],
+        )
+
+    def test_index_kept(self):
+        index = self.data.gene_index
+
+        self.data.psms[["126", "Proteins"]]
+        self.data.filter(protein=["Stat3"])
+        self.data.psms["126"] = [3e4, 1e4, 2e4]
+        self.assertIs(self.data.gene_index, index)
+
+        self.assertIs(self.data.copy().gene_index, index)
+
+    def test_filter(self):
+        ds = self.data.filter(protein=["Stat3"])
+        self.assertEqual(ds.shape[0], 2)
+        self.assertEqual(ds.genes, ["Jak2", "Stat3"])
+
+        ds = self.data.filter(protein=["Stat3"], inverse=True)
+        self.assertEqual(ds.genes, ["Jak2"])
+
+    def test_pickle(self):
+        self.assertEqual(len(self.data.genes), 2)
+
+        ds = pickle.loads(pickle.dumps(self.data))
+        self.assertIsNone(ds._gene_index)
+        self.assertEqual(ds.genes, ["Jak2", "Stat3"])
+
+
+class CheckRawTest(TestCase):
+    def setUp(self):
+        self.raw_dir = tempfile.mkdtemp()
+        self.old_raw_dir = paths.MS_RAW_DIR
+        paths.MS_RAW_DIR = self.raw_dir
+
+        self.data = data_sets.DataSet(
+            skip_logging=True,
+            check_raw=False,
+        )
+
+        for raw in ["A.raw", "B.raw", "a.raw"]:
+            self.data.add_peptide({"Raw Paths": raw})
+
+    def tearDown(self):
+        paths.MS_RAW_DIR = self.old_raw_dir
+        shutil.rmtree(self.raw_dir)
+
+    def _touch(self, name):
+        with open(os.path.join(self.raw_dir, name), "w"):
+            pass
+
+    def test_check_raw(self):
+        self.assertFalse(self.data.check_raw())
+
+        self._touch("a.RAW")
+        os.utime(self.raw_dir, (0, 0))
+        self.assertFalse(self.data.check_raw())
+
+        self._touch("b.raw")
+        os.utime(self.raw_dir, (1, 1))
+        self.assertTrue(self.data.check_raw())
+
+    def test_check_raw_merged(self):
+        self._touch("a.raw")
+        self.data.psms["Raw Paths"] = [
+            set(["A.raw"]), set(["A.raw", "B.raw"]), set(),
+        ]
+        self.assertFalse(self.data.check_raw())
+
+        self._touch("b.raw")
+        os.utime(self.raw_dir, (2, 2))
+        self.assertTrue(self.data.check_raw())
@@ -0,0 +1,499 @@
+
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from pyproteome.pathways import enrichments, genesets
+
+
+class EnrichmentScoresTest(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        ids = ["G{}".format(i) for i in range(200)]
+
+        self.psms = pd.DataFrame({
+            "ID": ids + ids[:50],
+            "Correlation": rng.uniform(-1, 1, size=250),
+        })
+        self.gene_changes = enrichments.get_gene_changes(self.psms)
+
+        sets = [
+            set(rng.choice(ids, size=size, replace=False))
+            for size in [1, 5, 20, 50, 199, 200]
+        ] + [
+            set(["G0", "Missing"]),
+            set(["Missing"]),
+        ]
+        self.gene_sets = pd.DataFrame({
+            "name": ["set {}".format(i) for i in range(len(sets))],
+            "set": sets,
+        })
+        self.ud_sets = pd.DataFrame({
+            "name": ["set {}".format(i) for i in range(len(sets))],
+            "up_set": sets,
+            "down_set": sets[2:] + sets[:2],
+        })
+
+    def test_es_s(self):
+        vals = enrichments.enrichment_scores(
+            self.psms, self.gene_sets, pval=False,
+        )
+
+        for set_id, row in self.gene_sets.iterrows():
+            es = enrichments.calculate_es_s(self.gene_changes, row["set"])
+            val = vals.loc[set_id]
+            sums = enrichments.running_sums(val, self.gene_changes)
+
+            self.assertAlmostEqual(val["ES(S)"], es["ess"])
+            np.testing.assert_array_equal(sums["hits"], es["hits"])
+            np.testing.assert_allclose(sums["cumscore"], es["cumscore"])
+            self.assertEqual(val["hit_list"], es["hit_list"])
+            self.assertEqual(val["n_hits"], len(es["hit_list"]))
+            self.assertEqual(
+                val["max_pos"], np.argmax(np.abs(es["cumscore"])),
+            )
+
+            ranked = self.gene_changes.index[
+                :val["max_pos"]
+            ] if val["ES(S)"] >= 0 else self.gene_changes.index[
+                val["max_pos"]:
+            ]
+            self.assertEqual(
+                enrichments.leading_edge(val, self.gene_changes),
+                [i for i in es["hit_list"] if i in ranked],
+            )
+
+        with self.assertRaises(ValueError):
+            enrichments.plot_enrichment(vals)
+
+    def test_es_s_ud(self):
+        vals = enrichments.enrichment_scores(
+            self.psms, self.ud_sets, pval=False,
+        )
+
+        for set_id, row in self.ud_sets.iterrows():
+            es = enrichments.calculate_es_s_ud(
+                self.gene_changes, row["up_set"], row["down_set"],
+            )
+            val = vals.loc[set_id]
+            sums = enrichments.running_sums(val, self.gene_changes)
+
+            self.assertAlmostEqual(val["ES(S)"], es["ess"])
+            np.testing.assert_array_equal(sums["down_hits"], es["down_hits"])
+            np.testing.assert_allclose(
+                sums["down_cumscore"], es["down_cumscore"],
+            )
+            np.testing.assert_allclose(sums["cumscore"], es["cumscore"])
+            self.assertEqual(
+                val["down_max_pos"],
+                np.argmax(np.abs(es["down_cumscore"])),
+            )
+            self.assertEqual(val["hit_list"], es["hit_list"])
+
+    def test_es_s_sets(self):
+        for p in [0, 0.75, 1]:
+            ess = enrichments.calculate_es_s_sets(
+                self.gene_changes, self.gene_sets, p=p,
+            )["ess"]
+
+            np.testing.assert_allclose(
+                ess,
+                [
+                    enrichments.calculate_es_s(
+                        self.gene_changes, gene_set, p=p,
+                    )["ess"]
+                    for gene_set in self.gene_sets["set"]
+                ],
+            )
+
+    def test_es_s_ties(self):
+        # Tied ranks and single hits give running sums whose maximum and
+        # minimum only differ by rounding error
+        for seed in range(5):
+            rng = np.random.RandomState(seed)
+            n = rng.randint(20, 60)
+            ids = ["G{}".format(i) for i in range(n)]
+            gene_changes = pd.DataFrame(
+                {
+                    "Correlation": -np.sort(
+                        -np.round(rng.uniform(-1, 1, size=n), 1),
+                    ),
+                },
+                index=ids,
+            )
+            sets = [set([i]) for i in ids] + [
+                set(rng.choice(ids, size=2, replace=False))
+                for _ in range(50)
+            ]
+            gene_sets = pd.DataFrame({
+                "name": ["set {}".format(i) for i in range(len(sets))],
+                "set": sets,
+            })
+
+            for p in [0, 1]:
+                np.testing.assert_allclose(
+                    enrichments.calculate_es_s_sets(
+                        gene_changes, gene_sets, p=p,
+                    )["ess"],
+                    [
+                        enrichments.calculate_es_s(
+                            gene_changes, gene_set, p=p,
+                        )["ess"]
+                        for gene_set in sets
+                    ],
+                )
+
+    def test_es_s_fixed(self):
+        # Scores from the original, one set at a time, implementation
+        nan = np.nan
+
+        for corr, sets, expected in [
+            (
+                [.9, .6, .6, nan, .1, -.6, -.6, -.9],
+                [
+                    "bc", "fg", "de", "a", "h", "e", "ah", "bg", "cf", "ad",
+                    "bcfg",
+                ],
+                {
+                    0: [
+                        1, -1, -.5, 1, -1, 1, 5 / 6, .5, 5 / 6, 1, .75,
+                    ],
+                    .75: [
+                        1, -1, nan, 1, -1, 1, 5 / 6, .5, 5 / 6, nan, .75,
+                    ],
+                    1: [
+                        1, -1, nan, 1, -1, 1, 5 / 6, .5, 5 / 6, nan, .75,
+                    ],
+                },
+            ),
+            (
+                [.9, .7, .7, .3, .3, -.2, -.7, -.7, -.8],
+                list("abcdefghi") + ["bh", "df", "ai", "cg"],
+                {
+                    p: [1, 1, 1, 1, -1, -1, -1, -1, -1, 5 / 7, 6 / 7, 1, 4 / 7]
+                    for p in [0, 1]
+                },
+            ),
+        ]:
+            psms = pd.DataFrame({
+                "ID": list("abcdefghi")[:len(corr)],
+                "Correlation": corr,
+            })
+            gene_sets = pd.DataFrame({
+                "name": sets,
+                "set": [set(i) for i in sets],
+            })
+
+            for p, ess in expected.items():
+                np.testing.assert_allclose(
+                    enrichments.enrichment_scores(
+                        psms, gene_sets, p=p, pval=False,
+                    ).sort_index()["ES(S)"].values.astype(float),
+                    ess,
+                )
+
+    def test_es_matrix(self):
+        rng = np.random.RandomState(1)
+        values = rng.uniform(-1, 1, size=(self.gene_changes.shape[0], 5))
+
+        for gene_sets in [self.gene_sets, self.ud_sets]:
+            gene_sets = genesets.as_gene_sets(gene_sets)
+            hits = [
+                gene_sets.hits(self.gene_changes.index, col=col).tocsc()
+                for col in gene_sets.set_cols
+            ]
+            ess = enrichments._es_matrix(values, hits, p=None)
+
+            for col in range(values.shape[1]):
+                gene_changes = pd.DataFrame(
+                    {"Correlation": values[:, col]},
+                    index=self.gene_changes.index,
+                ).sort_values("Correlation", ascending=False)
+
+                np.testing.assert_allclose(
+                    ess[:, col],
+                    enrichments.calculate_es_s_sets(
+                        gene_changes, gene_sets,
+                    )["ess"],
+                )
+
+    def test_simulate_es_s_pi(self):
+        psms = self.psms.copy()
+        psms["Fold Change"] = np.exp(psms["Correlation"])
+        psms = enrichments.correlate_phenotype(psms, metric="fold")
+        vals = enrichments.enrichment_scores(psms, self.gene_sets, pval=False)
+
+        ess_pi = []
+
+        for n_cpus, block_size in [(1, None), (2, 8), (3, 3)]:
+            ess_pi.append(
+                enrichments.simulate_es_s_pi(
+                    vals.copy(), psms, self.gene_sets,
+                    metric="fold",
+                    p_iter=20,
+                    n_cpus=n_cpus,
+                    block_size=block_size,
+                    seed=0,
+                )["ES(S, pi)"]
+            )
+
+        enrichments.close_pool()
+
+        for val in ess_pi[0]:
+            self.assertEqual(len(val), 20)
+
+        for val in ess_pi[1:]:
+            np.testing.assert_array_equal(np.stack(ess_pi[0]), np.stack(val))
+
+    def test_ranked_es_s_pi(self):
+        psms = self.psms.copy()
+        psms["Fold Change"] = np.exp(psms["Correlation"])
+        psms.loc[psms.index[:3], "Fold Change"] = np.nan
+
+        data = enrichments._essdist_data(psms, self.gene_sets, metric="fold")
+        seed = np.random.SeedSequence(0)
+        ess = enrichments._calc_essdist(range(10), data=data, seed=seed)
+
+        corr = enrichments._group_mean(data["groups"], data["corr"])
+        valid = ~np.isnan(corr)
+        values = np.repeat(corr[:, None], 10, axis=1)
+
+        for col, rng in enumerate(
+            enrichments._permutation_rngs(seed, range(10))
+        ):
+            values[valid, col] = np.sort(corr[valid])[::-1][
+                rng.permutation(valid.sum())
+            ]
+
+        np.testing.assert_allclose(
+            ess, enrichments._es_matrix(values, data["hits"], None),
+        )
+
+        vals = enrichments.enrichment_scores(
+            psms.dropna(), self.gene_sets, pval=False,
+        )
+        vals = enrichments.simulate_es_s_pi(
+            vals, psms.dropna(), self.gene_sets,
+            metric="fold",
+            p_iter=20,
+            n_cpus=1,
+            seed=0,
+            shuffle_psms=True,
+        )
+
+        for val in vals["ES(S, pi)"]:
+            self.assertEqual(len(val), 20)
+
+    def test_pool(self):
+        pool = enrichments.get_pool(2)
+
+        self.assertIs(enrichments.get_pool(2), pool)
+        self.assertIsNot(enrichments.get_pool(3), pool)
+
+        enrichments.close_pool()
+        self.assertIsNone(enrichments._POOL[0])
+
+    def test_adaptive_es_s_pi(self):
+        psms = self.psms.copy()
+        psms["Fold Change"] = np.exp(psms["Correlation"])
+        psms = enrichments.correlate_phenotype(psms, metric="fold")
+        vals = enrichments.enrichment_scores(psms, self.gene_sets, pval=False)
+
+        vals = enrichments.simulate_es_s_pi(
+            vals, psms, self.gene_sets,
+            metric="fold",
+            p_iter=1000,
+            n_cpus=1,
+            max_err=.25,
+        )
+        n_iter = vals["ES(S, pi)"].apply(len)
+
+        self.assertTrue((n_iter >= enrichments.MIN_ITER).all())
+        self.assertTrue((n_iter <= 1000).all())
+        self.assertTrue((n_iter < 1000).any())
+
+        vals = enrichments.estimate_pq(vals)
+
+        self.assertTrue(vals["p-value"].between(0, 1).all())
+        self.assertFalse(vals["q-value"].isnull().any())
+
+    def test_estimate_pq(self):
+        rng = np.random.RandomState(2)
+        ess = rng.normal(scale=.4, size=50)
+        ess_pi = [
+            rng.normal(scale=.4, size=size).tolist()
+            for size in rng.choice([100, 200], size=ess.shape[0])
+        ]
+        vals = enrichments.estimate_pq(
+            pd.DataFrame({"ES(S)": ess, "ES(S, pi)": ess_pi}),
+        )
+
+        for es, es_pi, (_, row) in zip(ess, ess_pi, vals.iterrows()):
+            es_pi = np.array(es_pi)
+            same = es_pi[(es_pi < 0) == (es < 0)]
+            mean = same.mean() if es > 0 else -same.mean()
+
+            self.assertAlmostEqual(row["NES(S)"], es / mean)
+            self.assertAlmostEqual(
+                row["p-value"], (abs(same) >= abs(es)).mean(),
+            )
+            self.assertTrue(0 <= row["q-value"])
+
+        dense = np.full((ess.shape[0], 200), np.nan)
+
+        for ind, es_pi in enumerate(ess_pi):
+            dense[ind, :len(es_pi)] = es_pi
+
+        pd.testing.assert_frame_equal(
+            enrichments.estimate_pq(
+                pd.DataFrame({"ES(S)": ess}), ess_pi=dense,
+            ),
+            vals.drop(columns=["ES(S, pi)"]),
+        )
+
+    def test_single_sample_scores(self):
+        rng = np.random.RandomState(3)
+        values = pd.DataFrame(
+            rng.uniform(-1, 1, size=(self.gene_changes.shape[0], 4)),
+            index=self.gene_changes.index,
+            columns=["A", "B", "C", "D"],
+        )
+        values.iloc[:20, 1] = np.nan
+        values.iloc[10:30, 3] = np.nan
+
+        for gene_sets in [self.gene_sets, self.ud_sets]:
+            gene_sets = genesets.as_gene_sets(gene_sets)
+            vals = enrichments.single_sample_scores(
+                values, gene_sets, pval=False,
+            )
+
+            self.assertEqual(vals.shape[0], 4 * gene_sets.shape[0])
+
+            for sample in values.columns:
+                gene_changes = values[[sample]].dropna().rename(
+                    columns={sample: "Correlation"},
+                ).sort_values("Correlation", ascending=False)
+                sample_vals = vals[vals["sample"] == sample]
+
+                np.testing.assert_allclose(
+                    sample_vals["ES(S)"],
+                    enrichments.calculate_es_s_sets(
+                        gene_changes, gene_sets,
+                    )["ess"],
+                )
+                self.assertEqual(
+                    sample_vals["n_hits"].tolist(),
+                    sum(
+                        gene_sets.hits(
+                            gene_changes.index, col=col,
+                        ).getnnz(axis=0)
+                        for col in gene_sets.set_cols
+                    ).tolist(),
+                )
+
+    def test_single_sample_pvals(self):
+        rng = np.random.RandomState(4)
+        values = pd.DataFrame(
+            rng.uniform(-1, 1, size=(self.gene_changes.shape[0], 3)),
+            index=self.gene_changes.index,
+        )
+        values.iloc[:20, 1] = np.nan
+
+        vals = [
+            enrichments.single_sample_scores(
+                values, self.gene_sets,
+                p_iter=20,
+                n_cpus=n_cpus,
+                block_size=block_size,
+                seed=0,
+            )
+            for n_cpus, block_size in [(1, None), (2, 3)]
+        ]
+
+        enrichments.close_pool()
+
+        for val in vals:
+            self.assertTrue(val["p-value"].between(0, 1).all())
+
+        pd.testing.assert_frame_equal(vals[0], vals[1])
+
+        min_vals = enrichments.single_sample_scores(
+            values, self.gene_sets,
+            p_iter=20,
+            n_cpus=1,
+            seed=0,
+            min_hits=5,
+        )
+        under = min_vals["n_hits"] < 5
+
+        self.assertTrue(under.any())
+        self.assertFalse(under.all())
+        self.assertTrue((vals[0]["n_hits"] < 5).equals(under))
+        self.assertTrue(
+            min_vals.loc[under.values, ["ES(S)", "NES(S)", "p-value"]]
+            .isnull().all().all()
+        )
+        pd.testing.assert_frame_equal(
+            min_vals.loc[~under.values, ["sample", "ES(S)", "p-value"]],
+            vals[0].loc[~under.values, ["sample", "ES(S)", "p-value"]],
+        )
+
+
+class CorrelateTest(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        samples = ["S{}".format(i) for i in range(12)]
+
+        self.phenotype = pd.Series(
+            rng.randint(0, 4, size=len(samples)).astype(float),
+            index=samples,
+        )
+        data = rng.randint(0, 6, size=(60, len(samples))).astype(float)
+        data[rng.uniform(size=data.shape) < .3] = np.nan
+        data[0] = np.nan
+        data[1, :8] = np.nan
+        data[2] = 1
+
+        self.psms = pd.DataFrame(data, columns=samples)
+
+    def test_correlate_phenotype(self):
+        for metric in ["spearman", "pearson", "kendall"]:
+            corr = enrichments.correlate_phenotype(
+                self.psms, phenotype=self.phenotype, metric=metric,
+            )["Correlation"]
+
+            np.testing.assert_allclose(
+                corr.values,
+                [
+                    self.phenotype.corr(
+                        row,
+                        method=metric,
+                        min_periods=enrichments.MIN_PERIODS,
+                    )
+                    for _, row in self.psms.iterrows()
+                ],
+                atol=1e-12,
+            )
+
+    def test_correlate_matrix(self):
+        rng = np.random.RandomState(1)
+        phens = np.stack(
+            [rng.permutation(self.phenotype.values) for _ in range(5)],
+            axis=1,
+        )
+        phens[0, 0] = np.nan
+
+        for metric in ["spearman", "pearson", "kendall"]:
+            corr = enrichments.correlate_matrix(
+                self.psms.values, phens, metric=metric,
+            )
+
+            for col in range(phens.shape[1]):
+                np.testing.assert_allclose(
+                    corr[:, col],
+                    enrichments.correlate_matrix(
+                        self.psms.values, phens[:, col], metric=metric,
+                    ),
+                    atol=1e-12,
+                )
@@ -0,0 +1,133 @@
+
+import pickle
+from unittest import TestCase, mock
+
+import numpy as np
+import pandas as pd
+
+from pyproteome import pathways
+from pyproteome.pathways import genesets
+
+
+class GeneSetsTest(TestCase):
+    def setUp(self):
+        self.gene_sets = genesets.GeneSets({
+            "name": ["A", "B", "C"],
+            "set": [set(["1", "2", "3"]), set(["3", "4"]), set()],
+        })
+        self.ud_sets = genesets.GeneSets({
+            "name": ["A", "B"],
+            "up_set": [set(["1,S1-p", "2,T5-p"]), set(["3,Y2-p"])],
+            "down_set": [set(["3,Y2-p"]), set()],
+        })
+
+    def test_encode(self):
+        self.assertEqual(sorted(self.gene_sets.ids), ["1", "2", "3", "4"])
+        self.assertEqual(self.gene_sets.sizes().tolist(), [3, 2, 0])
+        self.assertEqual(self.ud_sets.sizes().tolist(), [3, 1])
+        self.assertEqual(
+            self.ud_sets.incidence("down_set").getnnz(axis=1).tolist(),
+            [1, 0],
+        )
+
+        sub = self.gene_sets.iloc[1:]
+        self.assertIsInstance(sub, genesets.GeneSets)
+        self.assertEqual(sub.sizes().tolist(), [2, 0])
+
+    def test_cache(self):
+        ids = self.gene_sets.ids
+        self.assertIs(self.gene_sets.ids, ids)
+
+        self.gene_sets["set"] = [set(["5"]), set(), set()]
+        self.assertEqual(self.gene_sets.ids.tolist(), ["5"])
+
+        # Sets edited in place must be invalidated by hand
+        self.gene_sets["set"].iloc[0].discard("5")
+        self.gene_sets["set"].iloc[0].add("6")
+        self.gene_sets.invalidate()
+        self.assertEqual(self.gene_sets.ids.tolist(), ["6"])
+
+        self.gene_sets.sort_values("name", ascending=False, inplace=True)
+        self.assertEqual(self.gene_sets.sizes().tolist(), [0, 0, 1])
+
+        gene_sets = pickle.loads(pickle.dumps(self.gene_sets))
+        self.assertIsInstance(gene_sets, genesets.GeneSets)
+        self.assertEqual(gene_sets.ids.tolist(), ["6"])
+
+    def test_encode_once(self):
+        ids = ["3", "9", "1"]
+        psms = pd.DataFrame({"ID": ids})
+
+        with mock.patch.object(
+            genesets.pd, "factorize", wraps=pd.factorize,
+        ) as factorize:
+            for _ in range(3):
+                self.gene_sets.ids
+                self.gene_sets.incidence()
+                self.gene_sets.sizes()
+                self.gene_sets.hits(ids)
+                self.gene_sets.overlap(ids)
+                self.gene_sets.filter_hits(ids, min_hits=1).sizes()
+                pathways.enrichments.filter_gene_sets(
+                    self.gene_sets, psms, min_hits=1,
+                ).overlap(ids)
+
+            self.assertEqual(factorize.call_count, 1)
+
+    def test_subset(self):
+        sub = self.gene_sets.filter_hits(["3", "4"], min_hits=1)
+
+        self.assertEqual(sorted(sub.ids), ["1", "2", "3", "4"])
+        self.assertEqual(sub.sizes().tolist(), [3, 2])
+        self.assertEqual(sub.overlap(["4"]).tolist(), [0, 1])
+
+        sub = self.gene_sets.filter_hits(["4"], min_hits=1)
+        mat = sub.incidence("set")
+
+        self.assertEqual(sorted(sub.ids), ["3", "4"])
+        self.assertEqual(
+            [
+                set(sub.ids[mat.indices[start:end]])
+                for start, end in zip(mat.indptr[:-1], mat.indptr[1:])
+            ],
+            sub["set"].tolist(),
+        )
+
+    def test_hits(self):
+        hits = self.gene_sets.hits(["3", "9", "1", "3"])
+
+        np.testing.assert_array_equal(
+            hits.toarray(),
+            [
+                [True, True, False],
+                [False, False, False],
+                [True, False, False],
+                [True, True, False],
+            ],
+        )
+        self.assertEqual(
+            self.gene_sets.overlap(["3", "9", "1", "3"]).tolist(),
+            [2, 1, 0],
+        )
+        self.assertEqual(
+            self.gene_sets.filter_hits(["3", "4"], min_hits=2)["name"]
+            .tolist(),
+            ["B"],
+        )
+
+    def test_filter_gene_sets(self):
+        psms = pd.DataFrame({"ID": ["1", "2", "3", "4", "5"]})
+
+        self.assertEqual(
+            pathways.enrichments.filter_gene_sets(
+                self.gene_sets, psms, min_hits=2,
+            )["name"].tolist(),
+            ["A", "B"],
+        )
+
+    def test_filter_fn(self):
+        fn = pathways.filter_fn(self.gene_sets)
+        self.assertIn("_gene_isin", fn.__name__)
+
+        fn = pathways.filter_fn(self.ud_sets)
+        self.assertIn("_p_site_isin", fn.__name__)
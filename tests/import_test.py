@@ -1,5 +1,25 @@
+from collections import OrderedDict
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from unittest import TestCase
 
+from pyproteome import data_sets, utils
+
+
+STARTUP_SCRIPT = """
+import json, sys
+import pyproteome as pyp
+ds = pyp.utils.load("startup")
+print(json.dumps({
+    "rows": ds.shape[0],
+    "modules": sorted(sys.modules),
+}))
+"""
+
 
 class ImportTest(TestCase):
     def test_imports(self):
@@ -9,3 +29,104 @@ class ImportTest(TestCase):
         # Fix linter warnings
         pyproteome.DUMMY = None
         brainrnaseq.DUMMY = None
+
+    def test_lazy_imports(self):
+        import pyproteome
+
+        self.assertIn("generate_n_mers", dir(pyproteome.motifs))
+        self.assertIs(
+            pyproteome.motif,
+            pyproteome.motifs.motif,
+        )
+        self.assertIs(
+            pyproteome.motifs.generate_n_mers,
+            pyproteome.motifs.motif.generate_n_mers,
+        )
+
+        with self.assertRaises(AttributeError):
+            pyproteome.not_a_module
+
+    def test_lazy_paths(self):
+        from pyproteome import paths
+
+        dirs = {
+            attr: paths.__dict__.pop(attr, None)
+            for attr in paths.DIR_ATTRS
+        }
+
+        try:
+            paths.MS_RAW_DIR = "raw"
+
+            self.assertEqual(
+                os.path.basename(paths.FIGURES_DIR), paths.FIGURES_NAME,
+            )
+            self.assertEqual(paths.MS_RAW_DIR, "raw")
+        finally:
+            for attr, val in dirs.items():
+                paths.__dict__.pop(attr, None)
+
+                if val is not None:
+                    setattr(paths, attr, val)
+
+
+class StartupTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+        ds = data_sets.DataSet(
+            channels=OrderedDict([("a", "126"), ("b", "127")]),
+            skip_logging=True,
+        )
+
+        for i in range(1000):
+            ds.add_peptide({
+                "Proteins": data_sets.Proteins(
+                    proteins=[
+                        data_sets.Protein(
+                            accession="P{}".format(i),
+                            gene="Gene{}".format(i),
+                            description="",
+                            full_sequence="",
+                        ),
+                    ],
+                ),
+                "126": 1e4,
+                "127": 2e4,
+            })
+
+        pickle_dir = utils.PICKLE_DIR
+        utils.PICKLE_DIR = os.path.join(self.dirname, pickle_dir)
+
+        try:
+            utils.save("startup", ds)
+        finally:
+            utils.PICKLE_DIR = pickle_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_startup(self):
+        """
+        Check that importing pyproteome and loading a cached data set in a
+        fresh interpreter does not pull in any heavy modules.
+        """
+        # Import the same copy of pyproteome that is being tested
+        path = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+
+        if os.environ.get("PYTHONPATH"):
+            path.append(os.environ["PYTHONPATH"])
+
+        out = subprocess.check_output(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=self.dirname,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(path)),
+        )
+        out = json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+        self.assertEqual(out["rows"], 1000)
+
+        for mod in [
+            "matplotlib", "seaborn", "sklearn", "scipy.stats", "IPython",
+            "brainrnaseq",
+        ]:
+            self.assertNotIn(mod, out["modules"])
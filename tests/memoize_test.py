@@ -0,0 +1,92 @@
+
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from pyproteome import utils
+
+
+class MemoizeTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.dirname = tempfile.mkdtemp()
+        self.memoize_dir = utils.MEMOIZE_DIR
+        utils.MEMOIZE_DIR = self.dirname
+
+    def tearDown(self):
+        utils.MEMOIZE_DIR = self.memoize_dir
+        shutil.rmtree(self.dirname)
+
+    def _fn(self, **kwargs):
+        @utils.memoize(**kwargs)
+        def add(a, b=1):
+            self.calls.append((a, b))
+            return a + b
+
+        return add
+
+    def test_keys(self):
+        add = self._fn()
+
+        self.assertEqual(add(1), 2)
+        self.assertEqual(add(1, 1), 2)
+        self.assertEqual(add(1, b=1), 2)
+        self.assertEqual(add(a=1), 2)
+        self.assertEqual(add(1, 2), 3)
+
+        self.assertEqual(self.calls, [(1, 1), (1, 2)])
+        self.assertEqual(
+            add.cache_info(),
+            utils.CacheInfo(
+                hits=3, misses=2, disk_hits=0, maxsize=128, currsize=2,
+            ),
+        )
+
+    def test_unhashable(self):
+        @utils.memoize
+        def size(val):
+            self.calls.append(val)
+            return len(val)
+
+        self.assertEqual(size([1, 2]), 2)
+        self.assertEqual(size([1, 2]), 2)
+        self.assertEqual(size(set([1, 2])), 2)
+        self.assertEqual(len(self.calls), 2)
+
+        df = pd.DataFrame([[1]])
+        self.assertEqual(size(df), 1)
+        self.assertEqual(size(df), 1)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_lru(self):
+        add = self._fn(maxsize=2)
+
+        add(1)
+        add(2)
+        add(1)
+        add(3)
+        add(1)
+        add(2)
+
+        self.assertEqual(self.calls, [(1, 1), (2, 1), (3, 1), (2, 1)])
+        self.assertEqual(add.cache_info().currsize, 2)
+
+        add.cache_clear()
+        self.assertEqual(add.cache_info().currsize, 0)
+        self.assertEqual(add.cache_info().hits, 0)
+
+    def test_disk(self):
+        add = self._fn(disk=True)
+
+        self.assertEqual(add(1, 2), 3)
+
+        add.cache_clear()
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(add.cache_info().disk_hits, 1)
+        self.assertEqual(self.calls, [(1, 2)])
+
+        add.cache_clear(disk=True)
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(self.calls, [(1, 2), (1, 2)])
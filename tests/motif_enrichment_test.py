@@ -1,4 +1,6 @@
 
+import shutil
+import tempfile
 from unittest import TestCase
 
 import pandas as pd
@@ -174,6 +176,10 @@ class MotifEnrichmentFullTest(TestCase):
     perl scripts.
     """
     def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache_dir = motif.MOTIF_CACHE_DIR
+        motif.MOTIF_CACHE_DIR = self.dirname
+
         self.foreground = [
             i.strip()
             for i in FOREGROUND.split("\n")
@@ -240,6 +246,10 @@ class MotifEnrichmentFullTest(TestCase):
         self.output.sort_values(by=["sort-p-value", "Motif"], inplace=True)
         self.output.reset_index(drop=True)
 
+    def tearDown(self):
+        motif.MOTIF_CACHE_DIR = self.cache_dir
+        shutil.rmtree(self.dirname)
+
     def test_motif_enrichment(self):
         hits = motif.motif_enrichment(
             self.foreground, self.background,
@@ -279,3 +289,54 @@ class MotifEnrichmentFullTest(TestCase):
             self.assertLess(
                 abs(calc_row["p-value"] - out_row["p-value"]), 0.001,
             )
+
+    def test_parallel_search(self):
+        starts = [
+            motif.Motif("......." + letter + ".......")
+            for letter in "kystx"
+        ]
+        self.assertEqual(
+            motif._search_deps(starts),
+            [[], [], [], [], [2, 3]],
+        )
+
+        serial = motif.motif_enrichment(
+            self.foreground, self.background,
+            cpu_count=1,
+            force=True,
+        )
+        parallel = motif.motif_enrichment(
+            self.foreground, self.background,
+            cpu_count=2,
+            force=True,
+        )
+
+        self.assertEqual(
+            [str(i) for i in serial[0]["Motif"]],
+            [str(i) for i in parallel[0]["Motif"]],
+        )
+        pd.testing.assert_frame_equal(
+            serial[0].drop(columns=["Motif"]),
+            parallel[0].drop(columns=["Motif"]),
+        )
+        self.assertEqual(sorted(serial[1]), sorted(parallel[1]))
+
+    def test_ppdist(self):
+        background = self.background[:100]
+        pp_dists = [
+            motif._generate_ppdist(
+                background, 20, 3,
+                cpu_count=cpu_count,
+                seed=seed,
+                sig_cutoff=0.01,
+                min_fore_hits=5,
+            )
+            for cpu_count, seed in [(1, 0), (2, 0), (1, 1)]
+        ]
+
+        for pp_dist in pp_dists:
+            self.assertEqual(len(pp_dist), 3)
+            self.assertTrue(all(0 <= i <= 0.01 for i in pp_dist))
+
+        self.assertEqual(pp_dists[0], pp_dists[1])
+        self.assertNotEqual(pp_dists[0], pp_dists[2])
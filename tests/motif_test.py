@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 from pyproteome import data_sets, motif
@@ -53,6 +56,29 @@ class MotifTest(TestCase):
         self.assertFalse(self.motif.match("O..x..+"))
         self.assertFalse(self.motif.match("O..x.-."))
 
+    def test_seq_bits(self):
+        seqs = [
+            "IEFtFER", "LEFsFER", "QEFtFER", "IEFsFED", "O..x.-+",
+            "MEFsFEK", "IEFYFER", "VDFtFER", "IEFsDEK",
+        ]
+        seq_bits = motif._SeqBits(seqs)
+
+        for m in [
+            "O..x.-+", "I..x.-+", "O..s.-+", "...t...", ".D.....",
+            "O....E.", ".......", "....F.K",
+        ]:
+            m = motif.Motif(m)
+            bits = seq_bits.match(m)
+
+            self.assertEqual(seq_bits.hits(bits), [i for i in seqs if i in m])
+            self.assertEqual(seq_bits.count(bits), len(seq_bits.hits(bits)))
+
+            for child in m.children():
+                self.assertEqual(
+                    seq_bits.hits(seq_bits.match(child, bits=bits, parent=m)),
+                    [i for i in seqs if i in child],
+                )
+
 
 class GenerateNMersTest(TestCase):
     def setUp(self):
@@ -133,6 +159,10 @@ class MotifEnrichmentTest(TestCase):
     list of sequences.
     """
     def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache_dir = motif.MOTIF_CACHE_DIR
+        motif.MOTIF_CACHE_DIR = self.dirname
+
         self.sequence = data_sets.Sequence(
             pep_seq="GEPNVsyICSR",
             protein_matches=(
@@ -178,6 +208,59 @@ class MotifEnrichmentTest(TestCase):
         self.foreground = self.sequences
         self.background = self.sequences
 
+    def tearDown(self):
+        motif.MOTIF_CACHE_DIR = self.cache_dir
+        shutil.rmtree(self.dirname)
+
     def test_simple_enrichment(self):
         df = motif.motif_enrichment(self.foreground, self.background)
         self.assertIsNotNone(df)
+
+
+class MotifCacheTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache_dir = motif.MOTIF_CACHE_DIR
+        self.cache_size = motif.MOTIF_CACHE_SIZE
+        motif.MOTIF_CACHE_DIR = self.dirname
+
+    def tearDown(self):
+        motif.MOTIF_CACHE_DIR = self.cache_dir
+        motif.MOTIF_CACHE_SIZE = self.cache_size
+        shutil.rmtree(self.dirname)
+
+    def test_cache(self):
+        args = (["AAAsAAA", "CCCsCCC"], ["AAAsAAA"], 0.01)
+
+        self.assertIsNone(motif._get_cache(args))
+        self.assertEqual(motif._add_cache(args, (1, 2)), (1, 2))
+        self.assertEqual(motif._get_cache(args), (1, 2))
+
+        # Keys do not depend on the order of sequences
+        self.assertEqual(
+            motif._get_cache((["CCCsCCC", "AAAsAAA"], ["AAAsAAA"], 0.01)),
+            (1, 2),
+        )
+        self.assertIsNone(
+            motif._get_cache((["CCCsCCC", "AAAsAAA"], ["AAAsAAA"], 0.05)),
+        )
+
+        motif.clear_cache()
+        self.assertIsNone(motif._get_cache(args))
+
+    def test_evict(self):
+        keys = [("AAAsAAA", i) for i in range(3)]
+
+        for key in keys:
+            motif._add_cache(key, "x" * 100)
+
+        path = motif._cache_path(keys[0])
+        os.utime(path, (0, 0))
+
+        motif.MOTIF_CACHE_SIZE = os.path.getsize(path) * 2
+        motif._add_cache(("AAAsAAA", 3), "x" * 100)
+
+        self.assertIsNone(motif._get_cache(keys[0]))
+        self.assertEqual(
+            len(motif._cache_entries()), 2,
+        )
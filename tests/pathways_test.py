@@ -1,7 +1,7 @@
 
 from unittest import TestCase
 
-from pyproteome import pathways
+from pyproteome import data_sets, pathways
 
 
 class PathwaysTest(TestCase):
@@ -89,3 +89,74 @@ class PathwaysTest(TestCase):
                         self.assertIn(col, gene_sets.columns)
 
                     self.assertGreater(gene_sets.shape[0], 0)
+
+
+class PsiteIdsTest(TestCase):
+    def setUp(self):
+        self.data = data_sets.DataSet(skip_logging=True, check_raw=False)
+
+        for pep_seq, matches, mods in [
+            ("AsTyK", [("P1", 10), ("P2", 20)], [1, 3]),
+            ("GKAsK", [("P3", 0)], [3]),
+            ("GGKAK", [("P4", 5)], []),
+        ]:
+            seq = data_sets.Sequence(
+                pep_seq=pep_seq,
+                protein_matches=[
+                    data_sets.ProteinMatch(
+                        protein=data_sets.Protein(
+                            accession=acc,
+                            gene=acc,
+                            description="",
+                            full_sequence="",
+                        ),
+                        rel_pos=rel_pos,
+                        exact=True,
+                    )
+                    for acc, rel_pos in matches
+                ],
+            )
+            seq.modifications = data_sets.Modifications(
+                [
+                    data_sets.Modification(
+                        rel_pos=rel_pos,
+                        mod_type="Phospho",
+                        sequence=seq,
+                    )
+                    for rel_pos in mods
+                ],
+            )
+
+            self.data.add_peptide({
+                "Sequence": seq,
+                "Modifications": seq.modifications,
+                "Proteins": data_sets.Proteins(
+                    proteins=[
+                        match.protein
+                        for match in seq.protein_matches
+                    ],
+                ),
+                "Fold Change": len(mods),
+            })
+
+    def test_psite_ids(self):
+        psms = pathways._get_psite_ids(self.data, "Homo sapiens")
+
+        self.assertEqual(
+            psms["ID"].tolist(),
+            [
+                "P1,S12-p", "P2,S22-p", "P1,Y14-p", "P2,Y24-p",
+                "P3,S4-p",
+            ],
+        )
+        self.assertEqual(psms["Fold Change"].tolist(), [2, 2, 2, 2, 1])
+        self.assertEqual(
+            psms.columns.tolist(),
+            list(self.data.psms.columns) + ["ID"],
+        )
+
+        psms = pathways._get_psite_ids(
+            self.data, "Homo sapiens", columns=["Fold Change"],
+        )
+        self.assertEqual(psms.columns.tolist(), ["Fold Change", "ID"])
+        self.assertEqual(psms.shape[0], 5)
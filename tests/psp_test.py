@@ -0,0 +1,220 @@
+
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from pyproteome import pathways, store
+from pyproteome.motifs import phosphosite
+from pyproteome.pathways import psp
+
+
+SITE_MAPPING = pd.DataFrame(
+    [
+        ("P1", "S10-p", "human", 1),
+        ("Q1", "S12-p", "mouse", 1),
+        ("Q1b", "S12-p", "mouse", 1),
+        ("P1", "T20-p", "human", 2),
+        ("P2", "Y5-p", "human", 3),
+        ("Q2", "Y7-p", "mouse", 3),
+        ("R2", "Y6-p", "rat", 3),
+    ],
+    columns=["ACC_ID", "MOD_RSD", "ORGANISM", "SITE_GRP_ID"],
+)
+
+
+KINASES = pd.DataFrame(
+    [
+        ("Jak2", "Q1", "S12", "mouse"),
+        ("Jak2", "P9-2", "S1", "human"),
+        ("Jak2", "P9", "S1", "human"),
+        ("Src", "R2", "Y6", "rat"),
+        ("Src", "R3", "Y6", "rat"),
+        ("Src", "P3", "T3", "human"),
+    ],
+    columns=["KINASE", "SUB_ACC_ID", "SUB_MOD_RSD", "SUB_ORGANISM"],
+)
+REGULATION = pd.DataFrame(
+    [
+        ("P1", "S10-p", "human", "apoptosis, induced; cell growth"),
+        ("Q2", "Y7-p", "mouse", "apoptosis, inhibited"),
+        ("P3", "T3-p", "human", " apoptosis ;;"),
+        ("P4", "T4-p", "human", None),
+        ("P5", "S5-p", "rat", "cell growth"),
+    ],
+    columns=["ACC_ID", "MOD_RSD", "ORGANISM", "ON_PROCESS"],
+)
+
+for i in range(REGULATION.shape[1], 21):
+    REGULATION["COL{}".format(i)] = ""
+
+
+def _write_psp(path, df, skiprows=3):
+    with gzip.open(path, "wt") as f:
+        f.write("header\n" * skiprows)
+        df.to_csv(f, sep="\t", index=False)
+
+
+class PhosphoSiteTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.store_dir = store.STORE_DIR
+        self.offline = store.OFFLINE
+        store.STORE_DIR = self.dirname
+        store.OFFLINE = True
+
+        raw_dir = os.path.join(
+            store.source_dir("phosphosite", "20190101"), "raw",
+        )
+        os.makedirs(raw_dir)
+
+        _write_psp(
+            os.path.join(
+                raw_dir,
+                psp.PSP_SITE_MAPPING_URL.rsplit("/", 1)[-1],
+            ),
+            SITE_MAPPING,
+        )
+        _write_psp(
+            os.path.join(
+                raw_dir,
+                psp.PSP_REGULATORY_URL.rsplit("/", 1)[-1],
+            ),
+            REGULATION,
+        )
+        _write_psp(
+            os.path.join(
+                raw_dir,
+                phosphosite.DATA_URL.rsplit("/", 1)[-1],
+            ),
+            KINASES,
+            skiprows=2,
+        )
+
+        self._clear()
+
+    def tearDown(self):
+        self._clear()
+
+        store.STORE_DIR = self.store_dir
+        store.OFFLINE = self.offline
+        shutil.rmtree(self.dirname)
+
+    def _clear(self):
+        for fn in [
+            psp.get_phosphomap_data,
+            psp.get_phosphoreg_data,
+            psp.get_site_mapping,
+            psp.get_phosphosite,
+            psp.get_phosphosite_regulation,
+            phosphosite.get_data,
+        ]:
+            fn.cache_clear()
+
+    def test_site_mapping(self):
+        mapping = psp.get_site_mapping("Homo sapiens")
+
+        self.assertEqual(
+            mapping.values.tolist(),
+            [
+                ["Q1", "S12-p", "mouse", "P1", "S10-p"],
+                ["Q1b", "S12-p", "mouse", "P1", "S10-p"],
+                ["Q2", "Y7-p", "mouse", "P2", "Y5-p"],
+                ["R2", "Y6-p", "rat", "P2", "Y5-p"],
+            ],
+        )
+
+    def test_remap_data(self):
+        psms = pd.DataFrame({
+            "ID": ["Q1,S12-p", "Q2,Y7-p", "Q2,S1-p", "R2,Y6-p"],
+            "Fold Change": [1, 2, 3, 4],
+        })
+        new = pathways._remap_data(
+            psms, from_species="Mus musculus", to_species="Homo sapiens",
+        )
+
+        self.assertEqual(new["ID"].tolist(), ["P1,S10-p", "P2,Y5-p"])
+        self.assertEqual(new["Fold Change"].tolist(), [1, 2])
+
+    def test_remap_psp(self):
+        kinases = pd.DataFrame(
+            [
+                ("Jak2", "Q1", "S12", "mouse"),
+                ("Jak2", "P9", "S1", "human"),
+                ("Src", "R2", "Y6", "rat"),
+                ("Src", "R3", "Y6", "rat"),
+            ],
+            columns=["KINASE", "SUB_ACC_ID", "SUB_MOD_RSD", "SUB_ORGANISM"],
+            index=[5, 6, 7, 8],
+        )
+        new = psp._remap_psp(
+            kinases, "human",
+            acc_col="SUB_ACC_ID",
+            mod_col="SUB_MOD_RSD",
+            org_col="SUB_ORGANISM",
+        )
+
+        self.assertEqual(new.index.tolist(), [5, 6, 7, 8])
+        self.assertEqual(
+            new.values.tolist(),
+            [
+                ["human", "Jak2", "P1", "S10-p"],
+                ["human", "Jak2", "P9", "S1-p"],
+                ["human", "Src", "P2", "Y5-p"],
+                ["rat", "Src", "R3", "Y6-p"],
+            ],
+        )
+
+    def _sets(self, gene_sets):
+        self.assertEqual(
+            gene_sets["down_set"].tolist(),
+            [set()] * gene_sets.shape[0],
+        )
+
+        return dict(zip(gene_sets["name"], gene_sets["up_set"]))
+
+    def test_phosphosite(self):
+        self.assertEqual(
+            self._sets(psp.get_phosphosite("Homo sapiens")),
+            {
+                "Jak2": set(["P9,S1-p"]),
+                "Src": set(["P3,T3-p"]),
+            },
+        )
+        self.assertEqual(
+            self._sets(psp.get_phosphosite("Homo sapiens", remap=True)),
+            {
+                "Jak2": set(["P1,S10-p", "P9,S1-p"]),
+                "Src": set(["P2,Y5-p", "P3,T3-p"]),
+            },
+        )
+        self.assertEqual(
+            psp.get_phosphosite("Danio rerio").shape[0], 0,
+        )
+
+    def test_phosphosite_regulation(self):
+        self.assertEqual(
+            self._sets(psp.get_phosphosite_regulation("Homo sapiens")),
+            {
+                "apoptosis": set(["P1,S10-p", "P3,T3-p"]),
+                "apoptosis, induced": set(["P1,S10-p"]),
+                "cell growth": set(["P1,S10-p"]),
+            },
+        )
+        self.assertEqual(
+            self._sets(
+                psp.get_phosphosite_regulation("Homo sapiens", remap=True),
+            ),
+            {
+                "apoptosis": set(["P1,S10-p", "P2,Y5-p", "P3,T3-p"]),
+                "apoptosis, induced": set(["P1,S10-p"]),
+                "apoptosis, inhibited": set(["P2,Y5-p"]),
+                "cell growth": set(["P1,S10-p"]),
+            },
+        )
+        self.assertEqual(
+            psp.get_phosphosite_regulation("Danio rerio").shape[0], 0,
+        )
@@ -0,0 +1,122 @@
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from pyproteome import store
+from pyproteome.pathways import genesets, msigdb
+
+
+GMT = (
+    b"HALLMARK_A\thttp://a\t1\t2\t3\n"
+    b"HALLMARK_B\thttp://b\t3\t4\n"
+)
+
+
+class StoreTest(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.store_dir = store.STORE_DIR
+        self.offline = store.OFFLINE
+        store.STORE_DIR = self.dirname
+        store.OFFLINE = True
+        msigdb.get_msigdb_pathways.cache_clear()
+
+    def tearDown(self):
+        store.STORE_DIR = self.store_dir
+        store.OFFLINE = self.offline
+        msigdb.get_msigdb_pathways.cache_clear()
+        shutil.rmtree(self.dirname)
+
+    def _seed(self, source, version, name, data):
+        path = os.path.join(store.source_dir(source, version), "raw")
+        os.makedirs(path)
+
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+
+    def test_offline(self):
+        with self.assertRaises(IOError):
+            store.get_version("phosphosite")
+
+        with self.assertRaises(IOError):
+            store.fetch("phosphosite", "http://localhost/data.gz")
+
+        with self.assertRaises(IOError):
+            msigdb.get_msigdb_pathways("Homo sapiens")
+
+    def test_versions(self):
+        for version in ["20180101", "20190101"]:
+            self._seed("phosphosite", version, "data.gz", b"")
+
+        self.assertEqual(
+            store.versions("phosphosite"), ["20180101", "20190101"],
+        )
+        self.assertEqual(store.get_version("phosphosite"), "20190101")
+        self.assertEqual(
+            store.fetch("phosphosite", "http://localhost/data.gz"),
+            os.path.join(
+                store.source_dir("phosphosite", "20190101"), "raw", "data.gz",
+            ),
+        )
+
+        store.clear("phosphosite", "20190101")
+        self.assertEqual(store.versions("phosphosite"), ["20180101"])
+
+    def test_cached(self):
+        for name in msigdb.MSIGDB_FILES:
+            self._seed("msigdb", msigdb.MSIGDB_VERSION, name, GMT)
+
+        gene_sets = msigdb.get_msigdb_pathways("Homo sapiens")
+
+        self.assertIsInstance(gene_sets, genesets.GeneSets)
+        self.assertEqual(
+            gene_sets["name"].tolist(), ["HALLMARK_A", "HALLMARK_B"],
+        )
+        self.assertEqual(
+            gene_sets["set"].tolist(),
+            [set(["1", "2", "3"]), set(["3", "4"])],
+        )
+
+        # Parsed tables are loaded without the raw downloads
+        shutil.rmtree(
+            os.path.join(
+                store.source_dir("msigdb", msigdb.MSIGDB_VERSION), "raw",
+            )
+        )
+        msigdb.get_msigdb_pathways.cache_clear()
+
+        loaded = msigdb.get_msigdb_pathways("Homo sapiens")
+
+        self.assertIsInstance(loaded, genesets.GeneSets)
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(loaded), pd.DataFrame(gene_sets),
+        )
+        self.assertEqual(loaded.ids.tolist(), gene_sets.ids.tolist())
+        self.assertEqual(
+            (loaded.incidence() != gene_sets.incidence()).nnz, 0,
+        )
+
+    def test_encoded(self):
+        gene_sets = genesets.GeneSets({
+            "name": ["A", "B"],
+            "up_set": [set(["1,S1-p", "2,T5-p"]), set()],
+            "down_set": [set(["3,Y2-p"]), set(["1,S1-p"])],
+        })
+        loaded = genesets.GeneSets.from_encoded(
+            *gene_sets.to_encoded(), set_cols=gene_sets.set_cols
+        )
+
+        self.assertEqual(
+            loaded.columns.tolist(), ["name", "up_set", "down_set"],
+        )
+        self.assertEqual(
+            loaded["up_set"].tolist(), gene_sets["up_set"].tolist(),
+        )
+        self.assertEqual(
+            loaded["down_set"].tolist(), gene_sets["down_set"].tolist(),
+        )
+        self.assertEqual(loaded.sizes().tolist(), [3, 1])